@@ -5,11 +5,12 @@ Simple Jasmin Manager for Admin Backend
 Global connection maintain karta hai aur simple functions provide karta hai
 """
 
-import pexpect
 import time
 import sys
 import json
 
+from jcli import JCliClient
+
 # jCli Configuration
 TELNET_HOST = 'localhost'
 TELNET_PORT = 8990
@@ -28,10 +29,7 @@ class JasminManager:
     def connect(self):
         """Connect to Jasmin jCli"""
         try:
-            self.telnet = pexpect.spawn(
-                f"telnet {TELNET_HOST} {TELNET_PORT}", 
-                timeout=TELNET_TIMEOUT
-            )
+            self.telnet = JCliClient(TELNET_HOST, TELNET_PORT, timeout=TELNET_TIMEOUT)
             
             self.telnet.expect_exact('Username: ')
             self.telnet.sendline(TELNET_USERNAME)
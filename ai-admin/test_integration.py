@@ -4,9 +4,10 @@ Simple test for Jasmin integration
 Same as working group creation script
 """
 
-import pexpect
 import sys
 
+from server.jcli import JCliClient
+
 # jCli Configuration
 TELNET_HOST = 'localhost'
 TELNET_PORT = 8990
@@ -21,10 +22,7 @@ def create_group(group_id):
     """Create a group - same as working script"""
     try:
         print(f"Creating group: {group_id}")
-        telnet = pexpect.spawn(
-            f"telnet {TELNET_HOST} {TELNET_PORT}", 
-            timeout=TELNET_TIMEOUT
-        )
+        telnet = JCliClient(TELNET_HOST, TELNET_PORT, timeout=TELNET_TIMEOUT)
         
         # Login
         telnet.expect_exact('Username: ')
@@ -77,10 +75,7 @@ def create_user(uid, gid, username, password):
     """Create a user"""
     try:
         print(f"Creating user: {username} (UID: {uid}, GID: {gid})")
-        telnet = pexpect.spawn(
-            f"telnet {TELNET_HOST} {TELNET_PORT}", 
-            timeout=TELNET_TIMEOUT
-        )
+        telnet = JCliClient(TELNET_HOST, TELNET_PORT, timeout=TELNET_TIMEOUT)
         
         # Login
         telnet.expect_exact('Username: ')
@@ -0,0 +1,67 @@
+"""Interned message bodies of submit_log.
+
+By default (DB_BODY_STORAGE=inline) every submit_log row holds its decoded
+short_message and its hexlified binary_message. With DB_BODY_STORAGE=interned
+rows only hold a body_hash, the raw message bytes are stored once in
+<table>_body under that hash, optionally compressed, and decoded when read.
+The same campaign text sent a million times is then stored once.
+
+A body is addressed by the SHA-1 of its raw bytes and of whether it is
+UCS2 encoded, the same text under another data coding is another body.
+"""
+
+import hashlib
+import zlib
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+COMPRESSIONS = ('none', 'zlib', 'zstd')
+
+# Columns of the rows of BodyEncoder.rows()
+BODY_COLUMNS = ('hash', 'encoding', 'ucs2', 'length', 'body')
+
+
+def body_table(table):
+    return '%s_body' % table
+
+
+def body_hash(raw_message, ucs2):
+    return hashlib.sha1((b'\x01' if ucs2 else b'\x00') + raw_message).hexdigest()
+
+
+class BodyEncoder(object):
+    """Compresses bodies for <table>_body, keeping them raw when compression doesn't pay off"""
+
+    def __init__(self, compression='none'):
+        if compression not in COMPRESSIONS:
+            raise ValueError('Unknown body compression: %s' % compression)
+        if compression == 'zstd' and zstandard is None:
+            raise ValueError('zstd body compression needs the zstandard package')
+        self.compression = compression
+        self._zstd = zstandard.ZstdCompressor(level=3) if compression == 'zstd' else None
+
+    def encode(self, raw_message):
+        """(encoding, payload) of a raw body"""
+        if self.compression == 'zlib':
+            payload = zlib.compress(raw_message, 6)
+        elif self.compression == 'zstd':
+            payload = self._zstd.compress(raw_message)
+        else:
+            return 'raw', raw_message
+        if len(payload) >= len(raw_message):
+            return 'raw', raw_message
+        return self.compression, payload
+
+    def rows(self, bodies):
+        """(hash, encoding, ucs2, length, body) rows of a {hash: (ucs2, raw_message)} dict, sorted by hash.
+
+        Sorting makes concurrent shards insert shared bodies in the same order.
+        """
+        rows = []
+        for h, (ucs2, raw_message) in sorted(bodies.items()):
+            encoding, payload = self.encode(raw_message)
+            rows.append((h, encoding, bool(ucs2), len(raw_message), payload))
+        return rows
@@ -0,0 +1,97 @@
+"""Capture files of the AMQP deliveries consumed by sms_logger.
+
+A capture is a gzip stream of records, each made of a little-endian header
+holding the arrival time (a double) and the payload length (4 bytes),
+followed by the pickled (routing_key, properties, body) of a delivery. Bodies
+and headers are kept as received, so a replayed capture goes through the very
+same decoding as the original traffic.
+
+sms_logger.py --record PATH writes a capture while consuming as usual,
+--replay PATH drives the logger from a capture through the in-process broker
+of local_broker.py, see replay().
+"""
+
+import gzip
+import pickle
+import struct
+import zlib
+from time import monotonic, time
+
+from twisted.internet import reactor, task
+from twisted.internet.defer import inlineCallbacks
+
+_header = struct.Struct('<dI')
+
+# Deliveries queued in the local broker ahead of the consumer when replaying as fast as possible
+REPLAY_BACKLOG = 10000
+
+
+class CaptureWriter(object):
+    def __init__(self, path):
+        self.path = path
+        self.records = 0
+        self._file = gzip.open(path, 'wb')
+
+    def write(self, routing_key, properties, body, arrived_at=None):
+        payload = pickle.dumps((routing_key, properties, body), pickle.HIGHEST_PROTOCOL)
+        self._file.write(_header.pack(arrived_at or time(), len(payload)) + payload)
+        self.records += 1
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+
+
+class CaptureReader(object):
+    """Iterates over the (arrived_at, routing_key, properties, body) records of a capture.
+
+    A capture whose writer was killed ends with a truncated gzip member or
+    record, reading stops at the last complete one.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def __iter__(self):
+        with gzip.open(self.path, 'rb') as f:
+            while True:
+                try:
+                    header = f.read(_header.size)
+                    if len(header) < _header.size:
+                        return
+                    arrived_at, length = _header.unpack(header)
+                    payload = f.read(length)
+                    if len(payload) < length:
+                        return
+                except (EOFError, OSError, zlib.error):
+                    return
+                routing_key, properties, body = pickle.loads(payload)
+                yield arrived_at, routing_key, properties, body
+
+
+def _later(delay):
+    return task.deferLater(reactor, delay, lambda: None)
+
+
+@inlineCallbacks
+def replay(records, broker, original_pacing=False):
+    """Publish the records to broker, returns the number of records.
+
+    With original_pacing, records are published at the same relative times
+    they arrived at, otherwise as fast as the consumer takes them.
+    """
+    count = 0
+    first = started = None
+    for arrived_at, routing_key, properties, body in records:
+        if original_pacing:
+            if first is None:
+                first, started = arrived_at, monotonic()
+            delay = (arrived_at - first) - (monotonic() - started)
+            if delay > 0:
+                yield _later(delay)
+        else:
+            while len(broker.backlog) >= REPLAY_BACKLOG:
+                yield _later(0)
+        broker.publish(routing_key, body, properties)
+        count += 1
+    return count
@@ -0,0 +1,256 @@
+"""In-flight submit_sm correlation for sms_logger.
+
+A submit_sm is kept from the moment it is published until its final DLR
+arrives, so that the submit_sm_resp and the DLRs can be written with the
+message details. The store is bounded both in size and in time: entries older
+than the TTL are expired and the oldest entries are evicted once the size cap
+is reached.
+
+The store can optionally be backed by a CorrelationJournal, an append-only
+file that is replayed on startup so that a restarted logger still knows the
+messages that were in flight.
+"""
+
+import binascii
+import os
+import pickle
+import struct
+import threading
+from collections import OrderedDict
+from time import time
+
+# DLR states after which no other DLR is expected for a message
+FINAL_DLR_STATUSES = frozenset((
+    'DELIVRD', 'EXPIRED', 'DELETED', 'UNDELIV', 'REJECTD', 'UNKNOWN',
+))
+
+
+class CorrelationEntry(object):
+    """Details of one submitted message, as needed to write its submit_log row.
+
+    Only the raw short_message bytes are kept, the hexlified and decoded
+    variants are computed when the row is built.
+    """
+    __slots__ = (
+        'source_connector', 'routed_cid', 'rate', 'charge', 'uid',
+        'destination_addr', 'source_addr', 'pdu_count', 'raw_message', 'ucs2',
+        'expires_at', 'submitted_at', 'created_at',
+    )
+
+    def __init__(self, source_connector, routed_cid, destination_addr, source_addr,
+                 pdu_count, raw_message, ucs2=False, rate=0, charge=0, uid=0, created_at=None):
+        self.source_connector = source_connector
+        self.routed_cid = routed_cid
+        self.rate = rate
+        self.charge = charge
+        self.uid = uid
+        self.destination_addr = destination_addr
+        self.source_addr = source_addr
+        self.pdu_count = pdu_count
+        self.raw_message = raw_message
+        self.ucs2 = ucs2
+        self.expires_at = None
+        self.submitted_at = time()
+        # The submit_log row's, bounds the DLR updates to its partition
+        self.created_at = created_at
+
+    def __getstate__(self):
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def __setstate__(self, state):
+        # Journals written before submitted_at and created_at existed
+        self.submitted_at = None
+        self.created_at = None
+        for name, value in zip(self.__slots__, state):
+            setattr(self, name, value)
+
+    @property
+    def short_message(self):
+        # If it's a binary message, assume it's utf_16_be encoded
+        if self.ucs2:
+            return self.raw_message.decode('utf_16_be', 'ignore').encode('utf_8')
+        return self.raw_message
+
+    @property
+    def binary_message(self):
+        return binascii.hexlify(self.raw_message)
+
+
+class CorrelationJournal(object):
+    """Append-only log of CorrelationStore puts and removals.
+
+    Each record is a little-endian 4 bytes length followed by a pickled
+    (msgid, entry) tuple, entry being None for a removal. A record torn by a
+    crash is cut off when the journal is reopened.
+
+    Records are appended from the reactor thread while sync() runs in the
+    writer thread: the file is only swapped or written under the lock, and
+    fsync runs on a duplicate of its descriptor, outside of it.
+    """
+    _length = struct.Struct('<I')
+
+    def __init__(self, path):
+        self.path = path
+        self.records = 0
+        self._file = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        """Yield (msgid, entry) records in write order"""
+        self.records = 0
+        valid_size = 0
+        if os.path.exists(self.path):
+            with open(self.path, 'rb') as f:
+                while True:
+                    header = f.read(self._length.size)
+                    if len(header) < self._length.size:
+                        break
+                    payload = f.read(self._length.unpack(header)[0])
+                    try:
+                        record = pickle.loads(payload)
+                    except Exception:
+                        break
+                    valid_size = f.tell()
+                    self.records += 1
+                    yield record
+
+        self._file = open(self.path, 'ab')
+        self._file.truncate(valid_size)
+
+    def append(self, msgid, entry):
+        payload = pickle.dumps((msgid, entry), pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            self._file.write(self._length.pack(len(payload)) + payload)
+        self.records += 1
+
+    def sync(self):
+        """Make every appended record durable"""
+        with self._lock:
+            if self._file is None:
+                return
+            self._file.flush()
+            fd = os.dup(self._file.fileno())
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def rewrite(self, items):
+        """Replace the journal with one put record per live entry"""
+        tmp_path = self.path + '.tmp'
+        records = 0
+        with open(tmp_path, 'wb') as f:
+            for msgid, entry in items:
+                payload = pickle.dumps((msgid, entry), pickle.HIGHEST_PROTOCOL)
+                f.write(self._length.pack(len(payload)) + payload)
+                records += 1
+            f.flush()
+            os.fsync(f.fileno())
+
+        with self._lock:
+            self._file.close()
+            os.replace(tmp_path, self.path)
+            self._file = open(self.path, 'ab')
+        self.records = records
+
+    def close(self):
+        self.sync()
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+class CorrelationStore(object):
+    """Message-id keyed map of CorrelationEntry with a size cap and a TTL.
+
+    Entries are kept in insertion order, which is also their expiry order, so
+    both expiry and capacity eviction only ever look at the oldest entries.
+    """
+
+    def __init__(self, max_size=1000000, ttl=86400, journal=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.journal = journal
+        self._entries = OrderedDict()
+
+        self.expired = 0
+        self.evicted = 0
+        self.removed = 0
+        self.restored = 0
+
+    def restore(self):
+        """Reload the in-flight messages from the journal, if any"""
+        if self.journal is None:
+            return
+        for msgid, entry in self.journal.load():
+            self._entries.pop(msgid, None)
+            if entry is not None:
+                self._entries[msgid] = entry
+
+        self.expire()
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+        self.restored = len(self._entries)
+        self.compact()
+
+    def sync(self):
+        if self.journal is not None:
+            self.journal.sync()
+
+    def compact(self):
+        """Rewrite the journal once it mostly holds dead records"""
+        if self.journal is not None and self.journal.records > 2 * len(self._entries) + 10000:
+            self.journal.rewrite(self._entries.items())
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, msgid):
+        return self.get(msgid) is not None
+
+    def put(self, msgid, entry):
+        entry.expires_at = time() + self.ttl
+        self._entries.pop(msgid, None)
+        self._entries[msgid] = entry
+        if self.journal is not None:
+            self.journal.append(msgid, entry)
+
+        self.expire()
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evicted += 1
+
+    def get(self, msgid):
+        entry = self._entries.get(msgid)
+        if entry is not None and entry.expires_at <= time():
+            del self._entries[msgid]
+            self.expired += 1
+            return None
+        return entry
+
+    def remove(self, msgid):
+        """Forget a message once no other event is expected for it"""
+        if self._entries.pop(msgid, None) is not None:
+            self.removed += 1
+            if self.journal is not None:
+                self.journal.append(msgid, None)
+
+    def expire(self):
+        """Drop every entry whose TTL has elapsed"""
+        now = time()
+        while self._entries:
+            msgid, entry = next(iter(self._entries.items()))
+            if entry.expires_at > now:
+                break
+            del self._entries[msgid]
+            self.expired += 1
+
+    def stats(self):
+        return {
+            'size': len(self._entries),
+            'expired': self.expired,
+            'evicted': self.evicted,
+            'removed': self.removed,
+            'restored': self.restored,
+        }
@@ -0,0 +1,179 @@
+"""Redelivery de-duplication for sms_logger.
+
+RabbitMQ redelivers the deliveries a consumer did not ack, typically the
+last batches of a logger that was restarted. Written again, a submit_sm_resp
+counts one more trial and a DLR repeats its status update. Deliveries are
+keyed on (message-id, routing key class, status) and the keys of committed
+batches are remembered, so that a redelivered one can be acked without being
+written again. Only submit_sm_resp and DLR deliveries are filtered: a
+submit_sm writes nothing, it seeds the correlation store its resp needs.
+
+Keys are kept in a small exact LRU and in a rotating Bloom filter of two
+generations, which covers the last DEDUP_CAPACITY to 2 * DEDUP_CAPACITY keys
+in a few MiB. A Bloom filter can report a key it never saw, at most with
+DEDUP_ERROR_RATE: only deliveries flagged as redelivered by the broker are
+ever looked up, so that Jasmin's own retries of a message still count as
+trials and a false positive can only drop a redelivery.
+
+With a journal, the keys of each generation are also appended to their own
+file, which is removed once the generation rotates out, so that a restarted
+logger still knows the keys of the batches its predecessor committed.
+
+Keys are added and synced by the writer thread once their batch is
+committed, while the reactor looks them up: both go through the filter's
+lock, and fsync runs on a duplicate of the journal descriptor, outside of it.
+"""
+
+import glob
+import hashlib
+import math
+import os
+import struct
+import threading
+from collections import OrderedDict
+
+# Positions of a key in the filter are read from a single 64 bytes digest
+MAX_HASHES = 16
+_positions = struct.Struct('<%sI' % MAX_HASHES)
+
+
+def dedup_key(routing_key_class, message_id, status=''):
+    return ('%s\t%s\t%s' % (message_id, routing_key_class, status)).encode()
+
+
+class BloomFilter(object):
+    def __init__(self, capacity, error_rate):
+        self.bits = max(8, int(math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)))
+        self.hashes = max(1, min(MAX_HASHES, int(round(self.bits / capacity * math.log(2)))))
+        self.array = bytearray((self.bits + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(key, digest_size=64).digest()
+        return [p % self.bits for p in _positions.unpack(digest)[:self.hashes]]
+
+    def add(self, key):
+        for p in self._positions(key):
+            self.array[p >> 3] |= 1 << (p & 7)
+        self.count += 1
+
+    def __contains__(self, key):
+        for p in self._positions(key):
+            if not self.array[p >> 3] & (1 << (p & 7)):
+                return False
+        return True
+
+
+class RedeliveryFilter(object):
+    """Keys of the committed deliveries, see seen()"""
+
+    def __init__(self, capacity=1000000, error_rate=1e-5, lru_size=100000, journal=None):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.lru_size = lru_size
+        self.journal = journal
+        self.generation = 0
+        self.current = BloomFilter(capacity, error_rate)
+        self.previous = None
+        self.lru = OrderedDict()
+        self._file = None
+        self._lock = threading.Lock()
+
+        self.restored = 0
+
+    def _journal_path(self, generation):
+        return '%s.%s' % (self.journal, generation)
+
+    def _rotate(self):
+        self.previous, self.current = self.current, BloomFilter(self.capacity, self.error_rate)
+        self.generation += 1
+        if self._file is not None:
+            self._file.close()
+            self._file = open(self._journal_path(self.generation), 'ab')
+            stale = self._journal_path(self.generation - 2)
+            if os.path.exists(stale):
+                os.remove(stale)
+
+    def _add(self, key):
+        if self.current.count >= self.capacity:
+            self._rotate()
+        self.current.add(key)
+        self.lru[key] = None
+        self.lru.move_to_end(key)
+        if len(self.lru) > self.lru_size:
+            self.lru.popitem(last=False)
+
+    def restore(self):
+        """Reload the keys of the last two generations from the journal, if any"""
+        if self.journal is None:
+            return
+        prefix = self.journal + '.'
+        generations = sorted(int(path[len(prefix):]) for path in glob.glob(glob.escape(prefix) + '*')
+                             if path[len(prefix):].isdigit())
+        for generation in generations[:-2]:
+            os.remove(self._journal_path(generation))
+        generations = generations[-2:]
+
+        if generations:
+            self.generation = generations[0]
+        for generation in generations:
+            path = self._journal_path(generation)
+            valid_size = 0
+            with open(path, 'rb') as f:
+                for line in f:
+                    if not line.endswith(b'\n'):
+                        # Torn by a crash
+                        break
+                    valid_size += len(line)
+                    self._add(line[:-1])
+                    self.restored += 1
+            with open(path, 'ab') as f:
+                f.truncate(valid_size)
+            # A generation restored from its own file
+            self.generation = generation
+
+        self._file = open(self._journal_path(self.generation), 'ab')
+
+    def seen(self, key):
+        """Where a key was seen: 'lru' for sure, 'bloom' most likely, None if never"""
+        with self._lock:
+            if key in self.lru:
+                return 'lru'
+            if key in self.current or (self.previous is not None and key in self.previous):
+                return 'bloom'
+            return None
+
+    def add(self, keys):
+        """Remember the keys of a committed batch"""
+        with self._lock:
+            for key in keys:
+                self._add(key)
+                if self._file is not None:
+                    self._file.write(key + b'\n')
+
+    def sync(self):
+        """Make every added key durable"""
+        with self._lock:
+            if self._file is None:
+                return
+            self._file.flush()
+            fd = os.dup(self._file.fileno())
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def close(self):
+        self.sync()
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def stats(self):
+        return {
+            'lru_size': len(self.lru),
+            'generation': self.generation,
+            'keys': self.current.count + (self.previous.count if self.previous is not None else 0),
+            'restored': self.restored,
+        }
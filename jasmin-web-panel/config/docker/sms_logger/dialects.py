@@ -0,0 +1,549 @@
+"""SQL dialects used by the sms_logger writer.
+
+Each dialect knows how to create the submit_log table and how to apply a
+batch of rows to it in as few statements as its database allows:
+
+- MySQL: multi-row INSERT ... ON DUPLICATE KEY UPDATE
+- PostgreSQL: COPY ... FROM STDIN into a temporary staging table, merged with
+  INSERT ... ON CONFLICT (msgid) DO UPDATE
+
+DLR status updates of a batch are applied with a single UPDATE joined
+against the list of (msgid, status, status_at) of the batch. Updates carry
+the created_at of their message as well: on a partitioned table the UPDATE is
+bounded to the created_at range of the batch, so that only the partitions
+holding its messages are scanned.
+
+With partitions (see partitions.py), the table is created range partitioned
+on created_at and its primary key becomes (msgid, created_at).
+
+Secondary indexes come from an INDEX_PROFILES entry. Every index costs a write
+on each insert, and the ones holding status on each DLR update as well:
+
+- full: the historical 13 indexes
+- lean: the created_at window scans of the DLR report, per user and per
+  connector, each covering status so that status counts never read the rows
+
+Rollup tables (see rollups.py) are written with the same multi-row upserts,
+adding their deltas to the counters, latency histograms (see latency.py) with
+multi-row inserts.
+
+index_migration() lists the statements moving an existing table from its
+current indexes to a profile without blocking writes, see
+submit_log_indexes.py.
+"""
+
+import io
+from datetime import datetime, timedelta
+
+from psycopg2.extras import execute_values
+
+from bodies import BODY_COLUMNS
+from latency import LATENCY_COLUMNS
+
+# Column order of the rows handed to SubmitLogWriter.write()
+SUBMIT_LOG_COLUMNS = (
+    'msgid', 'source_addr', 'rate', 'pdu_count', 'charge',
+    'destination_addr', 'short_message', 'status', 'uid', 'created_at',
+    'binary_message', 'routed_cid', 'source_connector', 'status_at', 'body_hash',
+)
+
+# Secondary indexes of submit_log, as column lists
+INDEX_PROFILES = {
+    'full': (
+        ('source_connector',),
+        ('routed_cid',),
+        ('source_addr',),
+        ('destination_addr',),
+        ('status',),
+        ('uid',),
+        ('created_at',),
+        ('created_at', 'uid'),
+        ('created_at', 'uid', 'status'),
+        ('created_at', 'routed_cid'),
+        ('created_at', 'routed_cid', 'status'),
+        ('created_at', 'source_connector'),
+        ('created_at', 'source_connector', 'status'),
+    ),
+    'lean': (
+        ('created_at', 'status'),
+        ('uid', 'created_at', 'status'),
+        ('routed_cid', 'created_at', 'status'),
+    ),
+}
+
+MYSQL_CREATE_TABLE = ("""CREATE TABLE IF NOT EXISTS {table}  (
+        `msgid`            VARCHAR(45) NOT NULL,
+        `source_connector` VARCHAR(15),
+        `routed_cid`       VARCHAR(30),
+        `source_addr`      VARCHAR(40),
+        `destination_addr` VARCHAR(40) NOT NULL CHECK (`destination_addr` <> ''),
+        `rate`             DECIMAL(12, 7),
+        `charge`             DECIMAL(12, 7),
+        `pdu_count`        TINYINT(3) DEFAULT 1,
+        `short_message`    BLOB,
+        `binary_message`   BLOB,
+        `status`           VARCHAR(15) NOT NULL CHECK (`status` <> ''),
+        `uid`              VARCHAR(15) NOT NULL CHECK (`uid` <> ''),
+        `trials`           TINYINT(4) DEFAULT 1,
+        `created_at`       DATETIME NOT NULL,
+        `status_at`        DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        `body_hash`        CHAR(40),
+        PRIMARY KEY ({primary_key}){indexes}
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8 COLLATE=utf8_unicode_ci{partition_by};""")
+
+PSQL_CREATE_TABLE = ("""CREATE TABLE IF NOT EXISTS {table}  (
+        msgid VARCHAR(45) NOT NULL,
+        source_connector VARCHAR(15) NULL DEFAULT NULL,
+        routed_cid VARCHAR(30) NULL DEFAULT NULL,
+        source_addr VARCHAR(40) NULL DEFAULT NULL,
+        destination_addr VARCHAR(40) NOT NULL CHECK (destination_addr <> ''),
+        rate DECIMAL(12,7) NULL DEFAULT NULL,
+        charge DECIMAL(12,7) NULL DEFAULT NULL,
+        pdu_count SMALLINT NULL DEFAULT '1',
+        short_message BYTEA NULL DEFAULT NULL,
+        binary_message BYTEA NULL DEFAULT NULL,
+        status VARCHAR(15) NOT NULL CHECK (status <> ''),
+        uid VARCHAR(15) NOT NULL CHECK (uid <> ''),
+        trials SMALLINT NULL DEFAULT '1',
+        created_at TIMESTAMP(0) NOT NULL,
+        status_at TIMESTAMP(0) NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        body_hash CHAR(40) NULL DEFAULT NULL,
+        PRIMARY KEY ({primary_key})
+    ){partition_by};""")
+
+MYSQL_CREATE_ROLLUP_TABLE = ("""CREATE TABLE IF NOT EXISTS {table}  (
+        `bucket`           DATETIME NOT NULL,
+        `uid`              VARCHAR(15) NOT NULL,
+        `routed_cid`       VARCHAR(30) NOT NULL DEFAULT '',
+        `source_connector` VARCHAR(15) NOT NULL DEFAULT '',
+        `status`           VARCHAR(15) NOT NULL,
+        `messages`         INT NOT NULL DEFAULT 0,
+        `pdu_count`        INT NOT NULL DEFAULT 0,
+        `charge`           DECIMAL(20, 7) NOT NULL DEFAULT 0,
+        PRIMARY KEY (`bucket`, `uid`, `routed_cid`, `source_connector`, `status`)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8 COLLATE=utf8_unicode_ci;""")
+
+PSQL_CREATE_ROLLUP_TABLE = ("""CREATE TABLE IF NOT EXISTS {table}  (
+        bucket TIMESTAMP(0) NOT NULL,
+        uid VARCHAR(15) NOT NULL,
+        routed_cid VARCHAR(30) NOT NULL DEFAULT '',
+        source_connector VARCHAR(15) NOT NULL DEFAULT '',
+        status VARCHAR(15) NOT NULL,
+        messages INTEGER NOT NULL DEFAULT 0,
+        pdu_count INTEGER NOT NULL DEFAULT 0,
+        charge DECIMAL(20,7) NOT NULL DEFAULT 0,
+        PRIMARY KEY (bucket, uid, routed_cid, source_connector, status)
+    );""")
+
+MYSQL_CREATE_BODY_TABLE = ("""CREATE TABLE IF NOT EXISTS {table}  (
+        `hash`             CHAR(40) NOT NULL PRIMARY KEY,
+        `encoding`         VARCHAR(4) NOT NULL,
+        `ucs2`             TINYINT(1) NOT NULL DEFAULT 0,
+        `length`           INT NOT NULL,
+        `body`             BLOB,
+        `created_at`       DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8 COLLATE=utf8_unicode_ci;""")
+
+PSQL_CREATE_BODY_TABLE = ("""CREATE TABLE IF NOT EXISTS {table}  (
+        hash CHAR(40) NOT NULL PRIMARY KEY,
+        encoding VARCHAR(4) NOT NULL,
+        ucs2 BOOLEAN NOT NULL DEFAULT FALSE,
+        length INTEGER NOT NULL,
+        body BYTEA NULL DEFAULT NULL,
+        created_at TIMESTAMP(0) NOT NULL DEFAULT CURRENT_TIMESTAMP
+    );""")
+
+MYSQL_CREATE_LATENCY_TABLE = ("""CREATE TABLE IF NOT EXISTS {table}  (
+        `period`           DATETIME NOT NULL,
+        `shard`            SMALLINT NOT NULL DEFAULT 0,
+        `dimension`        VARCHAR(10) NOT NULL,
+        `name`             VARCHAR(30) NOT NULL,
+        `kind`             VARCHAR(15) NOT NULL,
+        `samples`          INT NOT NULL,
+        `sum_seconds`      DOUBLE NOT NULL,
+        `max_seconds`      DOUBLE NOT NULL,
+        `p50_seconds`      DOUBLE NOT NULL,
+        `p90_seconds`      DOUBLE NOT NULL,
+        `p99_seconds`      DOUBLE NOT NULL,
+        `buckets`          TEXT NOT NULL,
+        PRIMARY KEY (`period`, `shard`, `dimension`, `name`, `kind`)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8 COLLATE=utf8_unicode_ci;""")
+
+PSQL_CREATE_LATENCY_TABLE = ("""CREATE TABLE IF NOT EXISTS {table}  (
+        period TIMESTAMP(0) NOT NULL,
+        shard SMALLINT NOT NULL DEFAULT 0,
+        dimension VARCHAR(10) NOT NULL,
+        name VARCHAR(30) NOT NULL,
+        kind VARCHAR(15) NOT NULL,
+        samples INTEGER NOT NULL,
+        sum_seconds DOUBLE PRECISION NOT NULL,
+        max_seconds DOUBLE PRECISION NOT NULL,
+        p50_seconds DOUBLE PRECISION NOT NULL,
+        p90_seconds DOUBLE PRECISION NOT NULL,
+        p99_seconds DOUBLE PRECISION NOT NULL,
+        buckets TEXT NOT NULL,
+        PRIMARY KEY (period, shard, dimension, name, kind)
+    );""")
+
+ROLLUP_COLUMNS = (
+    'bucket', 'uid', 'routed_cid', 'source_connector', 'status', 'messages', 'pdu_count', 'charge',
+)
+
+
+def index_name(table, columns):
+    """Index name, the one PostgreSQL gives an unnamed index so that existing ones are recognized"""
+    return ('%s_%s_idx' % (table.split('.')[-1], '_'.join(columns)))[:63]
+
+
+def _index_changes(existing, profile):
+    """Split existing {name: columns} indexes into (columns to create, names to drop) for a profile.
+
+    An index whose columns are wanted more than once, as the duplicates left
+    by unnamed CREATE INDEX, is kept once.
+    """
+    wanted = set(INDEX_PROFILES[profile])
+    kept = set()
+    drop = []
+    for name, columns in sorted(existing.items()):
+        if columns in wanted and columns not in kept:
+            kept.add(columns)
+        else:
+            drop.append(name)
+    return [columns for columns in INDEX_PROFILES[profile] if columns not in kept], drop
+
+
+def as_datetime(value):
+    """created_at as Jasmin sets it, a string, or as read back from the database"""
+    if isinstance(value, str):
+        return datetime.strptime(value[:19].replace('T', ' '), '%Y-%m-%d %H:%M:%S')
+    return value
+
+
+def created_at_range(updates):
+    """(earliest, latest) created_at of (msgid, status, status_at, created_at) updates,
+    None when one of them is unknown"""
+    created = [as_datetime(update[3]) if len(update) > 3 else None for update in updates]
+    if not created or None in created:
+        return None
+    # Stored created_at are rounded to the second
+    return min(created), max(created) + timedelta(seconds=1)
+
+
+def _logged_rows(cursor, table, msgids, chunk_size):
+    """{msgid: (msgid, status, uid, routed_cid, source_connector, created_at, pdu_count, charge)} of the logged msgids"""
+    msgids = list(set(msgids))
+    logged = {}
+    for i in range(0, len(msgids), chunk_size):
+        chunk = msgids[i:i + chunk_size]
+        cursor.execute(
+            'SELECT msgid, status, uid, routed_cid, source_connector, created_at, pdu_count, charge '
+            'FROM {} WHERE msgid IN ({});'.format(table, ', '.join(['%s'] * len(chunk))),
+            chunk)
+        for row in cursor.fetchall():
+            logged[row[0]] = row
+    return logged
+
+
+class MySQLDialect(object):
+    name = 'MySQL'
+    # Rows per INSERT/UPDATE statement, keeps statements below max_allowed_packet
+    chunk_size = 1000
+
+    def __init__(self, partitions=None, index_profile='full'):
+        self.partitions = partitions
+        self.index_profile = index_profile
+
+    def _index(self, table, columns):
+        return 'INDEX `{}` ({})'.format(index_name(table, columns), ', '.join('`%s`' % c for c in columns))
+
+    def create_table(self, cursor, table):
+        indexes = ''.join(',\n        ' + self._index(table, columns)
+                          for columns in INDEX_PROFILES[self.index_profile])
+        if self.partitions is None:
+            cursor.execute(MYSQL_CREATE_TABLE.format(
+                table=table, primary_key='`msgid`', indexes=indexes, partition_by=''))
+        else:
+            cursor.execute(MYSQL_CREATE_TABLE.format(
+                table=table, primary_key='`msgid`, `created_at`', indexes=indexes,
+                partition_by=self.partitions.partition_by()))
+        return cursor.rowcount
+
+    def index_migration(self, cursor, table, profile):
+        """Statements switching table to the indexes of profile, run with autocommit"""
+        cursor.execute(
+            "SELECT INDEX_NAME, GROUP_CONCAT(COLUMN_NAME ORDER BY SEQ_IN_INDEX) FROM information_schema.STATISTICS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND NON_UNIQUE = 1 GROUP BY INDEX_NAME;",
+            (table,))
+        existing = {name: tuple(columns.split(',')) for name, columns in cursor.fetchall()}
+        create, drop = _index_changes(existing, profile)
+        # InnoDB builds and drops secondary indexes in place while writes go on
+        return ['ALTER TABLE {} ADD {}, ALGORITHM=INPLACE, LOCK=NONE;'.format(table, self._index(table, columns))
+                for columns in create] + \
+               ['ALTER TABLE {} DROP INDEX `{}`, ALGORITHM=INPLACE, LOCK=NONE;'.format(table, name)
+                for name in drop]
+
+    def maintain_partitions(self, cursor, table, today):
+        return self.partitions.maintain(cursor, table, today)
+
+    def upsert(self, cursor, table, rows, count_trials=True):
+        """Insert rows, bumping trials of the msgids that are already logged.
+
+        Without count_trials, rows of already logged msgids are left untouched.
+        """
+        row_placeholders = '(%s)' % ', '.join(['%s'] * len(SUBMIT_LOG_COLUMNS))
+        on_duplicate = 'trials = trials + 1' if count_trials else 'msgid = msgid'
+        for i in range(0, len(rows), self.chunk_size):
+            chunk = rows[i:i + self.chunk_size]
+            cursor.execute(
+                'INSERT INTO {} ({}) VALUES {} ON DUPLICATE KEY UPDATE {};'.format(
+                    table, ', '.join(SUBMIT_LOG_COLUMNS), ', '.join([row_placeholders] * len(chunk)), on_duplicate),
+                [value for row in chunk for value in row])
+
+    def logged_rows(self, cursor, table, msgids):
+        return _logged_rows(cursor, table, msgids, self.chunk_size)
+
+    def create_rollup_table(self, cursor, table):
+        cursor.execute(MYSQL_CREATE_ROLLUP_TABLE.format(table=table))
+
+    def apply_rollups(self, cursor, table, rows):
+        """Add (bucket, uid, routed_cid, source_connector, status, messages, pdu_count, charge) deltas"""
+        row_placeholders = '(%s)' % ', '.join(['%s'] * len(ROLLUP_COLUMNS))
+        for i in range(0, len(rows), self.chunk_size):
+            chunk = rows[i:i + self.chunk_size]
+            cursor.execute(
+                'INSERT INTO {} ({}) VALUES {} ON DUPLICATE KEY UPDATE messages = messages + VALUES(messages), '
+                'pdu_count = pdu_count + VALUES(pdu_count), charge = charge + VALUES(charge);'.format(
+                    table, ', '.join(ROLLUP_COLUMNS), ', '.join([row_placeholders] * len(chunk))),
+                [value for row in chunk for value in row])
+
+    def add_missing_columns(self, cursor, table):
+        """Add the columns of SUBMIT_LOG_COLUMNS a table created by an earlier version lacks"""
+        cursor.execute(
+            "SELECT COUNT(*) FROM information_schema.COLUMNS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = 'body_hash';", (table,))
+        if not cursor.fetchone()[0]:
+            cursor.execute('ALTER TABLE {} ADD COLUMN `body_hash` CHAR(40);'.format(table))
+            return ['body_hash']
+        return []
+
+    def create_body_table(self, cursor, table):
+        cursor.execute(MYSQL_CREATE_BODY_TABLE.format(table=table))
+
+    def insert_bodies(self, cursor, table, rows):
+        """Insert (hash, encoding, ucs2, length, body) rows, leaving the known hashes untouched"""
+        row_placeholders = '(%s)' % ', '.join(['%s'] * len(BODY_COLUMNS))
+        for i in range(0, len(rows), self.chunk_size):
+            chunk = rows[i:i + self.chunk_size]
+            cursor.execute(
+                'INSERT INTO {} ({}) VALUES {} ON DUPLICATE KEY UPDATE hash = hash;'.format(
+                    table, ', '.join(BODY_COLUMNS), ', '.join([row_placeholders] * len(chunk))),
+                [value for row in chunk for value in row])
+
+    def create_latency_table(self, cursor, table):
+        cursor.execute(MYSQL_CREATE_LATENCY_TABLE.format(table=table))
+
+    def insert_latencies(self, cursor, table, rows):
+        row_placeholders = '(%s)' % ', '.join(['%s'] * len(rows[0]))
+        for i in range(0, len(rows), self.chunk_size):
+            chunk = rows[i:i + self.chunk_size]
+            cursor.execute(
+                'INSERT INTO {} ({}) VALUES {};'.format(
+                    table, ', '.join(LATENCY_COLUMNS), ', '.join([row_placeholders] * len(chunk))),
+                [value for row in chunk for value in row])
+
+    def update_status(self, cursor, table, updates):
+        """Set status and status_at from a list of (msgid, status, status_at, created_at)"""
+        for i in range(0, len(updates), self.chunk_size):
+            chunk = updates[i:i + self.chunk_size]
+            values = ' UNION ALL '.join(
+                ['SELECT %s AS msgid, %s AS status, %s AS status_at'] * len(chunk))
+            params = [value for update in chunk for value in update[:3]]
+            bounds = created_at_range(chunk) if self.partitions is not None else None
+            where = ''
+            if bounds is not None:
+                where = ' WHERE t.created_at BETWEEN %s AND %s'
+                params.extend(bounds)
+            cursor.execute(
+                'UPDATE {} AS t JOIN ({}) AS v ON t.msgid = v.msgid '
+                'SET t.status = v.status, t.status_at = v.status_at{};'.format(table, values, where),
+                params)
+
+
+def _copy_text(value):
+    """Render a value in COPY text format"""
+    if value is None:
+        return '\\N'
+    if isinstance(value, (bytes, bytearray)):
+        return '\\\\x' + value.hex()
+    return str(value).replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
+
+class PostgreSQLDialect(object):
+    name = 'psql'
+    # msgids per lookup statement
+    chunk_size = 1000
+
+    def __init__(self, partitions=None, index_profile='full'):
+        self.partitions = partitions
+        self.index_profile = index_profile
+        # Unique keys of a partitioned table must include its partition key
+        self.conflict_key = 'msgid' if partitions is None else 'msgid, created_at'
+
+    def create_table(self, cursor, table):
+        cursor.execute('SELECT to_regclass(%s);', (table,))
+        if cursor.fetchone()[0] is not None:
+            # The indexes of an existing table are left to submit_log_indexes.py
+            return 0
+        if self.partitions is None:
+            cursor.execute(PSQL_CREATE_TABLE.format(table=table, primary_key='msgid', partition_by=''))
+        else:
+            cursor.execute(PSQL_CREATE_TABLE.format(
+                table=table, primary_key='msgid, created_at', partition_by=self.partitions.partition_by()))
+        # Named, so that a shard creating the table concurrently doesn't add duplicates
+        for columns in INDEX_PROFILES[self.index_profile]:
+            cursor.execute('CREATE INDEX IF NOT EXISTS {} ON {} ({});'.format(
+                index_name(table, columns), table, ', '.join(columns)))
+        return 1
+
+    def index_migration(self, cursor, table, profile):
+        """Statements switching table to the indexes of profile, run with autocommit"""
+        cursor.execute(
+            "SELECT i.relname, array_agg(a.attname::text ORDER BY k.n) FROM pg_index x "
+            "JOIN pg_class i ON i.oid = x.indexrelid "
+            "CROSS JOIN LATERAL unnest(x.indkey) WITH ORDINALITY AS k (attnum, n) "
+            "JOIN pg_attribute a ON a.attrelid = x.indrelid AND a.attnum = k.attnum "
+            "WHERE x.indrelid = %s::regclass AND NOT x.indisunique GROUP BY i.relname;", (table,))
+        existing = {name: tuple(columns) for name, columns in cursor.fetchall()}
+        create, drop = _index_changes(existing, profile)
+
+        cursor.execute(
+            "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = %s::regclass ORDER BY c.relname;", (table,))
+        partitions = [name for (name,) in cursor.fetchall()]
+
+        statements = []
+        for columns in create:
+            name = index_name(table, columns)
+            if not partitions:
+                statements.append('CREATE INDEX CONCURRENTLY IF NOT EXISTS {} ON {} ({});'.format(
+                    name, table, ', '.join(columns)))
+                continue
+            # A partitioned index can't be built concurrently: build it on every
+            # partition concurrently, then attach them to an index ON ONLY the parent
+            statements.append('CREATE INDEX IF NOT EXISTS {} ON ONLY {} ({});'.format(
+                name, table, ', '.join(columns)))
+            for partition in partitions:
+                partition_index = index_name(partition, columns)
+                statements.append('CREATE INDEX CONCURRENTLY IF NOT EXISTS {} ON {} ({});'.format(
+                    partition_index, partition, ', '.join(columns)))
+                statements.append('ALTER INDEX {} ATTACH PARTITION {};'.format(name, partition_index))
+        for name in drop:
+            if partitions:
+                statements.append('DROP INDEX IF EXISTS {};'.format(name))
+            else:
+                statements.append('DROP INDEX CONCURRENTLY IF EXISTS {};'.format(name))
+        return statements
+
+    def maintain_partitions(self, cursor, table, today):
+        cursor.execute("SELECT relkind FROM pg_class WHERE oid = %s::regclass;", (table,))
+        if cursor.fetchone()[0] != 'p':
+            # Created before partitioning was enabled, still keyed on msgid alone
+            self.conflict_key = 'msgid'
+            return [], []
+        return self.partitions.maintain(cursor, table, today)
+
+    def upsert(self, cursor, table, rows, count_trials=True):
+        """Stream rows through COPY into a staging table, then merge them into table.
+
+        A msgid logged more than once in the same batch is merged as one row
+        whose trials is the number of times it was seen. Without count_trials,
+        rows of already logged msgids are left untouched.
+        """
+        staging = '%s_staging' % table.split('.')[-1]
+        columns = ', '.join(SUBMIT_LOG_COLUMNS)
+
+        cursor.execute(
+            'CREATE TEMPORARY TABLE IF NOT EXISTS {} (LIKE {} INCLUDING DEFAULTS) ON COMMIT DELETE ROWS;'.format(
+                staging, table))
+
+        buf = io.StringIO()
+        for row in rows:
+            buf.write('\t'.join(_copy_text(value) for value in row))
+            buf.write('\n')
+        buf.seek(0)
+        cursor.copy_expert('COPY {} ({}) FROM STDIN;'.format(staging, columns), buf)
+
+        if count_trials:
+            on_conflict = 'DO UPDATE SET trials = {}.trials + EXCLUDED.trials'.format(table)
+        else:
+            on_conflict = 'DO NOTHING'
+        cursor.execute(
+            """INSERT INTO {table} ({columns}, trials)
+                SELECT DISTINCT ON (msgid) {columns}, COUNT(*) OVER (PARTITION BY msgid)
+                FROM {staging} ORDER BY msgid
+                ON CONFLICT ({conflict_key}) {on_conflict};""".format(
+                table=table, columns=columns, staging=staging, conflict_key=self.conflict_key,
+                on_conflict=on_conflict))
+
+    def update_status(self, cursor, table, updates):
+        """Set status and status_at from a list of (msgid, status, status_at, created_at)"""
+        bounds = created_at_range(updates) if self.partitions is not None else None
+        where = ''
+        if bounds is not None:
+            # Literal bounds, so that the planner prunes the other partitions
+            where = cursor.mogrify(' AND t.created_at BETWEEN %s AND %s', bounds).decode()
+        execute_values(
+            cursor,
+            'UPDATE {} AS t SET status = v.status, status_at = v.status_at '
+            'FROM (VALUES %s) AS v (msgid, status, status_at) WHERE t.msgid = v.msgid{};'.format(
+                table, where.replace('%', '%%')),
+            [update[:3] for update in updates],
+            page_size=len(updates))
+
+    def logged_rows(self, cursor, table, msgids):
+        return _logged_rows(cursor, table, msgids, self.chunk_size)
+
+    def create_rollup_table(self, cursor, table):
+        cursor.execute(PSQL_CREATE_ROLLUP_TABLE.format(table=table))
+
+    def apply_rollups(self, cursor, table, rows):
+        """Add (bucket, uid, routed_cid, source_connector, status, messages, pdu_count, charge) deltas"""
+        execute_values(
+            cursor,
+            'INSERT INTO {} AS r ({}) VALUES %s '
+            'ON CONFLICT (bucket, uid, routed_cid, source_connector, status) DO UPDATE SET '
+            'messages = r.messages + EXCLUDED.messages, pdu_count = r.pdu_count + EXCLUDED.pdu_count, '
+            'charge = r.charge + EXCLUDED.charge;'.format(table, ', '.join(ROLLUP_COLUMNS)),
+            rows,
+            page_size=len(rows))
+
+    def add_missing_columns(self, cursor, table):
+        """Add the columns of SUBMIT_LOG_COLUMNS a table created by an earlier version lacks"""
+        cursor.execute(
+            "SELECT COUNT(*) FROM pg_attribute "
+            "WHERE attrelid = %s::regclass AND attname = 'body_hash' AND NOT attisdropped;", (table,))
+        if not cursor.fetchone()[0]:
+            cursor.execute('ALTER TABLE {} ADD COLUMN body_hash CHAR(40) NULL DEFAULT NULL;'.format(table))
+            return ['body_hash']
+        return []
+
+    def create_body_table(self, cursor, table):
+        cursor.execute(PSQL_CREATE_BODY_TABLE.format(table=table))
+
+    def insert_bodies(self, cursor, table, rows):
+        """Insert (hash, encoding, ucs2, length, body) rows, leaving the known hashes untouched"""
+        execute_values(
+            cursor,
+            'INSERT INTO {} ({}) VALUES %s ON CONFLICT (hash) DO NOTHING;'.format(table, ', '.join(BODY_COLUMNS)),
+            rows,
+            page_size=len(rows))
+
+    def create_latency_table(self, cursor, table):
+        cursor.execute(PSQL_CREATE_LATENCY_TABLE.format(table=table))
+
+    def insert_latencies(self, cursor, table, rows):
+        execute_values(
+            cursor,
+            'INSERT INTO {} ({}) VALUES %s;'.format(table, ', '.join(LATENCY_COLUMNS)),
+            rows,
+            page_size=len(rows))
@@ -8,4 +8,8 @@ cd "$APP_DIR"
 
 source "$APP_DIR"/env/bin/activate
 
-"$APP_DIR"/env/bin/python sms_logger.py
\ No newline at end of file
+if [ "${SHARD_COUNT:-1}" -gt 1 ]; then
+  "$APP_DIR"/env/bin/python sms_logger_supervisor.py
+else
+  "$APP_DIR"/env/bin/python sms_logger.py
+fi
\ No newline at end of file
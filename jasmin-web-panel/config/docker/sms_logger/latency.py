@@ -0,0 +1,83 @@
+"""Delivery latency histograms of sms_logger.
+
+The logger times every message from its submit_sm to its submit_sm_resp
+(submit_resp) and to its final DLR (submit_dlr). Latencies are counted in
+streaming histograms with fixed log-scale buckets, one per routed_cid and one
+per uid, which are flushed to <table>_latency and reset every
+LATENCY_FLUSH_INTERVAL. A flushed row holds the bucket counts of one
+histogram over one interval along with its p50/p90/p99 estimates, so that
+slow connectors show up without scanning submit_log.
+"""
+
+from bisect import bisect_left
+
+# Upper bounds, in seconds, of the histogram buckets: from 10ms to about 2 days
+# growing by sqrt(2), plus an overflow bucket
+BOUNDS = tuple(0.01 * 2 ** (i / 2.0) for i in range(50))
+
+KINDS = ('submit_resp', 'submit_dlr')
+
+# Columns of the rows of LatencyTracker.drain()
+LATENCY_COLUMNS = (
+    'period', 'shard', 'dimension', 'name', 'kind', 'samples', 'sum_seconds', 'max_seconds',
+    'p50_seconds', 'p90_seconds', 'p99_seconds', 'buckets',
+)
+
+
+def latency_table(table):
+    return '%s_latency' % table
+
+
+class Histogram(object):
+    __slots__ = ('counts', 'samples', 'sum', 'max')
+
+    def __init__(self):
+        self.counts = [0] * (len(BOUNDS) + 1)
+        self.samples = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect_left(BOUNDS, seconds)] += 1
+        self.samples += 1
+        self.sum += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, p):
+        """Upper bound of the bucket holding the p-th percentile, capped by the max"""
+        rank = self.samples * p / 100.0
+        cumulative = 0
+        for i, count in enumerate(self.counts):
+            cumulative += count
+            if count and cumulative >= rank:
+                return min(BOUNDS[i], self.max) if i < len(BOUNDS) else self.max
+        return self.max
+
+
+class LatencyTracker(object):
+    """Histograms keyed by (dimension, name, kind), dimension being routed_cid or uid"""
+
+    def __init__(self):
+        self.histograms = {}
+
+    def __len__(self):
+        return len(self.histograms)
+
+    def observe(self, kind, routed_cid, uid, seconds):
+        if seconds < 0:
+            return
+        for key in (('routed_cid', routed_cid or ''), ('uid', '' if uid is None else str(uid))):
+            histogram = self.histograms.get(key + (kind,))
+            if histogram is None:
+                histogram = self.histograms[key + (kind,)] = Histogram()
+            histogram.observe(seconds)
+
+    def drain(self, period, shard):
+        """Rows of the histograms observed since the last drain, which are reset"""
+        histograms, self.histograms = self.histograms, {}
+        return [
+            (period, shard, dimension, name, kind, h.samples, h.sum, h.max,
+             h.percentile(50), h.percentile(90), h.percentile(99), ','.join(str(c) for c in h.counts))
+            for (dimension, name, kind), h in sorted(histograms.items())
+        ]
@@ -0,0 +1,165 @@
+"""In-process stand-in of the AMQP broker consumed by sms_logger.
+
+Broker plays the txamqp connection and channel gotConnection() talks to, and
+delivers what is published to it through the consumer queue. It honours
+basic.qos and cumulative acks as RabbitMQ does, so the consumer gets the same
+backpressure, which lets the logger run without RabbitMQ on synthetic or
+recorded traffic.
+"""
+
+from collections import OrderedDict, deque
+from time import monotonic
+
+from twisted.internet import defer
+from txamqp.queue import Closed
+
+
+class Message(object):
+    """A delivery, as txamqp hands it to the consumer"""
+
+    class Content(object):
+        def __init__(self, body, properties):
+            self.body = body
+            self.properties = properties
+
+    def __init__(self, delivery_tag, routing_key, body, properties):
+        self.delivery_tag = delivery_tag
+        self.redelivered = False
+        self.routing_key = routing_key
+        self.content = self.Content(body, properties)
+
+
+class Queue(object):
+    """Consumer queue, get() raises Closed once closed as txamqp's does"""
+
+    def __init__(self):
+        self.messages = deque()
+        self.waiting = deque()
+        self.closed = False
+
+    def put(self, msg):
+        if self.waiting:
+            self.waiting.popleft().callback(msg)
+        else:
+            self.messages.append(msg)
+
+    def get(self):
+        if self.messages:
+            return defer.succeed(self.messages.popleft())
+        if self.closed:
+            return defer.fail(Closed())
+        d = defer.Deferred()
+        self.waiting.append(d)
+        return d
+
+    def close(self):
+        self.closed = True
+        while self.waiting:
+            self.waiting.popleft().errback(Closed())
+
+
+class DeclareOk(object):
+    """queue.declare-ok of the queue every delivery goes to"""
+    message_count = 0
+
+
+class Broker(object):
+    """In-process stand-in of the broker, its connection and its channels.
+
+    There is a single queue: with SHARD_COUNT > 1 the shard consumes every
+    delivery, not only its share.
+    """
+
+    def __init__(self):
+        self.consumer_queue = Queue()
+        self.backlog = deque()
+        self.prefetch_count = 0
+        self.next_tag = 1
+        # delivery tag: publish time, in delivery order
+        self.unacked = OrderedDict()
+        self.published = 0
+        self.acked = 0
+        self.latencies = []
+        self._drained = []
+
+    def publish(self, routing_key, body, properties):
+        self.backlog.append((routing_key, body, properties, monotonic()))
+        self.published += 1
+        self._deliver()
+
+    def _deliver(self):
+        while self.backlog and (not self.prefetch_count or len(self.unacked) < self.prefetch_count):
+            routing_key, body, properties, published_at = self.backlog.popleft()
+            self.unacked[self.next_tag] = published_at
+            self.consumer_queue.put(Message(self.next_tag, routing_key, body, properties))
+            self.next_tag += 1
+
+    # Connection
+    def start(self, response):
+        return defer.succeed(None)
+
+    def channel(self, channel_id):
+        return defer.succeed(self)
+
+    def queue(self, consumer_tag):
+        return defer.succeed(self.consumer_queue)
+
+    def connection_close(self):
+        return defer.succeed(None)
+
+    # Channel
+    def channel_open(self):
+        return defer.succeed(None)
+
+    def channel_close(self):
+        return defer.succeed(None)
+
+    def queue_declare(self, queue):
+        return defer.succeed(DeclareOk())
+
+    def queue_bind(self, queue, exchange, routing_key):
+        return defer.succeed(None)
+
+    def queue_unbind(self, queue, exchange, routing_key):
+        return defer.succeed(None)
+
+    def queue_delete(self, queue, if_empty=False):
+        return defer.succeed(None)
+
+    def exchange_declare(self, exchange, type, durable=False, arguments=None):
+        return defer.succeed(None)
+
+    def exchange_bind(self, destination, source, routing_key):
+        return defer.succeed(None)
+
+    def basic_qos(self, prefetch_count):
+        self.prefetch_count = prefetch_count
+        return defer.succeed(None)
+
+    def basic_consume(self, queue, no_ack, consumer_tag):
+        return defer.succeed(None)
+
+    def basic_cancel(self, consumer_tag):
+        return defer.succeed(None)
+
+    def basic_ack(self, delivery_tag, multiple=False):
+        now = monotonic()
+        while self.unacked:
+            tag = next(iter(self.unacked))
+            if tag > delivery_tag:
+                break
+            self.latencies.append(now - self.unacked.pop(tag))
+            self.acked += 1
+        self._deliver()
+        if self.acked == self.published:
+            waiting, self._drained = self._drained, []
+            for d in waiting:
+                d.callback(None)
+
+    def drained(self):
+        """Deferred fired once every delivery published so far is acked"""
+        if self.acked == self.published:
+            return defer.succeed(None)
+        d = defer.Deferred()
+        self._drained.append(d)
+        return d
@@ -0,0 +1,127 @@
+"""Prometheus metrics of sms_logger.
+
+Metrics are plain counters kept in the reactor thread, work done in the writer
+thread reports back with reactor.callFromThread(), so none of them needs a lock.
+MetricsResource serves them in the Prometheus text exposition format from the
+logger's own reactor: rendering only reads the counters and never waits on
+the consumer or the database.
+"""
+
+from twisted.web.resource import Resource
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    return '{%s}' % ','.join('%s="%s"' % (name, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+                             for name, value in sorted(labels.items()))
+
+
+def _value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter(object):
+    """A counter incremented explicitly, or read from a callable at every scrape"""
+    type = 'counter'
+
+    def __init__(self, name, help, label=None, read=None):
+        self.name = name
+        self.help = help
+        self.label = label
+        self.read = read
+        # An unlabelled counter is exposed from 0, before its first increment
+        self.values = {} if label else {None: 0}
+
+    def inc(self, label_value=None, amount=1):
+        self.values[label_value] = self.values.get(label_value, 0) + amount
+
+    def samples(self):
+        if self.read is not None:
+            yield self.name, {}, self.read()
+            return
+        for label_value, value in sorted(self.values.items(), key=lambda item: str(item[0])):
+            yield self.name, {self.label: label_value} if self.label else {}, value
+
+
+class Gauge(object):
+    """A gauge set explicitly, or read from a callable at every scrape"""
+    type = 'gauge'
+
+    def __init__(self, name, help, read=None):
+        self.name = name
+        self.help = help
+        self.read = read
+        self.value = 0
+
+    def set(self, value):
+        self.value = value
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def dec(self, amount=1):
+        self.value -= amount
+
+    def samples(self):
+        yield self.name, {}, self.read() if self.read is not None else self.value
+
+
+class Histogram(object):
+    type = 'histogram'
+
+    def __init__(self, name, help, buckets):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets) + (float('inf'),)
+        self.counts = [0] * len(self.buckets)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.sum += value
+        self.count += 1
+
+    def samples(self):
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            yield self.name + '_bucket', {'le': _value(bound)}, cumulative
+        yield self.name + '_sum', {}, self.sum
+        yield self.name + '_count', {}, self.count
+
+
+class Registry(object):
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def exposition(self):
+        lines = []
+        for metric in self.metrics:
+            lines.append('# HELP %s %s' % (metric.name, metric.help))
+            lines.append('# TYPE %s %s' % (metric.name, metric.type))
+            for name, labels, value in metric.samples():
+                lines.append('%s%s %s' % (name, _labels(labels), _value(value)))
+        return '\n'.join(lines) + '\n'
+
+
+class MetricsResource(Resource):
+    isLeaf = True
+
+    def __init__(self, registry):
+        Resource.__init__(self)
+        self.registry = registry
+
+    def render_GET(self, request):
+        request.setHeader(b'Content-Type', b'text/plain; version=0.0.4; charset=utf-8')
+        return self.registry.exposition().encode()
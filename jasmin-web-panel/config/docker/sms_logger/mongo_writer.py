@@ -0,0 +1,128 @@
+"""MongoDB submit_log writer for sms_logger.
+
+Documents of the submit_log collection have the fields of the SQL table,
+keyed by msgid, and are read as such by the ai-client billing report:
+created_at is kept as the string Jasmin sets, rate and charge are numbers.
+
+A batch is written with two unordered bulk_write calls: one upsert per
+submit_sm_resp, bumping trials of the msgids already logged unless the
+delivery was redelivered, then the DLR status updates. The upserts must go first as an unordered bulk_write may
+apply its operations in any order.
+"""
+
+from time import sleep
+
+from pymongo import ASCENDING, MongoClient, UpdateOne
+from pymongo import errors as _mongo_errors
+
+from bodies import BodyEncoder, body_table
+from dialects import SUBMIT_LOG_COLUMNS
+from sinks import Sink
+
+# Indexes of the collection, for the ai-client reports
+MONGO_INDEXES = (
+    (('uid', ASCENDING), ('created_at', ASCENDING)),
+    (('created_at', ASCENDING), ('status', ASCENDING)),
+)
+
+
+def _number(value):
+    # Bills amounts may be Decimals, which BSON can't encode
+    return float(value) if value is not None else None
+
+
+class MongoSubmitLogWriter(Sink):
+    """Writes batches of submit_log inserts and DLR updates to a MongoDB collection.
+
+    The client is created on first use and reconnects on its own. Batches
+    are retried with an exponential backoff until MongoDB is reachable, a
+    batch retried after a partial write bumps trials of its already upserted
+    msgids once more. Documents MongoDB rejects are logged and dropped.
+    """
+
+    def __init__(self, uri, database='', collection='submit_log', body_storage='inline', body_compression='none'):
+        Sink.__init__(self)
+        self.uri = uri
+        self.database = database
+        self.collection = collection
+        self.body_encoder = BodyEncoder(body_compression) if body_storage == 'interned' else None
+        self.client = None
+        self.db = None
+
+    def _run(self, work, *args, retry=True):
+        delay = 1
+        while True:
+            try:
+                if self.client is None:
+                    self.client = MongoClient(self.uri)
+                    # The database of the URI, as the ai-client uses it, unless overridden
+                    self.db = self.client[self.database] if self.database else self.client.get_default_database(
+                        default='jasmin')
+                result = work(*args)
+                if not self.connected:
+                    self.connected = True
+                    self.connects += 1
+                    print("*** %s to MongoDB" % ('Connected' if self.connects == 1 else 'Re-connected'), flush=True)
+                return result
+            except _mongo_errors.ConnectionFailure as e:
+                self.connected = False
+                self.connection_failures += 1
+                self.last_error = str(e)
+                if not retry:
+                    raise
+                print('*** MongoDB connection failure, retrying in %ss: %s' % (delay, e), flush=True)
+                sleep(delay)
+                delay = min(delay * 2, 30)
+
+    def _bulk_write(self, collection, operations, what):
+        """Unordered bulk_write, returns the result or None when some operations were rejected"""
+        try:
+            return self.db[collection].bulk_write(operations, ordered=False)
+        except _mongo_errors.BulkWriteError as e:
+            write_errors = e.details.get('writeErrors', [])
+            self.last_error = write_errors[0]['errmsg'] if write_errors else str(e)
+            print('*** Dropped %s of %s %s: %s' % (len(write_errors), len(operations), what, self.last_error),
+                  flush=True)
+
+    def _create_indexes(self):
+        for keys in MONGO_INDEXES:
+            self.db[self.collection].create_index(list(keys))
+
+    def create_table(self):
+        self._run(self._create_indexes)
+        print('*** {} collection indexes are ready'.format(self.collection), flush=True)
+        self.table_ready = True
+
+    def _write(self, inserts, updates, bodies, redelivered):
+        if bodies and self.body_encoder is not None:
+            self._bulk_write(body_table(self.collection), [
+                UpdateOne({'_id': h}, {'$setOnInsert': {
+                    'encoding': encoding, 'ucs2': ucs2, 'length': length, 'body': body}}, upsert=True)
+                for h, encoding, ucs2, length, body in self.body_encoder.rows(bodies)
+            ], 'submit_log bodies')
+
+        if inserts:
+            operations = []
+            for row in inserts:
+                document = dict(zip(SUBMIT_LOG_COLUMNS, row))
+                document['rate'] = _number(document['rate'])
+                document['charge'] = _number(document['charge'])
+                if document['msgid'] in redelivered:
+                    # May already be stored, it's only inserted if it isn't
+                    document['trials'] = 1
+                    update = {'$setOnInsert': document}
+                else:
+                    update = {'$setOnInsert': document, '$inc': {'trials': 1}}
+                operations.append(UpdateOne({'_id': document['msgid']}, update, upsert=True))
+            self._bulk_write(self.collection, operations, 'submit_log rows')
+
+        if updates:
+            self._bulk_write(self.collection, [
+                UpdateOne({'_id': msgid}, {'$set': {'status': status, 'status_at': status_at}})
+                for msgid, status, status_at in (update[:3] for update in updates)
+            ], 'submit_log status updates')
+
+    def write(self, inserts, updates, bodies=None, redelivered=()):
+        if not self.table_ready:
+            self.create_table()
+        self._run(self._write, inserts, updates, bodies, redelivered)
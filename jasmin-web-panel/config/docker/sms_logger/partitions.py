@@ -0,0 +1,178 @@
+"""Time partitioning of submit_log on created_at.
+
+The table is range partitioned on created_at with one partition per day or per
+month. maintain() pre-creates the partitions of the upcoming periods and drops
+or detaches the ones older than the retention, so that retention never needs
+a DELETE and queries filtering on created_at only scan the partitions they need.
+
+Partitioning requires created_at to be part of every unique key, the primary
+key of a partitioned table is therefore (msgid, created_at).
+
+- MySQL: partitions p<period> of RANGE (TO_DAYS(created_at)), plus a pmax
+  catch-all partition which new partitions are split from. A detached partition
+  is exchanged into a standalone <table>_p<period> table. MySQL DDL commits
+  statement by statement, a detach interrupted half-way is resumed by the
+  next run.
+- PostgreSQL: declarative partitions <table>_p<period>, plus a
+  <table>_pdefault DEFAULT partition. A detached partition stays as a
+  standalone table.
+"""
+
+from datetime import date, datetime, timedelta
+
+PERIODS = {
+    'daily': '%Y%m%d',
+    'monthly': '%Y%m',
+}
+
+
+class Partitions(object):
+    """Partition periods arithmetic shared by the dialects"""
+
+    def __init__(self, period='daily', precreate=3, retention=0, expire_action='detach'):
+        if period not in PERIODS:
+            raise ValueError('Unknown partitioning period: %s' % period)
+        if expire_action not in ('drop', 'detach'):
+            raise ValueError('Unknown partition expire action: %s' % expire_action)
+        self.period = period
+        self.precreate = precreate
+        self.retention = retention
+        self.expire_action = expire_action
+
+    def start_of(self, day):
+        return day if self.period == 'daily' else day.replace(day=1)
+
+    def next_start(self, start):
+        if self.period == 'daily':
+            return start + timedelta(days=1)
+        return (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+    def previous_start(self, start):
+        if self.period == 'daily':
+            return start - timedelta(days=1)
+        return (start - timedelta(days=1)).replace(day=1)
+
+    def suffix(self, start):
+        return start.strftime(PERIODS[self.period])
+
+    def parse_suffix(self, suffix):
+        """Period start of a partition suffix, None if it is not one of ours"""
+        try:
+            return datetime.strptime(suffix, PERIODS[self.period]).date()
+        except ValueError:
+            return None
+
+    def wanted(self, today):
+        """Starts of the current and the pre-created periods"""
+        start = self.start_of(today)
+        starts = [start]
+        for _ in range(self.precreate):
+            start = self.next_start(start)
+            starts.append(start)
+        return starts
+
+    def is_expired(self, start, today):
+        if not self.retention:
+            return False
+        oldest = self.start_of(today)
+        for _ in range(self.retention - 1):
+            oldest = self.previous_start(oldest)
+        return start < oldest
+
+
+class MySQLPartitions(Partitions):
+
+    def partition_by(self, today=None):
+        """PARTITION BY clause of CREATE TABLE"""
+        definitions = [self._definition(start) for start in self.wanted(today or date.today())]
+        definitions.append('PARTITION pmax VALUES LESS THAN MAXVALUE')
+        return '\n    PARTITION BY RANGE (TO_DAYS(`created_at`)) (\n        %s\n    )' % ',\n        '.join(definitions)
+
+    def _definition(self, start):
+        return "PARTITION p%s VALUES LESS THAN (TO_DAYS('%s'))" % (self.suffix(start), self.next_start(start))
+
+    def maintain(self, cursor, table, today):
+        """Add upcoming partitions and expire old ones, returns (created, expired) partition names"""
+        cursor.execute(
+            "SELECT PARTITION_NAME FROM information_schema.PARTITIONS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND PARTITION_NAME IS NOT NULL;",
+            (table,))
+        existing = {}
+        for (name,) in cursor.fetchall():
+            start = self.parse_suffix(name[1:]) if name.startswith('p') else None
+            if start is not None:
+                existing[name] = start
+        if not existing:
+            return [], []
+
+        # Partitions can only be split from pmax, after the last existing one
+        last = max(existing.values())
+        missing = [start for start in self.wanted(today) if start > last]
+        if missing:
+            cursor.execute('ALTER TABLE {} REORGANIZE PARTITION pmax INTO ({}, {});'.format(
+                table,
+                ', '.join(self._definition(start) for start in missing),
+                'PARTITION pmax VALUES LESS THAN MAXVALUE'))
+
+        expired = sorted(name for name, start in existing.items() if self.is_expired(start, today))
+        for name in expired:
+            if self.expire_action == 'detach':
+                self._exchange(cursor, table, name, '%s_%s' % (table, name))
+            cursor.execute('ALTER TABLE {} DROP PARTITION {};'.format(table, name))
+
+        return ['p%s' % self.suffix(start) for start in missing], expired
+
+    def _exchange(self, cursor, table, name, archive):
+        """Move the rows of partition name to the archive table, skipping the steps an earlier run did"""
+        cursor.execute(
+            "SELECT COUNT(*) FROM information_schema.TABLES WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s;",
+            (archive,))
+        if not cursor.fetchone()[0]:
+            cursor.execute('CREATE TABLE {} LIKE {};'.format(archive, table))
+        cursor.execute(
+            "SELECT COUNT(*) FROM information_schema.PARTITIONS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND PARTITION_NAME IS NOT NULL;",
+            (archive,))
+        if cursor.fetchone()[0]:
+            cursor.execute('ALTER TABLE {} REMOVE PARTITIONING;'.format(archive))
+        # Created empty, the archive only holds rows once exchanged
+        cursor.execute('SELECT 1 FROM {} LIMIT 1;'.format(archive))
+        if cursor.fetchone() is None:
+            cursor.execute('ALTER TABLE {} EXCHANGE PARTITION {} WITH TABLE {};'.format(table, name, archive))
+
+
+class PostgreSQLPartitions(Partitions):
+
+    def partition_by(self, today=None):
+        """PARTITION BY clause of CREATE TABLE, partitions are added by maintain()"""
+        return ' PARTITION BY RANGE (created_at)'
+
+    def maintain(self, cursor, table, today):
+        """Add upcoming partitions and expire old ones, returns (created, expired) partition names"""
+        prefix = '%s_p' % table.split('.')[-1]
+        cursor.execute(
+            "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = %s::regclass;", (table,))
+        existing = {}
+        for (name,) in cursor.fetchall():
+            start = self.parse_suffix(name[len(prefix):]) if name.startswith(prefix) else None
+            if start is not None:
+                existing[name] = start
+
+        created = []
+        for start in self.wanted(today):
+            name = prefix + self.suffix(start)
+            if name not in existing:
+                cursor.execute(
+                    "CREATE TABLE IF NOT EXISTS {} PARTITION OF {} FOR VALUES FROM ('{}') TO ('{}');".format(
+                        name, table, start, self.next_start(start)))
+                created.append(name)
+        cursor.execute('CREATE TABLE IF NOT EXISTS {}default PARTITION OF {} DEFAULT;'.format(prefix, table))
+
+        expired = sorted(name for name, start in existing.items() if self.is_expired(start, today))
+        for name in expired:
+            cursor.execute('ALTER TABLE {} DETACH PARTITION {};'.format(table, name))
+            if self.expire_action == 'drop':
+                cursor.execute('DROP TABLE {};'.format(name))
+
+        return created, expired
@@ -0,0 +1,99 @@
+"""Pre-aggregated submit_log counters maintained by sms_logger.
+
+Every batch written to submit_log also updates <table>_rollup_minute and
+<table>_rollup_hour in the same transaction. A rollup row counts the messages
+created in its bucket by uid, routed_cid, source_connector and current status,
+with their pdu_count and charge sums, so reports read a few rows per bucket
+instead of scanning submit_log.
+
+Rollups follow the status of submit_log: a message is counted once when its
+row is first inserted, and a DLR changing its status moves it from the bucket
+row of its old status to the one of its new status. Redelivered and replayed
+rows of already logged messages are not counted again.
+"""
+
+from decimal import Decimal
+
+from dialects import SUBMIT_LOG_COLUMNS, as_datetime
+
+ROLLUP_GRANULARITIES = ('minute', 'hour')
+
+# Columns of the rows returned by dialect.logged_rows()
+LOGGED_COLUMNS = ('msgid', 'status', 'uid', 'routed_cid', 'source_connector', 'created_at', 'pdu_count', 'charge')
+
+_column = {name: i for i, name in enumerate(SUBMIT_LOG_COLUMNS)}
+
+
+def rollup_table(table, granularity):
+    return '%s_rollup_%s' % (table, granularity)
+
+
+def _as_decimal(value):
+    # Inserted rows carry the float charges of the bills, logged rows the
+    # Decimals of the database
+    if value is None:
+        return Decimal(0)
+    return value if isinstance(value, Decimal) else Decimal(str(value))
+
+
+def _bucket(created_at, granularity):
+    if granularity == 'minute':
+        return created_at.replace(second=0, microsecond=0)
+    return created_at.replace(minute=0, second=0, microsecond=0)
+
+
+class RollupDeltas(object):
+    """Counter deltas of one batch, keyed by (created_at bucket, uid, routed_cid, source_connector, status)"""
+
+    def __init__(self):
+        self.deltas = {granularity: {} for granularity in ROLLUP_GRANULARITIES}
+
+    def __bool__(self):
+        return any(self.deltas.values())
+
+    def add(self, created_at, uid, routed_cid, source_connector, status, messages, pdu_count, charge):
+        created_at = as_datetime(created_at)
+        dimensions = (
+            '' if uid is None else str(uid),
+            routed_cid or '',
+            source_connector or '',
+            status,
+        )
+        for granularity, deltas in self.deltas.items():
+            key = (_bucket(created_at, granularity),) + dimensions
+            delta = deltas.setdefault(key, [0, 0, Decimal(0)])
+            delta[0] += messages
+            delta[1] += pdu_count or 0
+            delta[2] += _as_decimal(charge)
+
+    def add_inserts(self, inserts, logged):
+        """Count the inserted rows whose msgid was not logged before the batch"""
+        seen = set(logged)
+        for row in inserts:
+            msgid = row[_column['msgid']]
+            if msgid in seen:
+                continue
+            seen.add(msgid)
+            self.add(row[_column['created_at']], row[_column['uid']], row[_column['routed_cid']],
+                     row[_column['source_connector']], row[_column['status']],
+                     1, row[_column['pdu_count']], row[_column['charge']])
+
+    def add_updates(self, updates, logged):
+        """Move the messages whose status changes to their new status"""
+        for update in updates:
+            msgid, status = update[0], update[1]
+            row = logged.get(msgid)
+            if row is None or row[1] == status:
+                continue
+            _, old_status, uid, routed_cid, source_connector, created_at, pdu_count, charge = row
+            self.add(created_at, uid, routed_cid, source_connector, old_status,
+                     -1, -(pdu_count or 0), -_as_decimal(charge))
+            self.add(created_at, uid, routed_cid, source_connector, status,
+                     1, pdu_count, charge)
+
+    def rows(self, granularity):
+        """Non-zero (bucket, uid, routed_cid, source_connector, status, messages, pdu_count, charge) rows.
+
+        Rows are sorted so that concurrent shards lock rollup rows in the same order.
+        """
+        return [key + tuple(delta) for key, delta in sorted(self.deltas[granularity].items()) if any(delta)]
@@ -0,0 +1,142 @@
+"""Sinks sms_logger writes its batches to.
+
+A sink is what gotConnection()'s writer_factory returns: SubmitLogWriter for
+MySQL/PostgreSQL, MongoSubmitLogWriter for MongoDB, or a SinkGroup feeding
+several of them. Like SubmitLogWriter, every sink method blocks on I/O and is
+called from the logger's writer thread only.
+"""
+
+
+class Sink(object):
+    """Interface of the sinks, with the defaults of a sink that has no spill file,
+    partitions nor latency histograms.
+
+    write() must not return before the batch is stored, or spilled: the
+    deliveries of the batch are acked once it returns. A batch that failed
+    is redelivered, so the rows of redelivered deliveries must be stored
+    idempotently.
+    """
+    spill = None
+
+    def __init__(self):
+        self.table_ready = False
+        # Connection health
+        self.connected = False
+        self.connects = 0
+        self.connection_failures = 0
+        self.last_error = None
+
+    def create_table(self):
+        """Create whatever the sink stores batches into"""
+
+    def write(self, inserts, updates, bodies=None, redelivered=()):
+        """Store one batch of submit_log inserts, DLR updates and interned bodies.
+
+        redelivered holds the msgids of the inserts whose delivery was
+        redelivered: the first delivery may already be stored, by this sink or
+        before another sink of a SinkGroup failed, so these rows don't count a
+        trial for a msgid already logged.
+        """
+        raise NotImplementedError
+
+    def replay_spill(self):
+        """Write some spilled batches back, returns whether spilled batches are left"""
+        return False
+
+    def maintain_partitions(self):
+        pass
+
+    def write_latencies(self, rows):
+        pass
+
+    def stats(self):
+        return {
+            'connected': self.connected,
+            'connects': self.connects,
+            'connection_failures': self.connection_failures,
+            'last_error': self.last_error,
+            'spilled_batches': self.spill.spilled if self.spill is not None else 0,
+            'replayed_batches': self.spill.replayed if self.spill is not None else 0,
+            'spill_bytes': self.spill.size if self.spill is not None else 0,
+        }
+
+
+class SinkGroup(Sink):
+    """Feeds every batch to several sinks, one after the other.
+
+    A batch is acked once all of the sinks stored it, so the slowest sink
+    sets the pace. A sink with a spill file keeps the others going while its
+    database is unreachable, one without it holds them back until it is
+    reachable again.
+
+    Sinks don't share a transaction: when a sink fails the batch is not
+    acked and the sinks before it keep their writes. The whole batch is
+    redelivered, its inserts as redelivered ones which don't count trials
+    again, and its DLR updates are simply set once more.
+    """
+
+    def __init__(self, sinks):
+        # Health and readiness are the sinks' own
+        self.sinks = sinks
+
+    @property
+    def spill(self):
+        # sms_logger only needs to know whether there is one to replay
+        for sink in self.sinks:
+            if sink.spill is not None:
+                return sink.spill
+        return None
+
+    def create_table(self):
+        for sink in self.sinks:
+            sink.create_table()
+
+    def write(self, inserts, updates, bodies=None, redelivered=()):
+        for sink in self.sinks:
+            sink.write(inserts, updates, bodies, redelivered)
+
+    def replay_spill(self):
+        return any([sink.replay_spill() for sink in self.sinks])
+
+    def maintain_partitions(self):
+        for sink in self.sinks:
+            sink.maintain_partitions()
+
+    def write_latencies(self, rows):
+        for sink in self.sinks:
+            sink.write_latencies(rows)
+
+    @property
+    def table_ready(self):
+        return all(sink.table_ready for sink in self.sinks)
+
+    @property
+    def connected(self):
+        return all(sink.connected for sink in self.sinks)
+
+    @property
+    def connects(self):
+        return sum(sink.connects for sink in self.sinks)
+
+    @property
+    def connection_failures(self):
+        return sum(sink.connection_failures for sink in self.sinks)
+
+    @property
+    def last_error(self):
+        errors = [sink.last_error for sink in self.sinks if sink.last_error is not None]
+        return errors[-1] if errors else None
+
+    def stats(self):
+        stats = {}
+        for sink in self.sinks:
+            for key, value in sink.stats().items():
+                if key not in stats:
+                    stats[key] = value
+                elif key == 'connected':
+                    stats[key] = stats[key] and value
+                elif key == 'last_error':
+                    stats[key] = value if value is not None else stats[key]
+                else:
+                    stats[key] += value
+        return stats
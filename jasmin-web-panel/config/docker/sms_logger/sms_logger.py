@@ -10,14 +10,84 @@ Requirement:
 
 Optional:
 - SET ENVIRONMENT ENV:
+    + SINKS             # Default: sql          # Comma separated stores batches are written to: sql (the DB_* database) and/or mongo
+    + MONGO_URI         # Default: mongodb://127.0.0.1:27017/jasmin # MongoDB of the mongo sink, the ai-client's MONGO_URI
+    + MONGO_DATABASE    # Default: ''           # Database of the mongo sink, the one of MONGO_URI if empty
+    + MONGO_COLLECTION  # Default: submit_log   # Collection of the mongo sink, read by the ai-client reports
     + DB_TYPE_MYSQL     # Default: 1            # 1 for MySQL, 0 for PostgreSQL
     + DB_HOST           # Default: 127.0.0.1    # IP or Docker container name
     + DB_DATABASE       # Default: jasmin       # should Exist
     + DB_TABLE          # Default: submit_log   # the script will create it if it doesn't Exist
     + DB_USER           # Default: jasmin       # for the Database connection.
     + DB_PASS           # Default: jadmin       # for the Database connection
+    + DB_POOL_SIZE      # Default: 2            # Connections kept open by the logger's writers
+    + DB_INDEX_PROFILE  # Default: full         # Secondary indexes of a created table, full or lean, see dialects.py
+    + DB_ROLLUPS        # Default: 0            # 1 to maintain the per minute/hour rollup tables, see rollups.py
+    + DB_BODY_STORAGE   # Default: inline       # inline or interned, to store each distinct body once in ${DB_TABLE}_body, see bodies.py
+    + DB_BODY_COMPRESSION # Default: none       # none, zlib or zstd (needs the zstandard package) for interned bodies
     + AMQP_BROKER_HOST  # Default: 127.0.0.1    # RabbitMQ host used by Jasmin SMS Gateway. IP or Docker container name
     + AMQP_BROKER_PORT  # Default: 5672         # RabbitMQ port used by Jasmin SMS Gateway. IP or Docker container name
+    + BATCH_MAX_SIZE    # Default: 500          # Max deliveries written (and acked) per DB transaction
+    + BATCH_MAX_LATENCY # Default: 1.0          # Max seconds a delivery waits in the batch before it is flushed
+    + DB_WRITER_QUEUE_SIZE # Default: 4         # Max batches handed off to the DB writer thread before consuming pauses
+    + AMQP_PREFETCH_COUNT # Default: 0          # Max unacked deliveries, 0 to size it as BATCH_MAX_SIZE * (DB_WRITER_QUEUE_SIZE + 1)
+    + CORRELATION_MAX_SIZE # Default: 1000000   # Max in-flight messages kept waiting for their resp/DLR
+    + CORRELATION_TTL   # Default: 86400        # Seconds an in-flight message is kept waiting for its final DLR
+    + CORRELATION_JOURNAL # Default: ''         # File keeping in-flight messages across restarts, disabled if empty
+    + DEDUP_CAPACITY    # Default: 1000000      # Delivery keys per generation of the redelivery filter, disabled if 0, see dedup.py
+    + DEDUP_ERROR_RATE  # Default: 0.00001      # False positive rate of the redelivery filter
+    + DEDUP_LRU_SIZE    # Default: 100000       # Most recent delivery keys also kept exactly
+    + DEDUP_JOURNAL     # Default: ''           # Prefix of the files keeping delivery keys across restarts, disabled if empty
+    + SPILL_FILE        # Default: ''           # File batches are spilled to while the database is unreachable, disabled if empty
+    + SPILL_REPLAY_INTERVAL # Default: 5        # Seconds between attempts to write spilled batches back
+    + SHARD_COUNT       # Default: 1            # Number of sms_logger processes sharing the traffic
+    + SHARD_INDEX       # Default: 0            # Shard handled by this process, from 0 to SHARD_COUNT - 1
+    + LATENCY_FLUSH_INTERVAL # Default: 0       # Seconds between flushes of the latency histograms to ${DB_TABLE}_latency, disabled if 0
+    + METRICS_PORT      # Default: 0            # Port of the Prometheus /metrics endpoint, plus SHARD_INDEX when sharded, disabled if 0
+    + METRICS_INTERFACE # Default: 0.0.0.0      # Interface the metrics endpoint listens on
+    + DB_PARTITIONING   # Default: ''           # daily or monthly to create the table partitioned on created_at, disabled if empty
+    + PARTITION_PRECREATE # Default: 3          # Upcoming partitions created ahead of time
+    + PARTITION_RETENTION # Default: 0          # Partitions kept, counting the current one, 0 to keep them all
+    + PARTITION_EXPIRE_ACTION # Default: detach # detach or drop the partitions past the retention
+    + PARTITION_MAINTENANCE_INTERVAL # Default: 3600 # Seconds between partition maintenance runs
+
+Sharding:
+    With SHARD_COUNT > 1, the routes are bound to the sms_logger.shards consistent
+    hash exchange, which hashes the message-id property, and every shard consumes its
+    own sms_logger_queue.<SHARD_INDEX> queue bound to it: each message reaches one
+    shard only. A submit_sm, its submit_sm_resp and its DLRs all share the
+    message-id, so they always reach the same shard's correlation store.
+    sms_logger_supervisor.py launches and monitors the shard processes.
+    This needs RabbitMQ's rabbitmq_consistent_hash_exchange plugin, and an
+    AMQP_SPEC_FILE with its exchange.bind extension, as the one of
+    config/docker/jasmin/jasmin/resource. The unsharded sms_logger_queue is unbound,
+    and deleted once empty. Queues of shards removed by lowering SHARD_COUNT keep
+    their share of the traffic until they are deleted.
+
+Partitioning:
+    With DB_PARTITIONING set, the table is created range partitioned on created_at,
+    one partition per day or per month, and its primary key becomes
+    (msgid, created_at). Upcoming partitions are created ahead of time and the ones
+    past PARTITION_RETENTION are detached or dropped instead of deleting rows, by
+    the logger (shard 0 only) or by submit_log_maintenance.py run from cron.
+    An existing unpartitioned table is left as it is.
+
+Indexes:
+    DB_INDEX_PROFILE picks the secondary indexes of the table, "full" keeps the 13
+    indexes listed below, "lean" only the 3 composites used by the DLR report, which
+    makes inserts and DLR updates much cheaper. submit_log_indexes.py switches an
+    existing table between profiles online.
+
+Bodies:
+    With DB_BODY_STORAGE=interned, rows leave short_message and binary_message empty
+    and reference their raw body by body_hash instead, each distinct body being
+    stored once in ${DB_TABLE}_body, compressed with DB_BODY_COMPRESSION. The panel
+    decodes bodies when it displays them. body_hash is added to an existing table.
+
+Sinks:
+    Batches are written to the DB_* database, to the MongoDB collection the ai-client
+    reports read (see mongo_writer.py), or to both with SINKS=sql,mongo. With both, a
+    batch is acked once both stores have it.
 
 Database Scheme:
 - MySQL table:
@@ -37,6 +107,7 @@ Database Scheme:
         `trials`           TINYINT(4) DEFAULT 1,
         `created_at`       DATETIME NOT NULL,
         `status_at`        DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        `body_hash`        CHAR(40),
         INDEX (`source_connector`),
         INDEX (`routed_cid`),
         INDEX (`source_addr`),
@@ -67,7 +138,8 @@ Database Scheme:
         uid VARCHAR(15) NOT NULL CHECK (uid <> ''),
         trials SMALLINT NULL DEFAULT '1',
         created_at TIMESTAMP(0) NOT NULL,
-        status_at TIMESTAMP(0) NOT NULL DEFAULT CURRENT_TIMESTAMP
+        status_at TIMESTAMP(0) NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        body_hash CHAR(40) NULL DEFAULT NULL
     );
     CREATE INDEX ON ${DB_TABLE} (source_connector);
     CREATE INDEX ON ${DB_TABLE} (routed_cid);
@@ -84,26 +156,43 @@ Database Scheme:
     CREATE INDEX ON ${DB_TABLE} (created_at, source_connector, status);
 """
 
+import argparse
 import os
-from time import sleep
+from time import sleep, monotonic, time
 import pickle as pickle
-import binascii
 from datetime import datetime
-from twisted.internet.defer import inlineCallbacks
-from twisted.internet import reactor
+from twisted.internet.defer import inlineCallbacks, DeferredSemaphore
+from twisted.internet import reactor, task
 from twisted.internet.protocol import ClientCreator
+from twisted.internet.threads import deferToThreadPool
 from twisted.python import log
+from twisted.python.threadpool import ThreadPool
+from twisted.web.server import Site
 from txamqp.protocol import AMQClient
 from txamqp.client import TwistedDelegate
+from txamqp.queue import Closed
 import txamqp.spec
 
 from smpp.pdu.pdu_types import DataCoding
 
-from mysql.connector import connect as _mysql_connect
-from psycopg2 import pool as _postgres_pool
-from psycopg2 import Error as _postgres_error
-
-q = {}
+from capture import CaptureReader, CaptureWriter, replay
+from bodies import body_hash
+from dedup import RedeliveryFilter, dedup_key
+from correlation import CorrelationEntry, CorrelationJournal, CorrelationStore, FINAL_DLR_STATUSES
+from latency import LatencyTracker
+from local_broker import Broker
+from metrics import Counter, Gauge, Histogram, MetricsResource, Registry
+from mongo_writer import MongoSubmitLogWriter
+from partitions import MySQLPartitions, PostgreSQLPartitions
+from sinks import SinkGroup
+from spill import SpillFile
+from writer import SubmitLogWriter
+
+# Stores batches are written to
+sinks = [sink.strip() for sink in os.getenv('SINKS', 'sql').split(',') if sink.strip()]
+mongo_uri = os.getenv('MONGO_URI', 'mongodb://127.0.0.1:27017/jasmin')
+mongo_database = os.getenv('MONGO_DATABASE', '')
+mongo_collection = os.getenv('MONGO_COLLECTION', 'submit_log')
 
 # Database connection parameters
 db_type_mysql = int(os.getenv('DB_TYPE_MYSQL', '1')) == 1
@@ -112,34 +201,179 @@ db_database = os.getenv('DB_DATABASE', 'jasmin')
 db_table = os.getenv('DB_TABLE', 'submit_log')
 db_user = os.getenv('DB_USER', 'jasmin')
 db_pass = os.getenv('DB_PASS', 'jadmin')
+db_pool_size = int(os.getenv('DB_POOL_SIZE', '2'))
+db_index_profile = os.getenv('DB_INDEX_PROFILE', 'full')
+db_rollups = int(os.getenv('DB_ROLLUPS', '0')) == 1
+db_body_storage = os.getenv('DB_BODY_STORAGE', 'inline')
+db_body_compression = os.getenv('DB_BODY_COMPRESSION', 'none')
 # AMQB broker connection parameters
 amqp_broker_host = os.getenv('AMQP_BROKER_HOST', '127.0.0.1')
 amqp_broker_port = int(os.getenv('AMQP_BROKER_PORT', '5672'))
-
-
-def get_psql_conn():
-    psql_pool = _postgres_pool.SimpleConnectionPool(
-        1,
-        20,
-        user=db_user,
-        password=db_pass,
-        host=db_host,
-        database=db_database)
-    return psql_pool.getconn()
-
-
-def get_mysql_conn():
-    return _mysql_connect(
-        user=db_user,
-        password=db_pass,
-        host=db_host,
-        database=db_database,
-        pool_name="mypool",
-        pool_size=20)
+# Write batching parameters
+batch_max_size = int(os.getenv('BATCH_MAX_SIZE', '500'))
+batch_max_latency = float(os.getenv('BATCH_MAX_LATENCY', '1.0'))
+db_writer_queue_size = int(os.getenv('DB_WRITER_QUEUE_SIZE', '4'))
+spill_file = os.getenv('SPILL_FILE', '')
+spill_replay_interval = float(os.getenv('SPILL_REPLAY_INTERVAL', '5'))
+# Enough unacked deliveries to fill every batch handed off to the writer plus the
+# one being built, capped to the AMQP short prefetch-count
+amqp_prefetch_count = int(os.getenv('AMQP_PREFETCH_COUNT', '0')) or min(
+    batch_max_size * (db_writer_queue_size + 1), 65535)
+# Sharding parameters
+shard_count = int(os.getenv('SHARD_COUNT', '1'))
+shard_index = int(os.getenv('SHARD_INDEX', '0'))
+# Exchange spreading the messages over the shard queues
+shard_exchange = 'sms_logger.shards'
+if shard_count > 1:
+    queue_name = 'sms_logger_queue.%s' % shard_index
+    consumer_tag = 'sms_logger.%s' % shard_index
+else:
+    queue_name = 'sms_logger_queue'
+    consumer_tag = 'sms_logger'
+# In-flight messages correlation parameters
+correlation_max_size = int(os.getenv('CORRELATION_MAX_SIZE', '1000000'))
+correlation_ttl = int(os.getenv('CORRELATION_TTL', '86400'))
+correlation_journal = os.getenv('CORRELATION_JOURNAL', '')
+# Redelivery de-duplication parameters, see dedup.py
+dedup_capacity = int(os.getenv('DEDUP_CAPACITY', '1000000'))
+dedup_error_rate = float(os.getenv('DEDUP_ERROR_RATE', '0.00001'))
+dedup_lru_size = int(os.getenv('DEDUP_LRU_SIZE', '100000'))
+dedup_journal = os.getenv('DEDUP_JOURNAL', '')
+# Delivery latency histograms, see latency.py
+latency_flush_interval = int(os.getenv('LATENCY_FLUSH_INTERVAL', '0'))
+# Metrics endpoint parameters
+metrics_port = int(os.getenv('METRICS_PORT', '0'))
+metrics_interface = os.getenv('METRICS_INTERFACE', '0.0.0.0')
+# submit_log partitioning parameters
+db_partitioning = os.getenv('DB_PARTITIONING', '')
+partition_precreate = int(os.getenv('PARTITION_PRECREATE', '3'))
+partition_retention = int(os.getenv('PARTITION_RETENTION', '0'))
+partition_expire_action = os.getenv('PARTITION_EXPIRE_ACTION', 'detach')
+partition_maintenance_interval = int(os.getenv('PARTITION_MAINTENANCE_INTERVAL', '3600'))
+if db_partitioning:
+    partitions = (MySQLPartitions if db_type_mysql else PostgreSQLPartitions)(
+        period=db_partitioning,
+        precreate=partition_precreate,
+        retention=partition_retention,
+        expire_action=partition_expire_action)
+else:
+    partitions = None
+
+q = CorrelationStore(
+    max_size=correlation_max_size,
+    ttl=correlation_ttl,
+    journal=CorrelationJournal(correlation_journal) if correlation_journal else None)
+
+if dedup_capacity > 0:
+    dedup = RedeliveryFilter(
+        capacity=dedup_capacity,
+        error_rate=dedup_error_rate,
+        lru_size=dedup_lru_size,
+        journal=dedup_journal or None)
+else:
+    dedup = None
+
+latencies = LatencyTracker()
+
+metrics = Registry()
+messages_consumed = metrics.register(Counter(
+    'sms_logger_messages_consumed_total', 'AMQP deliveries consumed, by routing key class', label='class'))
+unknown_resp = metrics.register(Counter(
+    'sms_logger_unknown_resp_total', 'submit_sm_resp of a submit_sm missing from the correlation store'))
+redeliveries_dropped = metrics.register(Counter(
+    'sms_logger_redeliveries_dropped_total', 'Redelivered deliveries acked without being written again, '
+    'by where their key was found', label='source'))
+unknown_dlr = metrics.register(Counter(
+    'sms_logger_unknown_dlr_total', 'DLRs of a submit_sm missing from the correlation store'))
+unacked_deliveries = metrics.register(Gauge(
+    'sms_logger_unacked_deliveries', 'Deliveries consumed and not acked yet'))
+batch_size = metrics.register(Histogram(
+    'sms_logger_batch_size', 'Deliveries per batch handed off to the writer',
+    buckets=(1, 10, 50, 100, 250, 500, 1000, 2500, 5000)))
+db_write_seconds = metrics.register(Histogram(
+    'sms_logger_db_write_seconds', 'Time spent writing a batch, spilling it included',
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)))
+metrics.register(Gauge(
+    'sms_logger_correlation_size', 'In-flight messages waiting for their resp/DLR', read=lambda: len(q)))
+
+
+def create_writer(**kwargs):
+    """The writer of the SINKS, built from the SubmitLogWriter arguments"""
+    writers = []
+    if 'sql' in sinks:
+        writers.append(SubmitLogWriter(**kwargs))
+    if 'mongo' in sinks:
+        writers.append(MongoSubmitLogWriter(
+            uri=mongo_uri,
+            database=mongo_database,
+            collection=mongo_collection,
+            body_storage=kwargs.get('body_storage', 'inline'),
+            body_compression=kwargs.get('body_compression', 'none')))
+    if not writers:
+        raise ValueError('No known sink in SINKS: %s' % ','.join(sinks))
+    return writers[0] if len(writers) == 1 else SinkGroup(writers)
+
+
+def routing_key_class(routing_key):
+    if routing_key[:15] == 'submit.sm.resp.':
+        return 'submit.sm.resp'
+    if routing_key[:10] == 'submit.sm.':
+        return 'submit.sm'
+    if routing_key[:12] == 'dlr_thrower.':
+        return 'dlr_thrower'
+    return 'other'
+
+
+class SubmitLogBatch(object):
+    """Pending submit_log writes and the AMQP deliveries that produced them.
+
+    Every consumed delivery joins the batch, even when it does not write
+    anything, so that it is acked only once the batch carrying it has been
+    committed.
+
+    DLR updates are keyed by msgid: a later DLR of the same message in the
+    same batch supersedes the earlier one, which is never written.
+
+    Interned bodies are keyed by body_hash, a campaign body is carried once.
+    The msgids of inserts coming from redelivered deliveries are kept apart,
+    the sinks store them without counting a trial, see Sink.write().
+    The de-duplication keys of the deliveries are remembered once the batch
+    is committed.
+    """
+
+    def __init__(self):
+        self.inserts = []
+        self.updates = {}
+        self.bodies = {}
+        self.delivery_tags = []
+        self.keys = []
+        self.redelivered = set()
+
+    def __len__(self):
+        return len(self.delivery_tags)
+
+    def add(self, delivery_tag, insert=None, update=None, body=None, key=None, redelivered=False):
+        if key is not None:
+            self.keys.append(key)
+        if insert is not None:
+            self.inserts.append(insert)
+            if redelivered:
+                self.redelivered.add(insert[0])
+        if body is not None:
+            self.bodies[insert[-1]] = body
+        if update is not None:
+            self.updates[update[0]] = update
+        self.delivery_tags.append(delivery_tag)
 
 
 @inlineCallbacks
-def gotConnection(conn, username, password):
+def gotConnection(conn, username, password, writer_factory=create_writer, capture=None):
+    """Consume the logger's queue on conn until it is closed.
+
+    writer_factory builds the sink batches are handed off to, see sinks.py,
+    it takes the SubmitLogWriter arguments. Consumed deliveries are recorded
+    to capture, a CaptureWriter, if given.
+    """
     print("*** Connected to broker, authenticating: %s" % username, flush=True)
     yield conn.start({"LOGIN": username, "PASSWORD": password})
 
@@ -147,131 +381,237 @@ def gotConnection(conn, username, password):
     chan = yield conn.channel(1)
     yield chan.channel_open()
 
-    yield chan.queue_declare(queue="sms_logger_queue")
-
-    # Bind to submit.sm.* and submit.sm.resp.* routes to track sent messages
-    yield chan.queue_bind(queue="sms_logger_queue", exchange="messaging", routing_key='submit.sm.*')
-    yield chan.queue_bind(queue="sms_logger_queue", exchange="messaging", routing_key='submit.sm.resp.*')
-    # Bind to dlr_thrower.* to track DLRs
-    yield chan.queue_bind(queue="sms_logger_queue", exchange="messaging", routing_key='dlr_thrower.*')
-
-    yield chan.basic_consume(queue='sms_logger_queue', no_ack=False, consumer_tag="sms_logger")
-    queue = yield conn.queue("sms_logger")
-
-    if db_type_mysql:
-        db_conn = get_mysql_conn()
-        if db_conn:
-            print("*** Pooling 20 connections", flush=True)
-            print("*** Connected to MySQL", flush=True)
-    else:
-        db_conn = get_psql_conn()
-        if db_conn:
-            print("*** Pooling 20 connections", flush=True)
-            print("*** Connected to psql", flush=True)
-
-    cursor = db_conn.cursor()
-
-    if db_type_mysql:
-        create_table = ("""CREATE TABLE IF NOT EXISTS {}  (
-                `msgid`            VARCHAR(45) PRIMARY KEY,
-                `source_connector` VARCHAR(15),
-                `routed_cid`       VARCHAR(30),
-                `source_addr`      VARCHAR(40),
-                `destination_addr` VARCHAR(40) NOT NULL CHECK (`destination_addr` <> ''),
-                `rate`             DECIMAL(12, 7),
-                `charge`             DECIMAL(12, 7),
-                `pdu_count`        TINYINT(3) DEFAULT 1,
-                `short_message`    BLOB,
-                `binary_message`   BLOB,
-                `status`           VARCHAR(15) NOT NULL CHECK (`status` <> ''),
-                `uid`              VARCHAR(15) NOT NULL CHECK (`uid` <> ''),
-                `trials`           TINYINT(4) DEFAULT 1,
-                `created_at`       DATETIME NOT NULL,
-                `status_at`        DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
-                INDEX (`source_connector`),
-                INDEX (`routed_cid`),
-                INDEX (`source_addr`),
-                INDEX (`destination_addr`),
-                INDEX (`status`),
-                INDEX (`uid`),
-                INDEX (`created_at`),
-                INDEX (`created_at`, `uid`),
-                INDEX (`created_at`, `uid`, `status`),
-                INDEX (`created_at`, `routed_cid`),
-                INDEX (`created_at`, `routed_cid`, `status`),
-                INDEX (`created_at`, `source_connector`),
-                INDEX (`created_at`, `source_connector`, `status`)
-            ) ENGINE=InnoDB DEFAULT CHARSET=utf8 COLLATE=utf8_unicode_ci;""".format(db_table))
-    else:
-        create_table = ("""CREATE TABLE IF NOT EXISTS {}  (
-                msgid VARCHAR(45) NOT NULL PRIMARY KEY,
-                source_connector VARCHAR(15) NULL DEFAULT NULL,
-                routed_cid VARCHAR(30) NULL DEFAULT NULL,
-                source_addr VARCHAR(40) NULL DEFAULT NULL,
-                destination_addr VARCHAR(40) NOT NULL CHECK (destination_addr <> ''),
-                rate DECIMAL(12,7) NULL DEFAULT NULL,
-                charge DECIMAL(12,7) NULL DEFAULT NULL,
-                pdu_count SMALLINT NULL DEFAULT '1',
-                short_message BYTEA NULL DEFAULT NULL,
-                binary_message BYTEA NULL DEFAULT NULL,
-                status VARCHAR(15) NOT NULL CHECK (status <> ''),
-                uid VARCHAR(15) NOT NULL CHECK (uid <> ''),
-                trials SMALLINT NULL DEFAULT '1',
-                created_at TIMESTAMP(0) NOT NULL,
-                status_at TIMESTAMP(0) NOT NULL DEFAULT CURRENT_TIMESTAMP
-            );
-            CREATE INDEX ON {} (source_connector);
-            CREATE INDEX ON {} (routed_cid);
-            CREATE INDEX ON {} (source_addr);
-            CREATE INDEX ON {} (destination_addr);
-            CREATE INDEX ON {} (status);
-            CREATE INDEX ON {} (uid);
-            CREATE INDEX ON {} (created_at);
-            CREATE INDEX ON {} (created_at, uid);
-            CREATE INDEX ON {} (created_at, uid, status);
-            CREATE INDEX ON {} (created_at, routed_cid);
-            CREATE INDEX ON {} (created_at, routed_cid, status);
-            CREATE INDEX ON {} (created_at, source_connector);
-            CREATE INDEX ON {} (created_at, source_connector, status);
-            """.format(db_table, db_table, db_table,
-                       db_table, db_table, db_table,
-                       db_table, db_table, db_table,
-                       db_table, db_table, db_table,
-                       db_table, db_table, ))
-
-    cursor.execute(create_table)
-    if cursor.rowcount > 0:
-        print('*** {} table was created successfully'.format(db_table), flush=True)
+    yield chan.queue_declare(queue=queue_name)
+    yield chan.basic_qos(prefetch_count=amqp_prefetch_count)
+    print("*** Prefetching up to %s deliveries" % amqp_prefetch_count, flush=True)
+
+    # Bind to submit.sm.* and submit.sm.resp.* routes to track sent messages,
+    # to dlr_thrower.* to track DLRs
+    routes = ('submit.sm.*', 'submit.sm.resp.*', 'dlr_thrower.*')
+    if shard_count > 1:
+        yield chan.exchange_declare(exchange=shard_exchange, type='x-consistent-hash', durable=True,
+                                    arguments={'hash-property': 'message_id'})
+        for route in routes:
+            yield chan.exchange_bind(destination=shard_exchange, source="messaging", routing_key=route)
+        # Every shard gets the same weight
+        yield chan.queue_bind(queue=queue_name, exchange=shard_exchange, routing_key='1')
+        print("*** Handling shard %s of %s" % (shard_index, shard_count), flush=True)
+
+        if shard_index == 0:
+            # The queue of the unsharded logger would keep every message forever
+            unsharded = yield chan.queue_declare(queue='sms_logger_queue')
+            for route in routes:
+                yield chan.queue_unbind(queue='sms_logger_queue', exchange="messaging", routing_key=route)
+            if unsharded.message_count:
+                print('*** sms_logger_queue unbound, %s deliveries left in it are not logged' %
+                      unsharded.message_count, flush=True)
+            else:
+                yield chan.queue_delete(queue='sms_logger_queue', if_empty=True)
     else:
-        print('*** {} table already exist'.format(db_table), flush=True)
+        for route in routes:
+            yield chan.queue_bind(queue=queue_name, exchange="messaging", routing_key=route)
+
+    if q.journal is not None:
+        q.restore()
+        print('*** Restored %s in-flight messages from %s' % (len(q), q.journal.path), flush=True)
+    if dedup is not None and dedup.journal is not None:
+        dedup.restore()
+        reactor.addSystemEventTrigger('during', 'shutdown', dedup.close)
+        print('*** Restored %s delivery keys from %s.*' % (dedup.restored, dedup.journal), flush=True)
+
+    yield chan.basic_consume(queue=queue_name, no_ack=False, consumer_tag=consumer_tag)
+    queue = yield conn.queue(consumer_tag)
+
+    # Database I/O blocks, it is done by a single writer thread so that batches
+    # are committed in order while the reactor keeps consuming
+    db_threadpool = ThreadPool(minthreads=1, maxthreads=1, name='sms_logger-writer')
+    db_threadpool.start()
+    reactor.addSystemEventTrigger('during', 'shutdown', db_threadpool.stop)
+    db_writers = DeferredSemaphore(db_writer_queue_size)
+
+    writer = writer_factory(
+        mysql=db_type_mysql,
+        host=db_host,
+        database=db_database,
+        table=db_table,
+        user=db_user,
+        password=db_pass,
+        pool_size=db_pool_size,
+        spill=SpillFile(spill_file) if spill_file else None,
+        partitions=partitions,
+        index_profile=db_index_profile,
+        rollups=db_rollups,
+        latencies=latency_flush_interval > 0,
+        body_storage=db_body_storage,
+        body_compression=db_body_compression)
+    yield deferToThreadPool(reactor, db_threadpool, writer.create_table)
+
+    metrics.register(Counter(
+        'sms_logger_db_connects_total', 'Database connections opened, reconnections included',
+        read=lambda: writer.connects))
+    metrics.register(Counter(
+        'sms_logger_db_connection_failures_total', 'Database connection failures',
+        read=lambda: writer.connection_failures))
+    metrics.register(Gauge(
+        'sms_logger_db_connected', 'Whether the writer holds a database connection',
+        read=lambda: int(writer.connected)))
+    metrics.register(Gauge(
+        'sms_logger_spill_bytes', 'Spilled bytes waiting to be written back to the database',
+        read=lambda: writer.spill.size if writer.spill is not None else 0))
+    if metrics_port:
+        port = metrics_port + shard_index if shard_count > 1 else metrics_port
+        reactor.listenTCP(port, Site(MetricsResource(metrics)), interface=metrics_interface)
+        print('*** Serving metrics on %s:%s' % (metrics_interface, port), flush=True)
+
+    batch = SubmitLogBatch()
+    flush_timer = None
+    write_failed = False
+
+    def ack_batch(_, pending):
+        if write_failed:
+            # A cumulative ack would cover the failed batch as well, this one
+            # is left to the redelivery, which the redelivery filter drops
+            return
+        # Batches are built and committed in delivery order, a cumulative ack of
+        # the last delivery covers the whole batch
+        chan.basic_ack(delivery_tag=pending.delivery_tags[-1], multiple=True)
+        unacked_deliveries.dec(len(pending))
+
+    def batch_failed(err, pending):
+        """Stop consuming once a batch could not be written: the connection is
+        dropped with the reactor, so that the broker redelivers every unacked
+        delivery, the failed batch first, to the restarted logger."""
+        nonlocal write_failed
+
+        if write_failed:
+            return
+        write_failed = True
+        print('*** Writing a batch of %s deliveries failed, stopping' % len(pending), flush=True)
+        log.err(err)
+        if reactor.running:
+            reactor.stop()
 
-    db_conn.commit()
+    def write_batch(inserts, updates, bodies, redelivered, keys):
+        """Run in the writer thread"""
+        started = monotonic()
+        writer.write(inserts, updates, bodies, redelivered)
+        reactor.callFromThread(db_write_seconds.observe, monotonic() - started)
+        # submit_sm deliveries of the batch are only known to the journal,
+        # which must be durable before they are acked, as the keys of the
+        # committed deliveries
+        q.sync()
+        if dedup is not None:
+            dedup.add(keys)
+            dedup.sync()
+
+    @inlineCallbacks
+    def flush_batch():
+        """Hand the pending batch off to the writer thread, its deliveries are acked once committed.
+
+        The returned deferred fires once the batch is handed off, which waits
+        while DB_WRITER_QUEUE_SIZE batches are already pending.
+        """
+        nonlocal batch, flush_timer
+
+        if flush_timer is not None and flush_timer.active():
+            flush_timer.cancel()
+        flush_timer = None
+
+        if not len(batch) or write_failed:
+            return
+        pending, batch = batch, SubmitLogBatch()
+
+        yield db_writers.acquire()
+        batch_size.observe(len(pending))
+        d = deferToThreadPool(reactor, db_threadpool, write_batch,
+                              pending.inserts, list(pending.updates.values()), pending.bodies, pending.redelivered,
+                              pending.keys)
+        d.addCallbacks(ack_batch, batch_failed, callbackArgs=(pending,), errbackArgs=(pending,))
+        d.addErrback(log.err)
+        d.addBoth(lambda _: db_writers.release())
+
+    def enqueue(delivery_tag, insert=None, update=None, body=None, key=None, redelivered=False):
+        """Add a delivery to the batch, flushed on max latency if it does not fill up before"""
+        nonlocal flush_timer
+
+        batch.add(delivery_tag, insert=insert, update=update, body=body, key=key, redelivered=redelivered)
+        unacked_deliveries.inc()
+        if flush_timer is None:
+            flush_timer = reactor.callLater(batch_max_latency, flush_batch)
+
+    def expire_correlation():
+        """Drop in-flight messages that will never get their resp/DLR"""
+        q.expire()
+        q.compact()
+        print('*** In-flight messages: %(size)s (expired: %(expired)s, evicted: %(evicted)s, '
+              'completed: %(removed)s)' % q.stats(), flush=True)
+        print('*** Database connected: %(connected)s (connects: %(connects)s, '
+              'failures: %(connection_failures)s, last error: %(last_error)s)' % writer.stats(), flush=True)
+        if writer.spill is not None:
+            print('*** Spilled bytes pending: %(spill_bytes)s (spilled batches: %(spilled_batches)s, '
+                  'replayed: %(replayed_batches)s)' % writer.stats(), flush=True)
+
+    task.LoopingCall(expire_correlation).start(60, now=False)
+
+    def redelivered(msg, key):
+        """Ack msg right away if it is the redelivery of a committed delivery"""
+        if dedup is None or not getattr(msg, 'redelivered', False):
+            return False
+        source = dedup.seen(key)
+        if source is None:
+            return False
+        redeliveries_dropped.inc(source)
+        enqueue(msg.delivery_tag)
+        return True
+
+    @inlineCallbacks
+    def replay_spill():
+        """Write spilled batches back, in bulk, once the database is reachable again"""
+        left = True
+        while left:
+            left = yield deferToThreadPool(reactor, db_threadpool, writer.replay_spill)
+
+    latency_period = datetime.now().replace(microsecond=0)
+
+    def flush_latencies():
+        """Hand the latency histograms of the elapsed interval off to the writer thread"""
+        nonlocal latency_period
+
+        period, latency_period = latency_period, datetime.now().replace(microsecond=0)
+        rows = latencies.drain(period, shard_index)
+        if rows:
+            deferToThreadPool(reactor, db_threadpool, writer.write_latencies, rows).addErrback(log.err)
+
+    if latency_flush_interval > 0:
+        task.LoopingCall(flush_latencies).start(latency_flush_interval, now=False)
+
+    if writer.spill is not None:
+        task.LoopingCall(replay_spill).start(spill_replay_interval, now=True)
+
+    # Shards share the table, one of them is enough to maintain its partitions
+    if partitions is not None and shard_index == 0:
+        task.LoopingCall(deferToThreadPool, reactor, db_threadpool, writer.maintain_partitions).start(
+            partition_maintenance_interval, now=False)
 
     # Wait for messages
     # This can be done through a callback ...
     while True:
-        msg = yield queue.get()
-        props = msg.content.properties
+        if len(batch) >= batch_max_size:
+            yield flush_batch()
 
-        if db_type_mysql:
-            db_conn.ping(reconnect=True, attempts=10, delay=1)
-        else:
-            check_connection = True
-            while check_connection:
-                try:
-                    cursor = db_conn.cursor()
-                    cursor.execute('SELECT 1')
-                    check_connection = False
-                except _postgres_error:
-                    print('*** PostgreSQL connection exception. Trying to reconnect', flush=True)
-                    db_conn = get_psql_conn()
-                    if db_conn:
-                        print("*** Pooling 20 connections", flush=True)
-                        print("*** Re-connected to psql", flush=True)
-                    cursor = db_conn.cursor()
-                    pass
+        try:
+            msg = yield queue.get()
+        except Closed:
+            break
+        props = msg.content.properties
+        if capture is not None:
+            capture.write(msg.routing_key, props, msg.content.body)
+        kind = routing_key_class(msg.routing_key)
+        messages_consumed.inc(kind)
 
         if msg.routing_key[:10] == 'submit.sm.' and msg.routing_key[:15] != 'submit.sm.resp.':
+            # Never dropped as a redelivery: it writes nothing, but its resp
+            # can't be logged without the correlation entry it seeds
             pdu = pickle.loads(msg.content.body)
             pdu_count = 1
             short_message = pdu.params['short_message']
@@ -298,95 +638,115 @@ def gotConnection(conn, username, password):
                 pdu_count += 1
                 short_message += pdu.params['short_message'][6:]
 
-            # Save short_message bytes
-            binary_message = binascii.hexlify(short_message)
-
             # If it's a binary message, assume it's utf_16_be encoded
+            ucs2 = False
             if pdu.params['data_coding'] is not None:
                 dc = pdu.params['data_coding']
-                if (isinstance(dc, int) and dc == 8) or (isinstance(dc, DataCoding) and str(dc.schemeData) == 'UCS2'):
-                    short_message = short_message.decode('utf_16_be', 'ignore').encode('utf_8')
-
-            q[props['message-id']] = {
-                'source_connector': source_connector,
-                'routed_cid': routed_cid,
-                'rate': 0,
-                'charge': 0,
-                'uid': 0,
-                'destination_addr': pdu.params['destination_addr'],
-                'source_addr': pdu.params['source_addr'],
-                'pdu_count': pdu_count,
-                'short_message': short_message,
-                'binary_message': binary_message,
-            }
+                ucs2 = (isinstance(dc, int) and dc == 8) or (isinstance(dc, DataCoding) and str(dc.schemeData) == 'UCS2')
+
+            qmsg = CorrelationEntry(
+                source_connector=source_connector,
+                routed_cid=routed_cid,
+                destination_addr=pdu.params['destination_addr'],
+                source_addr=pdu.params['source_addr'],
+                pdu_count=pdu_count,
+                raw_message=short_message,
+                ucs2=ucs2,
+                created_at=props['headers'].get('created_at'),
+            )
             if submit_sm_bill is not None:
-                q[props['message-id']]['rate'] = submit_sm_bill.getTotalAmounts()
-                q[props['message-id']]['charge'] = submit_sm_bill.getTotalAmounts() * pdu_count
-                q[props['message-id']]['uid'] = submit_sm_bill.user.uid
+                qmsg.rate = submit_sm_bill.getTotalAmounts()
+                qmsg.charge = submit_sm_bill.getTotalAmounts() * pdu_count
+                qmsg.uid = submit_sm_bill.user.uid
+            q.put(props['message-id'], qmsg)
+            enqueue(msg.delivery_tag)
+            continue
         elif msg.routing_key[:15] == 'submit.sm.resp.':
             # It's a submit_sm_resp
 
             pdu = pickle.loads(msg.content.body)
-            if props['message-id'] not in q:
+            status = getattr(pdu.status, 'name', pdu.status)
+            key = dedup_key(kind, props['message-id'], status)
+            if redelivered(msg, key):
+                continue
+            qmsg = q.get(props['message-id'])
+            if qmsg is None:
                 print('*** Got resp of an unknown submit_sm: %s' % props['message-id'], flush=True)
-                chan.basic_ack(delivery_tag=msg.delivery_tag)
+                unknown_resp.inc()
+                enqueue(msg.delivery_tag)
                 continue
 
-            qmsg = q[props['message-id']]
-
-            if qmsg['source_addr'] is None:
-                qmsg['source_addr'] = ''
-
-            insert_log = ("""INSERT INTO {} (msgid, source_addr, rate, pdu_count, charge,
-                                                      destination_addr, short_message,
-                                                      status, uid, created_at, binary_message,
-                                                      routed_cid, source_connector, status_at)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                    ON DUPLICATE KEY UPDATE trials = trials + 1;""".format(db_table))
+            if qmsg.source_addr is None:
+                qmsg.source_addr = ''
+            # The one the row is written with
+            qmsg.created_at = props['headers']['created_at']
+            if qmsg.submitted_at is not None:
+                latencies.observe('submit_resp', qmsg.routed_cid, qmsg.uid, time() - qmsg.submitted_at)
+
+            if db_body_storage == 'interned':
+                h = body_hash(qmsg.raw_message, qmsg.ucs2)
+                short_message = binary_message = None
+                body = (qmsg.ucs2, qmsg.raw_message)
+            else:
+                h = body = None
+                short_message, binary_message = qmsg.short_message, qmsg.binary_message
 
-            cursor.execute(insert_log, (
+            enqueue(msg.delivery_tag, insert=(
                 props['message-id'],
-                qmsg['source_addr'],
-                qmsg['rate'],
-                qmsg['pdu_count'],
-                qmsg['charge'],
-                qmsg['destination_addr'],
-                qmsg['short_message'],
-                pdu.status,
-                qmsg['uid'],
+                qmsg.source_addr,
+                qmsg.rate,
+                qmsg.pdu_count,
+                qmsg.charge,
+                qmsg.destination_addr,
+                short_message,
+                status,
+                qmsg.uid,
                 props['headers']['created_at'],
-                qmsg['binary_message'],
-                qmsg['routed_cid'],
-                qmsg['source_connector'],
-                props['headers']['created_at'],))
-            db_conn.commit()
+                binary_message,
+                qmsg.routed_cid,
+                qmsg.source_connector,
+                datetime.now(),
+                h,), body=body, key=key, redelivered=getattr(msg, 'redelivered', False))
+            continue
         elif msg.routing_key[:12] == 'dlr_thrower.':
             if props['headers']['message_status'][:5] == 'ESME_':
                 # Ignore dlr from submit_sm_resp
-                chan.basic_ack(delivery_tag=msg.delivery_tag)
+                enqueue(msg.delivery_tag)
                 continue
 
             # It's a dlr
-            if props['message-id'] not in q:
+            key = dedup_key(kind, props['message-id'], props['headers']['message_status'])
+            if redelivered(msg, key):
+                continue
+            qmsg = q.get(props['message-id'])
+            if qmsg is None:
                 print('*** Got dlr of an unknown submit_sm: %s' % props['message-id'], flush=True)
-                chan.basic_ack(delivery_tag=msg.delivery_tag)
+                unknown_dlr.inc()
+                enqueue(msg.delivery_tag)
                 continue
 
             # Update message status
-            qmsg = q[props['message-id']]
-            update_log = ("UPDATE submit_log SET status = %s, status_at = %s WHERE msgid = %s;".format(db_table))
-            cursor.execute(update_log, (
+            enqueue(msg.delivery_tag, update=(
+                props['message-id'],
                 props['headers']['message_status'],
                 datetime.now(),
-                props['message-id'],))
-            db_conn.commit()
+                qmsg.created_at,), key=key)
+            if props['headers']['message_status'] in FINAL_DLR_STATUSES:
+                if qmsg.submitted_at is not None:
+                    latencies.observe('submit_dlr', qmsg.routed_cid, qmsg.uid, time() - qmsg.submitted_at)
+                q.remove(props['message-id'])
+            continue
         else:
             print('*** unknown route: %s' % msg.routing_key, flush=True)
 
-        chan.basic_ack(delivery_tag=msg.delivery_tag)
+        enqueue(msg.delivery_tag)
 
     # A clean way to tear down and stop
-    yield chan.basic_cancel("sms_logger")
+    yield flush_batch()
+    if capture is not None:
+        capture.close()
+        print('*** Recorded %s deliveries to %s' % (capture.records, capture.path), flush=True)
+    yield chan.basic_cancel(consumer_tag)
     yield chan.channel_close()
     chan0 = yield conn.channel(0)
     yield chan0.connection_close()
@@ -395,6 +755,13 @@ def gotConnection(conn, username, password):
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Log the messages sent through Jasmin to the submit_log table')
+    parser.add_argument('--record', metavar='PATH', help='record the consumed deliveries to a capture file')
+    parser.add_argument('--replay', metavar='PATH', help='consume the deliveries of a capture file instead of the broker')
+    parser.add_argument('--pacing', choices=('fast', 'original'), default='fast',
+                        help='replay as fast as possible or at the original pace')
+    args = parser.parse_args()
+
     sleep(2)
     print(' ', flush=True)
     print(' ', flush=True)
@@ -412,15 +779,36 @@ if __name__ == "__main__":
     password = 'guest'
     spec_file = os.environ.get("AMQP_SPEC_FILE", '/etc/jasmin/resource/amqp0-9-1.xml')
 
-    spec = txamqp.spec.load(spec_file)
-
-    # Connect and authenticate
-    d = ClientCreator(reactor,
-                      AMQClient,
-                      delegate=TwistedDelegate(),
-                      vhost=vhost,
-                      spec=spec).connectTCP(host, port)
-    d.addCallback(gotConnection, username, password)
+    capture = None
+    if args.record:
+        capture = CaptureWriter(args.record)
+        reactor.addSystemEventTrigger('during', 'shutdown', capture.close)
+        print('*** Recording deliveries to %s' % args.record, flush=True)
+
+    if args.replay:
+        # No broker: the capture is published to an in-process one
+        broker = Broker()
+        d = gotConnection(broker, username, password, capture=capture)
+
+        @inlineCallbacks
+        def replay_capture():
+            print('*** Replaying %s (%s pacing)' % (args.replay, args.pacing), flush=True)
+            count = yield replay(CaptureReader(args.replay), broker, original_pacing=args.pacing == 'original')
+            yield broker.drained()
+            print('*** Replayed %s deliveries' % count, flush=True)
+            broker.consumer_queue.close()
+
+        reactor.callWhenRunning(lambda: replay_capture().addErrback(whoops))
+    else:
+        spec = txamqp.spec.load(spec_file)
+
+        # Connect and authenticate
+        d = ClientCreator(reactor,
+                          AMQClient,
+                          delegate=TwistedDelegate(),
+                          vhost=vhost,
+                          spec=spec).connectTCP(host, port)
+        d.addCallback(gotConnection, username, password, capture=capture)
 
 
     def whoops(err):
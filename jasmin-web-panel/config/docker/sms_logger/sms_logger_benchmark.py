@@ -0,0 +1,288 @@
+#!/usr/bin/env python
+"""This script will measure the throughput of sms_logger on synthetic traffic.
+
+The logger's gotConnection() consumes from the in-process broker of
+local_broker.py, fed with submit.sm.*, submit.sm.resp.* and dlr_thrower.*
+deliveries shaped as the ones Jasmin publishes: pickled SubmitSM/SubmitSMResp
+PDUs, multipart messages chained through nextPdu, pickled SubmitSmBill
+headers. With --capture, the deliveries of a capture recorded by
+sms_logger.py --record are replayed instead.
+
+Batches are written to an SQLite database by default, or to the sinks
+configured by SINKS and the DB_*/MONGO_* variables with --sink db, e.g.
+SINKS=mongo to measure the MongoDB sink against a local mongod. Every other
+sms_logger variable (BATCH_MAX_SIZE, DB_WRITER_QUEUE_SIZE, ...) applies as usual.
+
+Reported:
+- deliveries/s and messages/s, from the first publish to the last ack
+- p50/p99 latency of a delivery, from its publish to its ack
+- peak RSS of the benchmark process
+
+Usage:
+    sms_logger_benchmark.py [--messages N] [--rate R] [--multipart-ratio P]
+                            [--dlr-ratio P] [--sink sqlite|db] [--sqlite-path PATH]
+                            [--capture PATH [--pacing fast|original]]
+"""
+
+import argparse
+import pickle
+import random
+import resource
+import sqlite3
+import uuid
+from datetime import datetime
+from time import monotonic
+
+from twisted.internet import reactor, task
+from twisted.internet.defer import inlineCallbacks
+
+from smpp.pdu.operations import SubmitSM, SubmitSMResp
+from smpp.pdu.pdu_types import (DataCoding, DataCodingDefault, EsmClass, EsmClassMode, EsmClassType,
+                                EsmClassGsmFeatures)
+from jasmin.routing.Bills import SubmitSmBill
+from jasmin.routing.jasminApi import Group, User
+
+import sms_logger
+from bodies import BODY_COLUMNS
+from capture import CaptureReader, replay
+from dialects import SUBMIT_LOG_COLUMNS
+from local_broker import Broker
+from writer import SubmitLogWriter
+
+# Distinct PDUs and bills the traffic is drawn from
+TEMPLATES = 100
+PUBLISH_INTERVAL = 0.01
+
+SQLITE_CREATE_TABLE = """CREATE TABLE IF NOT EXISTS {table} (
+        msgid VARCHAR(45) NOT NULL PRIMARY KEY,
+        source_connector VARCHAR(15),
+        routed_cid VARCHAR(30),
+        source_addr VARCHAR(40),
+        destination_addr VARCHAR(40) NOT NULL,
+        rate DECIMAL(12, 7),
+        charge DECIMAL(12, 7),
+        pdu_count SMALLINT DEFAULT 1,
+        short_message BLOB,
+        binary_message BLOB,
+        status VARCHAR(15) NOT NULL,
+        uid VARCHAR(15) NOT NULL,
+        trials SMALLINT DEFAULT 1,
+        created_at TIMESTAMP NOT NULL,
+        status_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        body_hash CHAR(40)
+    );"""
+
+SQLITE_CREATE_BODY_TABLE = """CREATE TABLE IF NOT EXISTS {table} (
+        hash CHAR(40) NOT NULL PRIMARY KEY,
+        encoding VARCHAR(4) NOT NULL,
+        ucs2 BOOLEAN NOT NULL DEFAULT 0,
+        length INTEGER NOT NULL,
+        body BLOB,
+        created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+    );"""
+
+
+class SQLiteDialect(object):
+    name = 'SQLite'
+
+    def create_table(self, cursor, table):
+        cursor.execute(SQLITE_CREATE_TABLE.format(table=table))
+        return cursor.rowcount
+
+    def add_missing_columns(self, cursor, table):
+        return []
+
+    def create_body_table(self, cursor, table):
+        cursor.execute(SQLITE_CREATE_BODY_TABLE.format(table=table))
+
+    def insert_bodies(self, cursor, table, rows):
+        cursor.executemany(
+            'INSERT INTO {} ({}) VALUES ({}) ON CONFLICT (hash) DO NOTHING;'.format(
+                table, ', '.join(BODY_COLUMNS), ', '.join(['?'] * len(BODY_COLUMNS))),
+            rows)
+
+    def upsert(self, cursor, table, rows, count_trials=True):
+        cursor.executemany(
+            'INSERT INTO {} ({}) VALUES ({}) ON CONFLICT (msgid) DO {};'.format(
+                table, ', '.join(SUBMIT_LOG_COLUMNS), ', '.join(['?'] * len(SUBMIT_LOG_COLUMNS)),
+                'UPDATE SET trials = trials + 1' if count_trials else 'NOTHING'),
+            [tuple(str(v) if isinstance(v, datetime) else v for v in row) for row in rows])
+
+    def update_status(self, cursor, table, updates):
+        cursor.executemany(
+            'UPDATE {} SET status = ?, status_at = ? WHERE msgid = ?;'.format(table),
+            [(status, str(status_at), msgid) for msgid, status, status_at in (u[:3] for u in updates)])
+
+
+class SQLiteSubmitLogWriter(SubmitLogWriter):
+    """SubmitLogWriter on a single SQLite connection, partitions, rollups and latencies aside"""
+
+    def __init__(self, path, **kwargs):
+        kwargs.update(partitions=None, rollups=False, latencies=False)
+        SubmitLogWriter.__init__(self, **kwargs)
+        self.path = path
+        self.dialect = SQLiteDialect()
+        self.errors = sqlite3.Error
+        self.connection_errors = ()
+
+    def _checkout(self):
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.connected = True
+        self.connects += 1
+
+    def _discard(self):
+        conn, self.conn = self.conn, None
+        self.connected = False
+        if conn is not None:
+            conn.close()
+
+
+class Traffic(object):
+    """Synthetic Jasmin traffic, drawn from a pool of pickled PDUs and bills"""
+
+    def __init__(self, multipart_ratio, dlr_ratio):
+        self.multipart_ratio = multipart_ratio
+        self.dlr_ratio = dlr_ratio
+        self.submits = [self._submit_sm(i, multipart=False) for i in range(TEMPLATES)]
+        self.multipart_submits = [self._submit_sm(i, multipart=True) for i in range(TEMPLATES)]
+        self.resp = pickle.dumps(SubmitSMResp(seqNum=1, message_id=str(uuid.uuid4())), pickle.HIGHEST_PROTOCOL)
+        self.bills = []
+        for i in range(TEMPLATES):
+            bill = SubmitSmBill(User('user_%s' % (i % 10), Group('group_1'), 'user_%s' % (i % 10), 'password'))
+            bill.setAmount('submit_sm', 0.01)
+            self.bills.append(pickle.dumps(bill, pickle.HIGHEST_PROTOCOL))
+
+    def _submit_sm(self, i, multipart):
+        params = dict(
+            source_addr='SENDER%s' % (i % 10),
+            destination_addr='3361234%04d' % i,
+            data_coding=DataCoding(schemeData=DataCodingDefault.SMSC_DEFAULT_ALPHABET),
+        )
+        if not multipart:
+            return pickle.dumps(SubmitSM(seqNum=1, short_message=b'Benchmark message %d' % i, **params),
+                                pickle.HIGHEST_PROTOCOL)
+
+        # Two parts, each with a 6 bytes concatenation UDH
+        esm_class = EsmClass(EsmClassMode.DEFAULT, EsmClassType.DEFAULT, [EsmClassGsmFeatures.UDHI_INDICATOR_SET])
+        first = SubmitSM(seqNum=1, esm_class=esm_class,
+                         short_message=b'\x05\x00\x03\x01\x02\x01' + b'A' * 153, **params)
+        first.nextPdu = SubmitSM(seqNum=2, esm_class=esm_class,
+                                 short_message=b'\x05\x00\x03\x01\x02\x02' + b'B' * 40, **params)
+        return pickle.dumps(first, pickle.HIGHEST_PROTOCOL)
+
+    def deliveries(self, n):
+        """(routing_key, body, properties) of the deliveries of the n-th message"""
+        msgid = str(uuid.uuid4())
+        created_at = str(datetime.now())
+        routed_cid = 'smppc_%s' % (n % 5)
+        submits = self.multipart_submits if random.random() < self.multipart_ratio else self.submits
+        yield 'submit.sm.%s' % routed_cid, submits[n % TEMPLATES], {
+            'message-id': msgid,
+            'headers': {
+                'submit_sm_bill': self.bills[n % TEMPLATES],
+                'source_connector': 'httpapi' if n % 2 else 'smppsapi',
+                'created_at': created_at,
+            }}
+        yield 'submit.sm.resp.%s' % routed_cid, self.resp, {
+            'message-id': msgid,
+            'headers': {'created_at': created_at}}
+        if random.random() < self.dlr_ratio:
+            yield 'dlr_thrower.http', msgid.encode(), {
+                'message-id': msgid,
+                'headers': {'message_status': 'DELIVRD', 'level': 3, 'id': msgid}}
+
+
+def peak_rss_mb():
+    # ru_maxrss is in KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def percentile(values, p):
+    if not values:
+        return 0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100.0))]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark sms_logger on synthetic traffic')
+    parser.add_argument('--messages', type=int, default=100000, help='messages to publish')
+    parser.add_argument('--rate', type=float, default=0, help='messages per second, 0 to publish as fast as possible')
+    parser.add_argument('--multipart-ratio', type=float, default=0.1, help='share of 2 parts messages')
+    parser.add_argument('--dlr-ratio', type=float, default=1.0, help='share of messages getting a DLR')
+    parser.add_argument('--sink', choices=('sqlite', 'db'), default='sqlite')
+    parser.add_argument('--sqlite-path', default=':memory:')
+    parser.add_argument('--capture', metavar='PATH', help='replay a capture file instead of synthetic traffic')
+    parser.add_argument('--pacing', choices=('fast', 'original'), default='fast')
+    args = parser.parse_args()
+
+    broker = Broker()
+    traffic = Traffic(args.multipart_ratio, args.dlr_ratio)
+    timings = {}
+
+    def publish(count):
+        for _ in range(count):
+            if timings['messages'] >= args.messages:
+                break
+            for routing_key, body, properties in traffic.deliveries(timings['messages']):
+                broker.publish(routing_key, body, properties)
+            timings['messages'] += 1
+        if timings['messages'] >= args.messages and publisher.running:
+            publisher.stop()
+            broker.drained().addCallback(finish)
+
+    def paced():
+        # Carry the fractional messages over to the next tick
+        timings['credit'] += args.rate * PUBLISH_INTERVAL
+        count, timings['credit'] = int(timings['credit']), timings['credit'] % 1
+        publish(count)
+
+    def as_fast_as_possible():
+        publish(1000)
+
+    def finish(_):
+        timings['end'] = monotonic()
+        broker.consumer_queue.close()
+
+    @inlineCallbacks
+    def replay_capture():
+        timings['messages'] = yield replay(CaptureReader(args.capture), broker,
+                                           original_pacing=args.pacing == 'original')
+        yield broker.drained()
+        finish(None)
+
+    def start():
+        timings.update(messages=0, credit=0, start=monotonic())
+        if args.capture:
+            replay_capture().addErrback(lambda err: (err.printTraceback(), reactor.stop()))
+        else:
+            publisher.start(PUBLISH_INTERVAL if args.rate else 0, now=True)
+
+    publisher = task.LoopingCall(paced if args.rate else as_fast_as_possible)
+
+    if args.sink == 'sqlite':
+        def writer_factory(**kwargs):
+            return SQLiteSubmitLogWriter(args.sqlite_path, **kwargs)
+    else:
+        writer_factory = sms_logger.create_writer
+
+    if args.capture:
+        print('*** Replaying %s (%s pacing)' % (args.capture, args.pacing), flush=True)
+    else:
+        print('*** Publishing %s messages at %s' % (args.messages, '%s/s' % args.rate if args.rate else 'full speed'),
+              flush=True)
+    d = sms_logger.gotConnection(broker, 'guest', 'guest', writer_factory=writer_factory)
+    d.addErrback(lambda err: (err.printTraceback(), reactor.stop()))
+    reactor.callWhenRunning(start)
+    reactor.run()
+
+    if 'end' not in timings:
+        print('*** Benchmark did not complete', flush=True)
+        raise SystemExit(1)
+    elapsed = timings['end'] - timings['start']
+    print('*** Deliveries: %s in %.2fs, %.0f/s' % (broker.acked, elapsed, broker.acked / elapsed), flush=True)
+    if not args.capture:
+        print('*** Messages: %s, %.0f/s' % (timings['messages'], timings['messages'] / elapsed), flush=True)
+    print('*** Latency p50: %.1fms, p99: %.1fms' % (
+        percentile(broker.latencies, 50) * 1000, percentile(broker.latencies, 99) * 1000), flush=True)
+    print('*** Peak RSS: %.1f MiB' % peak_rss_mb(), flush=True)
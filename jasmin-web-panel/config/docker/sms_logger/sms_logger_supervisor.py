@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+"""This script will launch and monitor sharded sms_logger processes.
+
+Every shard is a sms_logger.py process started with SHARD_COUNT and its own
+SHARD_INDEX, see the Sharding section of sms_logger.py. A shard that exits is
+restarted, with a backoff when it keeps crashing. Shards can be spread over
+several hosts by running one supervisor per host with distinct SHARD_INDEXES.
+
+Optional:
+- SET ENVIRONMENT ENV:
+    + SHARD_COUNT       # Default: 1            # Number of shards, over all hosts
+    + SHARD_INDEXES     # Default: ''           # Comma separated shards run by this supervisor, all of them if empty
+    + SHARD_RESTART_DELAY # Default: 1          # Seconds before restarting a shard, doubled while it keeps crashing
+
+    Every other variable is passed through to the shards. CORRELATION_JOURNAL
+    and DEDUP_JOURNAL, if set, get a .<SHARD_INDEX> suffix so that shards never
+    share a journal.
+"""
+
+import os
+import signal
+import subprocess
+import sys
+from time import sleep, monotonic
+
+shard_count = int(os.getenv('SHARD_COUNT', '1'))
+shard_indexes = [int(i) for i in os.getenv('SHARD_INDEXES', '').split(',') if i.strip()] or list(range(shard_count))
+shard_restart_delay = float(os.getenv('SHARD_RESTART_DELAY', '1'))
+
+# A shard running for longer than this is considered healthy again
+STABLE_AFTER = 60
+MAX_RESTART_DELAY = 60
+SMS_LOGGER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sms_logger.py')
+
+
+class Shard(object):
+    def __init__(self, index):
+        self.index = index
+        self.process = None
+        self.started_at = None
+        self.restart_at = 0
+        self.restart_delay = shard_restart_delay
+
+    def start(self):
+        env = dict(os.environ, SHARD_COUNT=str(shard_count), SHARD_INDEX=str(self.index))
+        for journal in ('CORRELATION_JOURNAL', 'DEDUP_JOURNAL'):
+            if env.get(journal):
+                env[journal] = '%s.%s' % (env[journal], self.index)
+        self.process = subprocess.Popen([sys.executable, SMS_LOGGER], env=env)
+        self.started_at = monotonic()
+        print('*** Started shard %s (pid %s)' % (self.index, self.process.pid), flush=True)
+
+    def check(self):
+        """Restart the shard if it exited"""
+        if self.process is None:
+            if monotonic() >= self.restart_at:
+                self.start()
+            return
+
+        returncode = self.process.poll()
+        if returncode is None:
+            return
+
+        if monotonic() - self.started_at > STABLE_AFTER:
+            self.restart_delay = shard_restart_delay
+        print('*** Shard %s exited with code %s, restarting in %ss' % (
+            self.index, returncode, self.restart_delay), flush=True)
+        self.process = None
+        self.restart_at = monotonic() + self.restart_delay
+        self.restart_delay = min(self.restart_delay * 2, MAX_RESTART_DELAY)
+
+    def stop(self):
+        if self.process is not None and self.process.poll() is None:
+            self.process.terminate()
+
+    def wait(self, timeout):
+        if self.process is None:
+            return
+        try:
+            self.process.wait(timeout)
+        except subprocess.TimeoutExpired:
+            print('*** Shard %s did not stop, killing it' % self.index, flush=True)
+            self.process.kill()
+
+
+if __name__ == "__main__":
+    print('************ sms_logger supervisor ***********', flush=True)
+    print('*** Running shards %s of %s' % (', '.join(str(i) for i in shard_indexes), shard_count), flush=True)
+    print('**********************************************', flush=True)
+
+    stopping = []
+
+    def stop(signum, frame):
+        stopping.append(signum)
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    shards = [Shard(index) for index in shard_indexes]
+    while not stopping:
+        for shard in shards:
+            shard.check()
+        sleep(0.5)
+
+    print('*** Stopping shards', flush=True)
+    for shard in shards:
+        shard.stop()
+    for shard in shards:
+        shard.wait(10)
@@ -0,0 +1,94 @@
+"""Local spill buffer for sms_logger batches.
+
+While the database is unreachable, the writer appends every batch to a
+SpillFile instead of blocking, so that the logger keeps consuming and acking
+AMQP deliveries. Spilled batches are written back in order once the database
+is reachable again, new batches keep being spilled until then so that the
+database sees them in delivery order.
+"""
+
+import os
+import pickle
+import struct
+
+
+class SpillFile(object):
+    """Append-only file of (inserts, updates, bodies) batches.
+
+    Each record is a little-endian 4 bytes length followed by a pickled
+    batch. Records are read back from an in-memory offset and the file is
+    truncated once all of them have been written to the database. Replay
+    starts over from the beginning after a restart, which is harmless as
+    spilled batches are replayed idempotently.
+    """
+    _length = struct.Struct('<I')
+
+    def __init__(self, path):
+        self.path = path
+        self.spilled = 0
+        self.replayed = 0
+        self._read_offset = 0
+
+        valid_size = 0
+        if os.path.exists(self.path):
+            with open(self.path, 'rb') as f:
+                for _, valid_size in self._records(f, None):
+                    self.spilled += 1
+
+        self._file = open(self.path, 'ab')
+        self._file.truncate(valid_size)
+        self._file.seek(valid_size)
+
+    def _records(self, f, max_records):
+        """Yield (batch, end offset) from f, stopping at a torn record"""
+        count = 0
+        while max_records is None or count < max_records:
+            header = f.read(self._length.size)
+            if len(header) < self._length.size:
+                return
+            payload = f.read(self._length.unpack(header)[0])
+            try:
+                batch = pickle.loads(payload)
+            except Exception:
+                return
+            count += 1
+            yield batch, f.tell()
+
+    @property
+    def pending(self):
+        return self._file.tell() > self._read_offset
+
+    @property
+    def size(self):
+        return self._file.tell() - self._read_offset
+
+    def append(self, inserts, updates, bodies=None):
+        """Durably spill one batch"""
+        payload = pickle.dumps((inserts, updates, bodies or {}), pickle.HIGHEST_PROTOCOL)
+        self._file.write(self._length.pack(len(payload)) + payload)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self.spilled += 1
+
+    def read(self, max_records):
+        """Return up to max_records spilled batches and the offset following them"""
+        self._file.flush()
+        batches = []
+        offset = self._read_offset
+        with open(self.path, 'rb') as f:
+            f.seek(self._read_offset)
+            for batch, offset in self._records(f, max_records):
+                if len(batch) == 2:
+                    # Spilled before bodies were interned
+                    batch = batch + ({},)
+                batches.append(batch)
+        return batches, offset
+
+    def consume(self, offset, count):
+        """Mark the batches up to offset as written to the database"""
+        self._read_offset = offset
+        self.replayed += count
+        if self._read_offset >= self._file.tell():
+            self._file.truncate(0)
+            self._file.seek(0)
+            self._read_offset = 0
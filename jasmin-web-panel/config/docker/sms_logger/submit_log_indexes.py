@@ -0,0 +1,54 @@
+#!/usr/bin/env python
+"""This script will switch the submit_log table between index profiles.
+
+Missing indexes of the profile are built online first, CONCURRENTLY on
+PostgreSQL (partition by partition on a partitioned table) and in place
+without locking on MySQL, then the indexes it doesn't have are dropped,
+including the duplicates left by earlier sms_logger versions on PostgreSQL.
+sms_logger keeps running meanwhile. Set DB_INDEX_PROFILE to the same profile
+so that a table it creates later gets the same indexes.
+
+Usage:
+    submit_log_indexes.py PROFILE [--dry-run]
+
+Optional:
+- SET ENVIRONMENT ENV:
+    DB_TYPE_MYSQL, DB_HOST, DB_DATABASE, DB_TABLE, DB_USER, DB_PASS as
+    documented in sms_logger.py.
+"""
+
+import argparse
+import os
+
+from dialects import INDEX_PROFILES
+from writer import SubmitLogWriter
+
+db_type_mysql = int(os.getenv('DB_TYPE_MYSQL', '1')) == 1
+db_host = os.getenv('DB_HOST', '127.0.0.1')
+db_database = os.getenv('DB_DATABASE', 'jasmin')
+db_table = os.getenv('DB_TABLE', 'submit_log')
+db_user = os.getenv('DB_USER', 'jasmin')
+db_pass = os.getenv('DB_PASS', 'jadmin')
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Switch the submit_log table between index profiles')
+    parser.add_argument('profile', choices=sorted(INDEX_PROFILES))
+    parser.add_argument('--dry-run', action='store_true', help='only print the statements')
+    args = parser.parse_args()
+
+    writer = SubmitLogWriter(
+        mysql=db_type_mysql,
+        host=db_host,
+        database=db_database,
+        table=db_table,
+        user=db_user,
+        password=db_pass,
+        pool_size=1)
+    statements = writer.migrate_indexes(args.profile, dry_run=args.dry_run)
+    if args.dry_run:
+        for statement in statements:
+            print(statement, flush=True)
+    elif statements:
+        print('*** {} switched to the {} index profile'.format(db_table, args.profile), flush=True)
+    else:
+        print('*** {} already has the {} index profile'.format(db_table, args.profile), flush=True)
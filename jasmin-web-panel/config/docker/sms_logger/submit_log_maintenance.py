@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+"""This script will maintain the partitions of a partitioned submit_log table.
+
+It pre-creates the upcoming partitions and detaches or drops the ones past the
+retention, as sms_logger.py does every PARTITION_MAINTENANCE_INTERVAL, and is
+meant to be run from cron when the logger's own maintenance is not wanted.
+It creates the table if it doesn't exist yet.
+
+Optional:
+- SET ENVIRONMENT ENV:
+    DB_TYPE_MYSQL, DB_HOST, DB_DATABASE, DB_TABLE, DB_USER, DB_PASS and the
+    DB_PARTITIONING, PARTITION_* variables, as documented in sms_logger.py.
+"""
+
+import os
+import sys
+
+from partitions import MySQLPartitions, PostgreSQLPartitions
+from writer import SubmitLogWriter
+
+db_type_mysql = int(os.getenv('DB_TYPE_MYSQL', '1')) == 1
+db_host = os.getenv('DB_HOST', '127.0.0.1')
+db_database = os.getenv('DB_DATABASE', 'jasmin')
+db_table = os.getenv('DB_TABLE', 'submit_log')
+db_user = os.getenv('DB_USER', 'jasmin')
+db_pass = os.getenv('DB_PASS', 'jadmin')
+db_partitioning = os.getenv('DB_PARTITIONING', '')
+partition_precreate = int(os.getenv('PARTITION_PRECREATE', '3'))
+partition_retention = int(os.getenv('PARTITION_RETENTION', '0'))
+partition_expire_action = os.getenv('PARTITION_EXPIRE_ACTION', 'detach')
+
+if __name__ == "__main__":
+    if not db_partitioning:
+        print('*** DB_PARTITIONING is not set, nothing to maintain', flush=True)
+        sys.exit(1)
+
+    writer = SubmitLogWriter(
+        mysql=db_type_mysql,
+        host=db_host,
+        database=db_database,
+        table=db_table,
+        user=db_user,
+        password=db_pass,
+        pool_size=1,
+        partitions=(MySQLPartitions if db_type_mysql else PostgreSQLPartitions)(
+            period=db_partitioning,
+            precreate=partition_precreate,
+            retention=partition_retention,
+            expire_action=partition_expire_action))
+    # Creating the table, or finding it, runs a first maintenance
+    writer.create_table()
@@ -0,0 +1,357 @@
+"""submit_log writer for sms_logger.
+
+SubmitLogWriter owns the database connection. All of its methods block on
+database I/O and are meant to be called from the logger's writer thread,
+never from the reactor thread.
+"""
+
+from datetime import date
+from time import sleep
+
+from mysql.connector import errors as _mysql_errors
+from mysql.connector import pooling as _mysql_pooling
+from mysql.connector import Error as _mysql_error
+import psycopg2 as _postgres_errors
+from psycopg2 import pool as _postgres_pool
+from psycopg2 import Error as _postgres_error
+
+from bodies import BodyEncoder, body_table
+from dialects import SUBMIT_LOG_COLUMNS, MySQLDialect, PostgreSQLDialect
+from latency import latency_table
+from rollups import ROLLUP_GRANULARITIES, RollupDeltas, rollup_table
+from sinks import Sink
+
+
+class SubmitLogWriter(Sink):
+    """Writes batches of submit_log inserts and DLR updates.
+
+    Connections come from a single pool created on first use and kept for the
+    writer's lifetime. A connection is held until a statement fails with a
+    connection error, it is then discarded and the whole transaction is
+    retried on a fresh one; no liveness probe is ever sent.
+
+    With a SpillFile, batches are spilled to it instead of being retried while
+    the database is unreachable, and replay_spill() writes them back.
+
+    With Partitions, the table is created partitioned on created_at and
+    maintain_partitions() adds and expires its partitions.
+
+    With rollups, every batch also updates the rollup tables in its own
+    transaction. With latencies, write_latencies() stores latency histograms.
+
+    With interned body storage, batches carry the raw bodies their rows
+    reference by body_hash, which are stored once in <table>_body.
+    """
+
+    def __init__(self, mysql, host, database, table, user, password, pool_size=2, spill=None, partitions=None,
+                 index_profile='full', rollups=False, latencies=False, body_storage='inline',
+                 body_compression='none'):
+        Sink.__init__(self)
+        self.mysql = mysql
+        self.host = host
+        self.database = database
+        self.table = table
+        self.user = user
+        self.password = password
+        self.pool_size = pool_size
+        self.pool = None
+        self.conn = None
+        if mysql:
+            self.dialect = MySQLDialect(partitions, index_profile)
+        else:
+            self.dialect = PostgreSQLDialect(partitions, index_profile)
+        self.partitions = partitions
+        self.rollups = rollups
+        self.latencies = latencies
+        self.body_storage = body_storage
+        self.body_encoder = BodyEncoder(body_compression) if body_storage == 'interned' else None
+        self.spill = spill
+
+        if mysql:
+            self.errors = _mysql_error
+            self.connection_errors = (_mysql_errors.InterfaceError, _mysql_errors.OperationalError,
+                                      _mysql_errors.PoolError)
+        else:
+            self.errors = _postgres_error
+            self.connection_errors = (_postgres_errors.InterfaceError, _postgres_errors.OperationalError,
+                                      _postgres_pool.PoolError)
+
+    def _checkout(self):
+        if self.pool is None:
+            if self.mysql:
+                self.pool = _mysql_pooling.MySQLConnectionPool(
+                    pool_name="sms_logger",
+                    pool_size=self.pool_size,
+                    user=self.user,
+                    password=self.password,
+                    host=self.host,
+                    database=self.database)
+            else:
+                self.pool = _postgres_pool.ThreadedConnectionPool(
+                    1,
+                    self.pool_size,
+                    user=self.user,
+                    password=self.password,
+                    host=self.host,
+                    database=self.database)
+            print("*** Pooling %s connections" % self.pool_size, flush=True)
+
+        if self.mysql:
+            self.conn = self.pool.get_connection()
+        else:
+            self.conn = self.pool.getconn()
+        self.connected = True
+        self.connects += 1
+        print("*** %s to %s" % ('Connected' if self.connects == 1 else 'Re-connected',
+                                self.dialect.name), flush=True)
+
+    def _discard(self):
+        conn, self.conn = self.conn, None
+        self.connected = False
+        if conn is None:
+            return
+        try:
+            if self.mysql:
+                # Back to the pool, which reconnects it on its next checkout
+                conn.close()
+            else:
+                self.pool.putconn(conn, close=True)
+        except self.errors:
+            pass
+
+    def run(self, work, *args, retry=True):
+        """Run work(cursor, *args) in one transaction and return its result.
+
+        Connection failures are retried with an exponential backoff until the
+        transaction commits, or raised right away if retry is False. Any other
+        database error is rolled back and raised, other exceptions discard the
+        connection as well, whatever state its transaction is in.
+        """
+        delay = 1
+        while True:
+            try:
+                if self.conn is None:
+                    self._checkout()
+                cursor = self.conn.cursor()
+                result = work(cursor, *args)
+                self.conn.commit()
+                return result
+            except self.connection_errors as e:
+                self.connection_failures += 1
+                self.last_error = str(e)
+                self._discard()
+                if not retry:
+                    raise
+                print('*** Database connection failure, retrying in %ss: %s' % (delay, e), flush=True)
+                sleep(delay)
+                delay = min(delay * 2, 30)
+            except self.errors as e:
+                self.last_error = str(e)
+                try:
+                    self.conn.rollback()
+                except self.errors:
+                    self._discard()
+                raise
+            except Exception:
+                if self.conn is not None:
+                    try:
+                        self.conn.rollback()
+                    except self.errors:
+                        pass
+                    self._discard()
+                raise
+
+    def _create_table(self, retry=True):
+        if self.run(self.dialect.create_table, self.table, retry=retry) > 0:
+            print('*** {} table was created successfully'.format(self.table), flush=True)
+        else:
+            print('*** {} table already exist'.format(self.table), flush=True)
+            for column in self.run(self.dialect.add_missing_columns, self.table, retry=retry):
+                print('*** {} column {} was added'.format(self.table, column), flush=True)
+        if self.partitions is not None:
+            # Rows can't be written to a partitioned table before its partitions exist
+            self._maintain_partitions(retry=retry)
+        if self.rollups:
+            for granularity in ROLLUP_GRANULARITIES:
+                self.run(self.dialect.create_rollup_table, rollup_table(self.table, granularity), retry=retry)
+        if self.latencies:
+            self.run(self.dialect.create_latency_table, latency_table(self.table), retry=retry)
+        if self.body_encoder is not None:
+            self.run(self.dialect.create_body_table, body_table(self.table), retry=retry)
+        self.table_ready = True
+
+    def _maintain_partitions(self, retry=True):
+        created, expired = self.run(self.dialect.maintain_partitions, self.table, date.today(), retry=retry)
+        for name in created:
+            print('*** {} partition {} created'.format(self.table, name), flush=True)
+        for name in expired:
+            print('*** {} partition {} {}'.format(
+                self.table, name, 'dropped' if self.partitions.expire_action == 'drop' else 'detached'), flush=True)
+
+    def maintain_partitions(self):
+        """Pre-create upcoming partitions and expire the ones past the retention"""
+        if self.partitions is None or not self.table_ready:
+            return
+        try:
+            self._maintain_partitions(retry=False)
+        except self.errors as e:
+            print('*** Partition maintenance of {} failed: {}'.format(self.table, e), flush=True)
+
+    def create_table(self):
+        """Create the table, or leave it to the first write while spilling"""
+        try:
+            self._create_table(retry=self.spill is None)
+        except self.connection_errors as e:
+            print('*** Database unreachable, spilling batches to %s: %s' % (self.spill.path, e), flush=True)
+
+    def write_latencies(self, rows):
+        """Store flushed latency histograms, dropped if the database is not writable"""
+        if not rows or not self.latencies:
+            return
+        if not self.table_ready:
+            print('*** Dropped %s latency histograms, %s is not ready' % (len(rows), self.table), flush=True)
+            return
+        try:
+            self.run(self.dialect.insert_latencies, latency_table(self.table), rows, retry=False)
+        except self.errors as e:
+            print('*** Dropped %s latency histograms: %s' % (len(rows), e), flush=True)
+
+    def migrate_indexes(self, profile, dry_run=False):
+        """Switch the secondary indexes of the table to profile, one statement at a time.
+
+        Indexes are built and dropped online, outside of any transaction, new
+        ones first so that queries are never left without theirs.
+        Returns the statements, only listed with dry_run.
+        """
+        statements = self.run(self.dialect.index_migration, self.table, profile)
+        if dry_run:
+            return statements
+
+        # MySQL commits DDL implicitly, PostgreSQL can't build an index
+        # CONCURRENTLY in a transaction block
+        if not self.mysql:
+            self.conn.autocommit = True
+        try:
+            cursor = self.conn.cursor()
+            for statement in statements:
+                print('*** %s' % statement, flush=True)
+                cursor.execute(statement)
+        finally:
+            if not self.mysql:
+                self.conn.autocommit = False
+        return statements
+
+    def _write(self, cursor, inserts, updates, bodies, replay, redelivered):
+        deltas = RollupDeltas() if self.rollups else None
+        if bodies and self.body_encoder is not None:
+            # Bodies first, rows reference them
+            self.dialect.insert_bodies(cursor, body_table(self.table), self.body_encoder.rows(bodies))
+        if inserts:
+            if deltas is not None:
+                deltas.add_inserts(inserts, self.dialect.logged_rows(cursor, self.table, [row[0] for row in inserts]))
+            if replay:
+                self.dialect.upsert(cursor, self.table, inserts, count_trials=False)
+            else:
+                counted = [row for row in inserts if row[0] not in redelivered]
+                if counted:
+                    self.dialect.upsert(cursor, self.table, counted, count_trials=True)
+                if len(counted) < len(inserts):
+                    self.dialect.upsert(cursor, self.table, [row for row in inserts if row[0] in redelivered],
+                                        count_trials=False)
+        if updates:
+            if deltas is not None:
+                # Status before the update, rows inserted above included
+                deltas.add_updates(updates, self.dialect.logged_rows(cursor, self.table, [u[0] for u in updates]))
+            self.dialect.update_status(cursor, self.table, updates)
+        if deltas:
+            for granularity in ROLLUP_GRANULARITIES:
+                rows = deltas.rows(granularity)
+                if rows:
+                    self.dialect.apply_rollups(cursor, rollup_table(self.table, granularity), rows)
+
+    def _apply(self, inserts, updates, bodies=None, replay=False, retry=True, redelivered=()):
+        """Write one batch in a single transaction.
+
+        A batch rejected by the database is written again one row at a time,
+        rows that still fail are logged and dropped: a batch always completes,
+        so that its deliveries can be acked along with the ones before it.
+        Connection failures are only raised when retry is False.
+        """
+        try:
+            self.run(self._write, inserts, updates, bodies, replay, redelivered, retry=retry)
+            return
+        except self.connection_errors:
+            raise
+        except self.errors as e:
+            print('*** Batch rejected, writing its %s rows one by one: %s' % (len(inserts) + len(updates), e),
+                  flush=True)
+
+        for row in inserts:
+            try:
+                row_bodies = {row[-1]: bodies[row[-1]]} if bodies and row[-1] in bodies else None
+                self.run(self._write, [row], [], row_bodies, replay, redelivered, retry=retry)
+            except self.connection_errors:
+                raise
+            except self.errors as e:
+                print('*** Dropped submit_log row of %s: %s' % (row[0], e), flush=True)
+        for update in updates:
+            try:
+                self.run(self._write, [], [update], None, replay, redelivered, retry=retry)
+            except self.connection_errors:
+                raise
+            except self.errors as e:
+                print('*** Dropped submit_log status update of %s: %s' % (update[0], e), flush=True)
+
+    def write(self, inserts, updates, bodies=None, redelivered=()):
+        """Write one batch, or spill it while the database is unreachable.
+
+        bodies maps the body_hash of the interned rows to their (ucs2, raw message).
+        Spilled rows are replayed without counting trials, redelivered or not.
+        """
+        if self.spill is None:
+            self._apply(inserts, updates, bodies, redelivered=redelivered)
+            return
+
+        if not self.spill.pending:
+            try:
+                if not self.table_ready:
+                    self._create_table(retry=False)
+                self._apply(inserts, updates, bodies, retry=False, redelivered=redelivered)
+                return
+            except self.connection_errors as e:
+                print('*** Database unreachable, spilling batches to %s: %s' % (self.spill.path, e), flush=True)
+        self.spill.append(inserts, updates, bodies)
+
+    def replay_spill(self, max_batches=20):
+        """Write back up to max_batches spilled batches in one go.
+
+        Replay is idempotent: a spilled row whose msgid is already logged is
+        left untouched instead of counting a new trial, so a batch replayed
+        twice after a crash is harmless.
+        Returns whether spilled batches are left to replay.
+        """
+        if self.spill is None or not self.spill.pending:
+            return False
+
+        batches, offset = self.spill.read(max_batches)
+        # Rows spilled before body_hash was added lack it
+        padding = (None,) * len(SUBMIT_LOG_COLUMNS)
+        inserts = [tuple(row) + padding[len(row):] for batch_inserts, _, _ in batches for row in batch_inserts]
+        # Later DLRs of a msgid supersede earlier ones, as within a batch
+        updates = {}
+        bodies = {}
+        for _, batch_updates, batch_bodies in batches:
+            for update in batch_updates:
+                updates[update[0]] = update
+            bodies.update(batch_bodies)
+        try:
+            if not self.table_ready:
+                self._create_table(retry=False)
+            self._apply(inserts, list(updates.values()), bodies, replay=True, retry=False)
+        except self.connection_errors:
+            return False
+
+        self.spill.consume(offset, len(batches))
+        if not self.spill.pending:
+            print('*** Spilled batches written back to the database', flush=True)
+        return self.spill.pending
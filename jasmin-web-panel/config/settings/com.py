@@ -194,12 +194,31 @@ TELNET_USERNAME = os.environ.get('TELNET_USERNAME', default='jcliadmin')  # noqa
 TELNET_PW = os.environ.get('TELNET_PW', default='jclipwd')  # noqa
 # reasonable value for intranet.
 TELNET_TIMEOUT = int(os.environ.get('TELNET_TIMEOUT', default=10))
+# Authenticated jcli sessions kept open per process, shared by the API and the panel
+TELNET_POOL_SIZE = int(os.environ.get('TELNET_POOL_SIZE', default=4))
+# Seconds a session may stay unused before it is closed
+TELNET_POOL_MAX_IDLE = int(os.environ.get('TELNET_POOL_MAX_IDLE', default=300))
+# Seconds a session may stay unused before it is checked again when handed out
+TELNET_POOL_HEALTH_CHECK = int(os.environ.get('TELNET_POOL_HEALTH_CHECK', default=30))
+# Seconds to wait for a free session
+TELNET_POOL_TIMEOUT = int(os.environ.get('TELNET_POOL_TIMEOUT', default=TELNET_TIMEOUT))
+# Seconds jcli listings stay cached in Redis, 0 disables the cache. Changes made
+# through the panel are seen at once, others and traffic counters after this delay
+TELNET_CACHE_TTL = int(os.environ.get('TELNET_CACHE_TTL', default=60))
+# Listings also kept in memory per process, checked against Redis on each use
+TELNET_CACHE_LRU_SIZE = int(os.environ.get('TELNET_CACHE_LRU_SIZE', default=32))
+# Seconds to wait for Redis before reading jcli directly
+TELNET_CACHE_REDIS_TIMEOUT = float(os.environ.get('TELNET_CACHE_REDIS_TIMEOUT', default=1))
 # There should be no need to change this
 STANDARD_PROMPT = 'jcli : '
 # Prompt for interactive commands
 INTERACTIVE_PROMPT = '> '
 # This is used for DLR Report
 SUBMIT_LOG = bool(os.environ.get('SUBMIT_LOG', '0'))
+# Days of submit_log shown by default in the DLR Report, keeps it to the latest partitions
+SUBMIT_LOG_REPORT_DAYS = int(os.environ.get('SUBMIT_LOG_REPORT_DAYS', default=7))
+# Read DLR Report counts from the rollup tables, needs DB_ROLLUPS=1 in sms_logger
+SUBMIT_LOG_ROLLUPS = int(os.environ.get('SUBMIT_LOG_ROLLUPS', default=0)) == 1
 
 DEFAULT_AUTO_FIELD = 'django.db.models.AutoField'
 
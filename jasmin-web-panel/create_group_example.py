@@ -5,9 +5,10 @@ Jasmin Group Creation Script
 Ye script Jasmin jCli se connect karke group create karti hai.
 """
 
-import pexpect
 import sys
 
+from main.core.jcli import JCliClient, JCliEOF, JCliTimeout
+
 # jCli Configuration
 TELNET_HOST = 'localhost'  # Docker container ke andar 'jasmin' hoga
 TELNET_PORT = 8990
@@ -32,10 +33,7 @@ def create_group(group_id):
     try:
         # Step 1: Telnet connection establish karo
         print(f"Connecting to Jasmin jCli at {TELNET_HOST}:{TELNET_PORT}...")
-        telnet = pexpect.spawn(
-            f"telnet {TELNET_HOST} {TELNET_PORT}", 
-            timeout=TELNET_TIMEOUT
-        )
+        telnet = JCliClient(TELNET_HOST, TELNET_PORT, timeout=TELNET_TIMEOUT)
         
         # Step 2: Username enter karo
         telnet.expect_exact('Username: ')
@@ -102,11 +100,11 @@ def create_group(group_id):
                 'error': error_msg
             }
             
-    except pexpect.EOF:
+    except JCliEOF:
         print("✗ Connection unexpectedly closed")
         return {'success': False, 'error': 'Telnet connection closed unexpectedly'}
     
-    except pexpect.TIMEOUT:
+    except JCliTimeout:
         print("✗ Connection timeout")
         return {'success': False, 'error': 'Connection timeout'}
     
@@ -124,10 +122,7 @@ def list_groups():
     """
     try:
         print(f"Connecting to Jasmin jCli at {TELNET_HOST}:{TELNET_PORT}...")
-        telnet = pexpect.spawn(
-            f"telnet {TELNET_HOST} {TELNET_PORT}", 
-            timeout=TELNET_TIMEOUT
-        )
+        telnet = JCliClient(TELNET_HOST, TELNET_PORT, timeout=TELNET_TIMEOUT)
         
         # Login
         telnet.expect_exact('Username: ')
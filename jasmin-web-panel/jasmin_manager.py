@@ -6,12 +6,13 @@ Ye script ek persistent connection maintain karta hai Jasmin jCli ke saath
 so that har baar login na karna pade.
 """
 
-import pexpect
 import time
 import sys
 import threading
 import queue
 
+from main.core.jcli import JCliClient
+
 # jCli Configuration
 TELNET_HOST = 'localhost'
 TELNET_PORT = 8990
@@ -34,10 +35,7 @@ class JasminManager:
         """Connect to Jasmin jCli with persistent connection"""
         try:
             print(f"Connecting to Jasmin jCli at {TELNET_HOST}:{TELNET_PORT}...")
-            self.telnet = pexpect.spawn(
-                f"telnet {TELNET_HOST} {TELNET_PORT}", 
-                timeout=TELNET_TIMEOUT
-            )
+            self.telnet = JCliClient(TELNET_HOST, TELNET_PORT, timeout=TELNET_TIMEOUT)
             
             # Login
             self.telnet.expect_exact('Username: ')
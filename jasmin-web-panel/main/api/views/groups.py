@@ -6,6 +6,8 @@ from rest_framework.response import Response
 from rest_framework import status as http_status
 
 from main.core.exceptions import MissingKeyError, ActionFailed, ObjectNotFoundError
+from main.core.smpp.cache import changes_config, get_cache
+from main.core.tools import listing_lines
 
 STANDARD_PROMPT = settings.STANDARD_PROMPT
 INTERACTIVE_PROMPT = settings.INTERACTIVE_PROMPT
@@ -19,20 +21,25 @@ class GroupsViewSet(ViewSet):
         """Group List, no request parameters provided"""
         if not hasattr(request, 'telnet'):
             return Response(data={"status": "bad request"}, status=http_status.HTTP_400_BAD_REQUEST)
-        telnet = request.telnet
+        # The session is only checked out on a cache miss
+        return Response(data=get_cache().get('groups', lambda: self.read_groups(request.telnet)))
+
+    @staticmethod
+    def read_groups(telnet):
         telnet.sendline('group -l')
         telnet.expect([r'(.+)\n' + STANDARD_PROMPT])
-        result = telnet.match.group(0).strip().replace("\r", '').split("\n")
+        result = listing_lines(telnet.match.group(0))
         if len(result) < 3:
-            return Response(data={"groups": []}, status=http_status.HTTP_200_OK)
+            return {"groups": []}
         groups = result[2:-2]
-        return Response(data={"groups": [
+        return {"groups": [
             {
                 'name': g.strip().lstrip('!#'),
                 'status': ('disabled' if g[1] == '!' else 'enabled')
             } for g in groups if g is not None
-        ]})
+        ]}
 
+    @changes_config
     def create(self, request):  # noqa
         """Create a group.
         One POST parameter required, the group identifier (a string)
@@ -67,6 +74,7 @@ class GroupsViewSet(ViewSet):
         else:
             raise ActionFailed(telnet.match.group(1))
 
+    @changes_config
     def simple_group_action(self, telnet, _action, gid):
         telnet.sendline('group -%s %s' % (_action, gid))
         matched_index = telnet.expect([
@@ -0,0 +1,456 @@
+"""Native client of jcli, Jasmin's telnet console.
+
+jcli is spoken to over a plain TCP socket: the few telnet options Jasmin
+negotiates are answered inline and stripped from the stream, lines are sent
+with a telnet end of line.
+
+JCliClient and AsyncJCliClient mirror the subset of pexpect the managers use,
+sendline(), expect(), expect_exact(), match and before, on bytes. Patterns
+are compiled once, as pexpect would (str patterns are encoded, regexes are
+DOTALL), and cached. Every jcli response ends with a prompt: received data is
+scanned incrementally for one, and the patterns are only searched once the
+buffer holds a prompt, not on each chunk the socket returns.
+
+This module doesn't depend on Django, so that the standalone scripts can use
+it as well. ai-admin/server/jcli.py is a vendored copy of it, kept identical:
+jasmin-web-panel's tests/test_jcli.py fails when they differ.
+"""
+
+import asyncio
+import re
+import socket
+from time import monotonic
+
+STANDARD_PROMPT = 'jcli : '
+INTERACTIVE_PROMPT = '> '
+USERNAME_PROMPT = 'Username: '
+PASSWORD_PROMPT = 'Password: '
+
+# Telnet commands and options, RFC 854 and 857/858
+IAC = 255
+DONT = 254
+DO = 253
+WONT = 252
+WILL = 251
+SB = 250
+SE = 240
+ECHO = 1
+SGA = 3
+
+# Options the server may enable on its side, every other option is refused
+ACCEPTED_OPTIONS = (ECHO, SGA)
+
+EOL = b'\r\n'
+
+
+class JCliError(Exception):
+    pass
+
+
+class JCliEOF(JCliError):
+    "The connection was closed or could not be opened"
+
+
+class JCliTimeout(JCliError):
+    "No expected response in time"
+
+
+class JCliLoginFailed(JCliError):
+    pass
+
+
+_matchers = {}
+
+
+def compile_matcher(pattern, exact=False):
+    "Compiled bytes regex of a pexpect style pattern"
+    key = (pattern, exact)
+    matcher = _matchers.get(key)
+    if matcher is None:
+        raw = pattern.encode('utf-8') if isinstance(pattern, str) else pattern
+        matcher = _matchers[key] = re.compile(re.escape(raw) if exact else raw, re.DOTALL)
+    return matcher
+
+
+def compile_matchers(patterns, exact=False):
+    if isinstance(patterns, (str, bytes)):
+        patterns = [patterns]
+    return [compile_matcher(pattern, exact) for pattern in patterns]
+
+
+class TelnetDecoder(object):
+    """Strips telnet commands from the received data and builds their replies.
+
+    The server may enable ECHO and SGA on its side, any other option is
+    refused. Replies are only sent on a change of state, RFC 1143.
+    """
+
+    def __init__(self):
+        self.state = 'data'
+        self.verb = None
+        self.options = {}
+
+    def _reply(self, verb, option):
+        if verb in (WILL, WONT):
+            # The server's side of the option
+            key = ('server', option)
+            reply = DO if verb == WILL and option in ACCEPTED_OPTIONS else DONT
+        else:
+            # Ours, we enable none
+            key = ('client', option)
+            reply = WONT
+        if self.options.get(key, reply if verb in (WONT, DONT) else None) == reply:
+            return b''
+        self.options[key] = reply
+        return bytes((IAC, reply, option))
+
+    def feed(self, chunk):
+        "Returns the application data of a received chunk and the replies to send"
+        if self.state == 'data' and IAC not in chunk:
+            return chunk, b''
+
+        data = bytearray()
+        replies = bytearray()
+        for byte in chunk:
+            if self.state == 'data':
+                if byte == IAC:
+                    self.state = 'iac'
+                else:
+                    data.append(byte)
+            elif self.state == 'iac':
+                if byte == IAC:
+                    data.append(IAC)
+                    self.state = 'data'
+                elif byte in (WILL, WONT, DO, DONT):
+                    self.verb = byte
+                    self.state = 'option'
+                elif byte == SB:
+                    self.state = 'sb'
+                else:
+                    # NOP, GA and the like
+                    self.state = 'data'
+            elif self.state == 'option':
+                replies += self._reply(self.verb, byte)
+                self.state = 'data'
+            elif self.state == 'sb':
+                if byte == IAC:
+                    self.state = 'sb-iac'
+            elif self.state == 'sb-iac':
+                self.state = 'data' if byte == SE else 'sb'
+        return bytes(data), bytes(replies)
+
+
+class BaseJCliClient(object):
+    "Buffering and matching shared by the sync and asyncio clients"
+
+    def __init__(self, timeout=30, prompts=(STANDARD_PROMPT, INTERACTIVE_PROMPT, USERNAME_PROMPT, PASSWORD_PROMPT)):
+        self.timeout = timeout
+        self.decoder = TelnetDecoder()
+        self.buffer = bytearray()
+        self.before = None
+        self.after = None
+        self.match = None
+        self.closed = False
+        # Nothing sent since the last output read up to a standard prompt
+        self.at_prompt = False
+
+        prompts = [p.encode('utf-8') for p in prompts]
+        self._prompt_matcher = re.compile(b'|'.join(re.escape(p) for p in prompts))
+        # A prompt may straddle the scanned part and the new data
+        self._overlap = max(len(p) for p in prompts) - 1
+        self._scanned = 0
+        self._prompt_seen = False
+        self._standard_prompt = STANDARD_PROMPT.encode('utf-8')
+
+    def _encode(self, s):
+        return s.encode('utf-8') if isinstance(s, str) else s
+
+    def _received(self, chunk):
+        "Appends a received chunk to the buffer, returns the telnet replies it calls for"
+        data, replies = self.decoder.feed(chunk)
+        self.buffer += data
+        return replies
+
+    def _settled(self):
+        "Whether the buffer holds a prompt, only the data received since the last call is scanned"
+        if not self._prompt_seen:
+            start = max(0, self._scanned - self._overlap)
+            self._prompt_seen = self._prompt_matcher.search(self.buffer, start) is not None
+            self._scanned = len(self.buffer)
+        return self._prompt_seen
+
+    def _search(self, matchers):
+        "Consumes the earliest match of the matchers in the buffer, returns its index or None"
+        data = bytes(self.buffer)
+        found = None
+        for index, matcher in enumerate(matchers):
+            match = matcher.search(data)
+            if match is not None and (found is None or match.start() < found[1].start()):
+                found = (index, match)
+        if found is None:
+            return None
+
+        index, match = found
+        self.before = data[:match.start()]
+        self.after = match.group(0)
+        self.match = match
+        del self.buffer[:match.end()]
+        self._scanned = 0
+        self._prompt_seen = False
+        self.at_prompt = not self.buffer and self.after.endswith(self._standard_prompt)
+        return index
+
+    def _take_outputs(self, outputs, count):
+        "Moves the outputs of the buffer that end with a standard prompt to outputs, up to count"
+        prompt = self._standard_prompt
+        start = 0
+        while len(outputs) < count:
+            end = self.buffer.find(prompt, start)
+            if end == -1:
+                break
+            outputs.append(bytes(self.buffer[start:end]))
+            start = end + len(prompt)
+        if start:
+            del self.buffer[:start]
+            self._scanned = 0
+            self._prompt_seen = False
+            self.at_prompt = not self.buffer and len(outputs) == count
+        return start > 0
+
+    def _pipelined(self, commands):
+        return b''.join(self._encode(command) + EOL for command in commands)
+
+    def _timeout(self, timeout):
+        return self.timeout if timeout == -1 or timeout is None else timeout
+
+
+class JCliClient(BaseJCliClient):
+    """Blocking jcli session over a TCP socket.
+
+    Raises JCliEOF when the connection is lost, JCliTimeout when nothing
+    matches in time.
+    """
+
+    def __init__(self, host, port, timeout=30, **kwargs):
+        BaseJCliClient.__init__(self, timeout, **kwargs)
+        try:
+            self.sock = socket.create_connection((host, port), timeout)
+        except socket.timeout:
+            raise JCliTimeout('Connecting to %s:%s timed out' % (host, port))
+        except OSError as e:
+            raise JCliEOF('Connecting to %s:%s failed: %s' % (host, port, e))
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def send(self, s):
+        data = self._encode(s)
+        self.at_prompt = False
+        try:
+            self.sock.sendall(data)
+        except OSError as e:
+            raise JCliEOF(str(e))
+        return len(data)
+
+    def sendline(self, s=''):
+        return self.send(self._encode(s) + EOL)
+
+    def _fill(self, timeout):
+        self.sock.settimeout(timeout)
+        try:
+            chunk = self.sock.recv(65536)
+        except socket.timeout:
+            return
+        except OSError as e:
+            raise JCliEOF(str(e))
+        if not chunk:
+            raise JCliEOF('Connection closed by jcli')
+        replies = self._received(chunk)
+        if replies:
+            self.send(replies)
+
+    def _expect(self, matchers, timeout):
+        deadline = monotonic() + self._timeout(timeout)
+        while True:
+            if self._settled():
+                index = self._search(matchers)
+                if index is not None:
+                    return index
+            remaining = deadline - monotonic()
+            if remaining <= 0:
+                # Last chance for a pattern that doesn't end with a prompt
+                index = self._search(matchers)
+                if index is not None:
+                    return index
+                raise JCliTimeout('Timeout waiting for %s' % [m.pattern for m in matchers])
+            try:
+                self._fill(remaining)
+            except JCliEOF:
+                index = self._search(matchers)
+                if index is not None:
+                    return index
+                raise
+
+    def expect(self, pattern, timeout=-1):
+        "Wait for a regex or any of a list of regexes, returns the index of the one that matched"
+        return self._expect(compile_matchers(pattern), timeout)
+
+    def expect_exact(self, pattern, timeout=-1):
+        "expect() for plain strings"
+        return self._expect(compile_matchers(pattern, exact=True), timeout)
+
+    def pipeline(self, commands, timeout=-1):
+        """Send commands in a single write, returns their outputs in order.
+
+        Commands must not prompt for input, e.g. show commands: jcli handles
+        the lines one after the other, so the outputs are told apart by the
+        standard prompt ending each. An output is what comes before its
+        prompt, the echo of the command included. The timeout applies to
+        each wait for data, not to the whole pipeline.
+        """
+        outputs = []
+        if not commands:
+            return outputs
+        self.send(self._pipelined(commands))
+        deadline = monotonic() + self._timeout(timeout)
+        while True:
+            if self._take_outputs(outputs, len(commands)):
+                deadline = monotonic() + self._timeout(timeout)
+            if len(outputs) == len(commands):
+                return outputs
+            remaining = deadline - monotonic()
+            if remaining <= 0:
+                raise JCliTimeout('Timeout waiting for %s of %s outputs' % (len(commands) - len(outputs), len(commands)))
+            self._fill(remaining)
+
+    def login(self, username, password):
+        self.expect_exact(USERNAME_PROMPT)
+        self.sendline(username)
+        self.expect_exact(PASSWORD_PROMPT)
+        self.sendline(password)
+        try:
+            self.expect_exact(STANDARD_PROMPT)
+        except JCliEOF:
+            raise JCliLoginFailed('Incorrect username or password')
+
+    def close(self, force=True):
+        if not self.closed:
+            self.closed = True
+            self.sock.close()
+
+    def kill(self, sig=None):
+        self.close()
+
+    def isalive(self):
+        return not self.closed
+
+
+class AsyncJCliClient(BaseJCliClient):
+    """jcli session over an asyncio stream, open it with
+    ``await AsyncJCliClient.open(host, port)``.
+
+    expect(), expect_exact(), login() and close() are coroutines.
+    """
+
+    def __init__(self, reader, writer, timeout=30, **kwargs):
+        BaseJCliClient.__init__(self, timeout, **kwargs)
+        self.reader = reader
+        self.writer = writer
+
+    @classmethod
+    async def open(cls, host, port, timeout=30, **kwargs):
+        try:
+            reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+        except asyncio.TimeoutError:
+            raise JCliTimeout('Connecting to %s:%s timed out' % (host, port))
+        except OSError as e:
+            raise JCliEOF('Connecting to %s:%s failed: %s' % (host, port, e))
+        sock = writer.get_extra_info('socket')
+        if sock is not None:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return cls(reader, writer, timeout, **kwargs)
+
+    def send(self, s):
+        data = self._encode(s)
+        self.at_prompt = False
+        if self.writer.is_closing():
+            raise JCliEOF('Connection closed')
+        self.writer.write(data)
+        return len(data)
+
+    def sendline(self, s=''):
+        return self.send(self._encode(s) + EOL)
+
+    async def _fill(self, timeout):
+        try:
+            chunk = await asyncio.wait_for(self.reader.read(65536), timeout)
+        except asyncio.TimeoutError:
+            return
+        except OSError as e:
+            raise JCliEOF(str(e))
+        if not chunk:
+            raise JCliEOF('Connection closed by jcli')
+        replies = self._received(chunk)
+        if replies:
+            self.send(replies)
+
+    async def _expect(self, matchers, timeout):
+        deadline = monotonic() + self._timeout(timeout)
+        while True:
+            if self._settled():
+                index = self._search(matchers)
+                if index is not None:
+                    return index
+            remaining = deadline - monotonic()
+            if remaining <= 0:
+                index = self._search(matchers)
+                if index is not None:
+                    return index
+                raise JCliTimeout('Timeout waiting for %s' % [m.pattern for m in matchers])
+            try:
+                await self._fill(remaining)
+            except JCliEOF:
+                index = self._search(matchers)
+                if index is not None:
+                    return index
+                raise
+
+    async def expect(self, pattern, timeout=-1):
+        return await self._expect(compile_matchers(pattern), timeout)
+
+    async def expect_exact(self, pattern, timeout=-1):
+        return await self._expect(compile_matchers(pattern, exact=True), timeout)
+
+    async def pipeline(self, commands, timeout=-1):
+        "See JCliClient.pipeline()"
+        outputs = []
+        if not commands:
+            return outputs
+        self.send(self._pipelined(commands))
+        deadline = monotonic() + self._timeout(timeout)
+        while True:
+            if self._take_outputs(outputs, len(commands)):
+                deadline = monotonic() + self._timeout(timeout)
+            if len(outputs) == len(commands):
+                return outputs
+            remaining = deadline - monotonic()
+            if remaining <= 0:
+                raise JCliTimeout('Timeout waiting for %s of %s outputs' % (len(commands) - len(outputs), len(commands)))
+            await self._fill(remaining)
+
+    async def login(self, username, password):
+        await self.expect_exact(USERNAME_PROMPT)
+        self.sendline(username)
+        await self.expect_exact(PASSWORD_PROMPT)
+        self.sendline(password)
+        try:
+            await self.expect_exact(STANDARD_PROMPT)
+        except JCliEOF:
+            raise JCliLoginFailed('Incorrect username or password')
+
+    async def close(self):
+        if not self.closed:
+            self.closed = True
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except OSError:
+                pass
@@ -0,0 +1,30 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_submitlog'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SubmitLogRollup',
+            fields=[
+                ('bucket', models.DateTimeField(primary_key=True, serialize=False, verbose_name='Bucket')),
+                ('uid', models.CharField(max_length=15, verbose_name='UID')),
+                ('routed_cid', models.CharField(max_length=30, verbose_name='Routed CID')),
+                ('source_connector', models.CharField(max_length=15, verbose_name='Source Connector')),
+                ('status', models.CharField(max_length=15, verbose_name='Status')),
+                ('messages', models.IntegerField(default=0, verbose_name='Messages')),
+                ('pdu_count', models.IntegerField(default=0, verbose_name='PDU Count')),
+                ('charge', models.DecimalField(decimal_places=7, default=0, max_digits=20, verbose_name='Charge')),
+            ],
+            options={
+                'verbose_name': 'Submit Log Rollup',
+                'verbose_name_plural': 'Submit Log Rollups',
+                'db_table': 'submit_log_rollup_hour',
+                'managed': False,
+            },
+        ),
+    ]
@@ -0,0 +1,38 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_submitlogrollup'),
+    ]
+
+    operations = [
+        # sms_logger adds the column to the table it writes to, the model only follows
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AddField(
+                    model_name='submitlog',
+                    name='body_hash',
+                    field=models.CharField(blank=True, max_length=40, null=True, verbose_name='Body Hash'),
+                ),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SubmitLogBody',
+            fields=[
+                ('hash', models.CharField(max_length=40, primary_key=True, serialize=False, verbose_name='Hash')),
+                ('encoding', models.CharField(max_length=4, verbose_name='Encoding')),
+                ('ucs2', models.BooleanField(default=False, verbose_name='UCS2')),
+                ('length', models.IntegerField(verbose_name='Length')),
+                ('body', models.BinaryField(null=True, verbose_name='Body')),
+                ('created_at', models.DateTimeField(verbose_name='Created At')),
+            ],
+            options={
+                'verbose_name': 'Submit Log Body',
+                'verbose_name_plural': 'Submit Log Bodies',
+                'db_table': 'submit_log_body',
+                'managed': False,
+            },
+        ),
+    ]
@@ -3,6 +3,8 @@ from .currency import Currency, get_available_currencies
 from .emailserver import EmailServer, get_available_server
 from .guid import GuidModel, Tokenizer
 from .submit_log import SubmitLog
+from .submit_log_body import SubmitLogBody
+from .submit_log_rollup import SubmitLogRollup
 from .timestamped import TimeStampedModel
 
 from .smpp import (
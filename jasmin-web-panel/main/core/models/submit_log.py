@@ -46,6 +46,8 @@ class SubmitLog(models.Model):
     trials = models.PositiveIntegerField(_("Trials"), default=1)
     created_at = models.DateTimeField(_("Created At"), null=False, db_index=True)
     status_at = models.DateTimeField(_("Status At"), null=False)
+    # Set when sms_logger interns bodies (DB_BODY_STORAGE=interned), see SubmitLogBody
+    body_hash = models.CharField(_("Body Hash"), max_length=40, null=True, blank=True)
 
     class Meta:
         db_table = "submit_log"
@@ -55,3 +57,14 @@ class SubmitLog(models.Model):
 
     def __str__(self):
         return self.msgid  # noqa
+
+    @property
+    def message(self):
+        """Decoded text of the message, from its interned body when one was attached to the row"""
+        body = getattr(self, "body", None)
+        if body is not None:
+            return body.text
+        if self.short_message is None:
+            return ""
+        # sms_logger stores UCS2 messages re-encoded to UTF-8
+        return bytes(self.short_message).decode("utf-8", "replace")
@@ -0,0 +1,53 @@
+"""Interned message bodies of submit_log, stored by sms_logger.
+
+Requirement:
+- DB_BODY_STORAGE=interned in the sms_logger environment, which creates the
+  submit_log_body table, see config/docker/sms_logger/bodies.py
+- The zstandard package to read bodies compressed with DB_BODY_COMPRESSION=zstd
+"""
+
+import zlib
+
+from django.utils.translation import gettext as _
+from django.db import models
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+class SubmitLogBody(models.Model):
+    hash = models.CharField(_("Hash"), max_length=40, primary_key=True)
+    encoding = models.CharField(_("Encoding"), max_length=4)
+    ucs2 = models.BooleanField(_("UCS2"), default=False)
+    length = models.IntegerField(_("Length"))
+    body = models.BinaryField(_("Body"), null=True)
+    created_at = models.DateTimeField(_("Created At"))
+
+    class Meta:
+        managed = False
+        db_table = "submit_log_body"
+        verbose_name = _("Submit Log Body")
+        verbose_name_plural = _("Submit Log Bodies")
+
+    def __str__(self):
+        return self.hash
+
+    @property
+    def raw(self):
+        """Raw bytes of the message, as sent"""
+        body = bytes(self.body or b"")
+        if self.encoding == "zlib":
+            return zlib.decompress(body)
+        if self.encoding == "zstd":
+            if zstandard is None:
+                raise RuntimeError("zstd compressed bodies need the zstandard package")
+            return zstandard.ZstdDecompressor().decompress(body, max_output_size=self.length)
+        return body
+
+    @property
+    def text(self):
+        if self.ucs2:
+            return self.raw.decode("utf_16_be", "replace")
+        return self.raw.decode("utf-8", "replace")
@@ -0,0 +1,31 @@
+"""Hourly submit_log counters maintained by sms_logger.
+
+Requirement:
+- DB_ROLLUPS=1 in the sms_logger environment, which creates and maintains
+  the submit_log_rollup_hour table, see config/docker/sms_logger/rollups.py
+"""
+
+from django.utils.translation import gettext as _
+from django.db import models
+
+
+class SubmitLogRollup(models.Model):
+    # Not unique on its own, the table's key is (bucket, uid, routed_cid, source_connector, status).
+    # Only ever aggregated, never fetched as model instances
+    bucket = models.DateTimeField(_("Bucket"), primary_key=True)
+    uid = models.CharField(_("UID"), max_length=15)
+    routed_cid = models.CharField(_("Routed CID"), max_length=30)
+    source_connector = models.CharField(_("Source Connector"), max_length=15)
+    status = models.CharField(_("Status"), max_length=15)
+    messages = models.IntegerField(_("Messages"), default=0)
+    pdu_count = models.IntegerField(_("PDU Count"), default=0)
+    charge = models.DecimalField(_("Charge"), default=0, decimal_places=7, max_digits=20)
+
+    class Meta:
+        managed = False
+        db_table = "submit_log_rollup_hour"
+        verbose_name = _("Submit Log Rollup")
+        verbose_name_plural = _("Submit Log Rollups")
+
+    def __str__(self):
+        return "%s %s %s" % (self.bucket, self.uid, self.status)
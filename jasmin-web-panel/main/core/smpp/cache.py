@@ -0,0 +1,173 @@
+"""Read-through cache of the parsed jcli listings.
+
+Listings (users, groups, filters, routers, connectors) are stored in Redis,
+shared by every process of the panel, and in a small per-process LRU, keyed
+by object type and by a global configuration version. Manager methods that
+change the configuration bump the version, see changes_config(), so that a
+listing is read from jcli again on the next call, by every process.
+
+Changes made through jcli directly, or by another panel, are only seen once
+the cached listings expire after TELNET_CACHE_TTL seconds. So are the listed
+values that change with the traffic, quota balances and connector sessions.
+When Redis can't be reached the cache is bypassed, as bumps of the other
+processes can't be seen either.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from django.conf import settings
+
+import redis
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'jasmin-web-panel:config'
+
+
+class ConfigCache(object):
+    def __init__(self, client, ttl=300, lru_size=32):
+        self.client = client
+        self.ttl = ttl
+        self.lru_size = lru_size
+        self.lru = OrderedDict()
+        self.lock = threading.Lock()
+        self.pid = os.getpid()
+
+        self.hits = 0
+        self.misses = 0
+
+    def _key(self, kind):
+        return '%s:%s' % (KEY_PREFIX, kind)
+
+    def version(self):
+        "The current configuration version, None when Redis can't be reached"
+        try:
+            return int(self.client.get(self._key('version')) or 0)
+        except redis.RedisError as e:
+            logger.warning("Config cache bypassed, Redis error: %s", e)
+            return None
+
+    def _remember(self, kind, version, loaded_at, payload):
+        with self.lock:
+            self.lru[kind] = (version, loaded_at, payload)
+            self.lru.move_to_end(kind)
+            while len(self.lru) > self.lru_size:
+                self.lru.popitem(last=False)
+
+    def get(self, kind, load):
+        "The listing of kind, from the cache if it's of the current version, else from load()"
+        if not self.ttl:
+            return load()
+        version = self.version()
+        if version is None:
+            return load()
+
+        with self.lock:
+            cached = self.lru.get(kind)
+            # Entries expire with the Redis key they were read from, as
+            # changes made outside the panel don't bump the version
+            if cached is not None and cached[0] == version and time.time() - cached[1] < self.ttl:
+                self.lru.move_to_end(kind)
+                self.hits += 1
+                # Each caller gets its own copy
+                return json.loads(cached[2])
+
+        try:
+            stored = self.client.get(self._key(kind))
+        except redis.RedisError as e:
+            logger.warning("Config cache bypassed, Redis error: %s", e)
+            return load()
+        if stored is not None:
+            stored_version, loaded_at, payload = stored.split(b':', 2)
+            loaded_at = float(loaded_at)
+            if int(stored_version) == version and time.time() - loaded_at < self.ttl:
+                self._remember(kind, version, loaded_at, payload)
+                self.hits += 1
+                return json.loads(payload)
+
+        self.misses += 1
+        loaded_at = time.time()
+        value = load()
+        payload = json.dumps(value).encode()
+        # Stored with the version read before loading: if the configuration
+        # changed meanwhile the listing is simply never used
+        try:
+            self.client.set(self._key(kind), b'%d:%f:%s' % (version, loaded_at, payload), ex=self.ttl)
+        except redis.RedisError as e:
+            logger.warning("Config cache not updated, Redis error: %s", e)
+            return value
+        self._remember(kind, version, loaded_at, payload)
+        return value
+
+    def bump(self):
+        "Invalidate every cached listing, of every process"
+        with self.lock:
+            self.lru.clear()
+        try:
+            self.client.incr(self._key('version'))
+        except redis.RedisError as e:
+            logger.error("Config version not bumped, cached listings may be stale: %s", e)
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'lru_size': len(self.lru),
+        }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    "The config cache of the current process, created on first use and after a fork"
+    global _cache
+    with _cache_lock:
+        if _cache is None or _cache.pid != os.getpid():
+            _cache = ConfigCache(
+                redis.Redis(
+                    host=settings.REDIS_HOST, port=settings.REDIS_PORT, db=settings.REDIS_DB,
+                    socket_timeout=settings.TELNET_CACHE_REDIS_TIMEOUT,
+                    socket_connect_timeout=settings.TELNET_CACHE_REDIS_TIMEOUT,
+                ),
+                ttl=settings.TELNET_CACHE_TTL,
+                lru_size=settings.TELNET_CACHE_LRU_SIZE,
+            )
+        return _cache
+
+
+def cached_listing(kind):
+    "Decorates the method returning the listing of kind, so that it reads through the cache"
+    def decorator(method):
+        @wraps(method)
+        def wrapper(self):
+            return get_cache().get(kind, lambda: method(self))
+        return wrapper
+    return decorator
+
+
+def changes_config(method):
+    """Decorates the methods that change the gateway configuration, the
+    version is bumped once they return or fail.
+
+    A method reading a listing back after its change calls
+    TelnetConnection.config_changed() first, so that it gets a fresh one, and
+    the version isn't bumped again.
+    """
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        self._config_bumped = False
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            if not self._config_bumped:
+                get_cache().bump()
+    return wrapper
+
@@ -1,30 +1,237 @@
-from django.conf import settings
+import logging
+import os
+import threading
+import uuid
+from collections import deque
+from time import monotonic
 
-import pexpect
+from django.conf import settings
+from rest_framework.exceptions import APIException
 
 from ..exceptions import TelnetUnexpectedResponse, TelnetConnectionTimeout, TelnetLoginFailed
+from ..jcli import JCliClient, JCliError, JCliEOF, JCliLoginFailed, JCliTimeout
+from .cache import get_cache
 
-class TelnetConnection(object):
-    def __init__(self):
-        try:
-            telnet = pexpect.spawn("telnet %s %s" % (settings.TELNET_HOST, settings.TELNET_PORT), timeout=settings.TELNET_TIMEOUT,)
-            telnet.expect_exact('Username: ')
-            telnet.sendline(settings.TELNET_USERNAME)
-            telnet.expect_exact('Password: ')
-            telnet.sendline(settings.TELNET_PW)
-        except pexpect.EOF:
-            raise TelnetUnexpectedResponse
-        except pexpect.TIMEOUT:
+logger = logging.getLogger(__name__)
+
+
+def jcli_login():
+    "Open a jcli session and log in, returns the session at the standard prompt"
+    try:
+        telnet = JCliClient(settings.TELNET_HOST, settings.TELNET_PORT, timeout=settings.TELNET_TIMEOUT)
+    except JCliEOF:
+        raise TelnetUnexpectedResponse
+    except JCliTimeout:
+        raise TelnetConnectionTimeout
+    try:
+        telnet.login(settings.TELNET_USERNAME, settings.TELNET_PW)
+    except JCliError as e:
+        telnet.close()
+        if isinstance(e, JCliLoginFailed):
+            raise TelnetLoginFailed
+        if isinstance(e, JCliTimeout):
             raise TelnetConnectionTimeout
+        raise TelnetUnexpectedResponse
+    return telnet
+
+
+def jcli_quit(telnet):
+    try:
+        telnet.sendline('quit')
+        telnet.close()
+    except JCliError:
+        telnet.kill(9)
+
+
+class PooledSession(object):
+    "An authenticated jcli session and the time it was last handed back to the pool"
+    __slots__ = ('telnet', 'idle_since')
+
+    def __init__(self, telnet):
+        self.telnet = telnet
+        self.idle_since = monotonic()
+
+
+class TelnetPool(object):
+    """Process-wide pool of authenticated jcli sessions.
+
+    Up to TELNET_POOL_SIZE sessions are opened on demand and handed out with
+    checkout(), checkin() gives them back. A session whose last command was
+    not read up to its standard prompt is resynced on checkin: whatever
+    output a manager left unread is consumed and an interactive command left
+    open is cancelled, so that the next user starts at a clean standard
+    prompt. A session idle for more than TELNET_POOL_HEALTH_CHECK
+    seconds is resynced again before being handed out, one idle for more
+    than TELNET_POOL_MAX_IDLE seconds is closed. Sessions that fail are
+    discarded and replaced by fresh logins.
+    """
+
+    def __init__(self, size, max_idle, health_check, timeout, connect=jcli_login, close=jcli_quit):
+        self.size = size
+        self.max_idle = max_idle
+        self.health_check = health_check
+        self.timeout = timeout
+        self.connect = connect
+        self.close = close
+        self.idle = deque()
+        self.open = 0
+        self.condition = threading.Condition()
+        self.pid = os.getpid()
+
+        self.logins = 0
+        self.discarded = 0
+
+    def _discard(self, session):
+        self.discarded += 1
         try:
-            telnet.expect_exact(settings.STANDARD_PROMPT)
-        except pexpect.EOF:
-            raise TelnetLoginFailed
-        else:
-            self.telnet = telnet
-    def __del__(self):
-        "Make sure telnet connection is closed when unleashing response back to client"
+            self.close(session.telnet)
+        except Exception as e:
+            logger.warning("Closing jcli session failed: %s", e)
+
+    def _resync(self, telnet):
+        "Read up to a fresh standard prompt, returns whether the session is usable"
+        token = 'sync-%s' % uuid.uuid4().hex
         try:
-            self.telnet.sendline('quit')
-        except pexpect.ExceptionPexpect:
-            self.telnet.kill(9)
\ No newline at end of file
+            telnet.sendline(token)
+            # jcli's own "Unknown command: <token>", past its echo of the
+            # token and any output left unread
+            telnet.expect_exact(': ' + token)
+            index = telnet.expect_exact([settings.STANDARD_PROMPT, settings.INTERACTIVE_PROMPT])
+            if index == 1:
+                # An interactive command was left open
+                telnet.sendline('ko')
+                telnet.expect_exact(settings.STANDARD_PROMPT)
+            return True
+        except JCliError as e:
+            logger.warning("jcli session lost: %s", e)
+            return False
+
+    def checkout(self):
+        "Hand out an authenticated session, waiting up to TELNET_POOL_TIMEOUT for one to be free"
+        deadline = monotonic() + self.timeout
+        while True:
+            with self.condition:
+                while not self.idle and self.open >= self.size:
+                    remaining = deadline - monotonic()
+                    if remaining <= 0:
+                        raise TelnetConnectionTimeout('No free jcli session')
+                    self.condition.wait(remaining)
+                if self.idle:
+                    session = self.idle.pop()
+                else:
+                    session = None
+                    self.open += 1
+
+            # Checks and logins do not hold the pool
+            if session is None:
+                try:
+                    telnet = self.connect()
+                except Exception:
+                    self._release_slot()
+                    raise
+                self.logins += 1
+                return telnet
+
+            idle_for = monotonic() - session.idle_since
+            if idle_for <= self.max_idle and (idle_for <= self.health_check or self._resync(session.telnet)):
+                return session.telnet
+            self._release_slot()
+            self._discard(session)
+
+    def _release_slot(self):
+        with self.condition:
+            self.open -= 1
+            self.condition.notify()
+
+    def checkin(self, telnet, broken=False):
+        "Give a session back, broken ones are closed"
+        session = PooledSession(telnet)
+        if not broken and not telnet.at_prompt and not self._resync(telnet):
+            broken = True
+        if broken:
+            self._release_slot()
+            self._discard(session)
+            return
+        with self.condition:
+            self.idle.append(session)
+            self.condition.notify()
+
+    def stats(self):
+        return {
+            'open': self.open,
+            'idle': len(self.idle),
+            'logins': self.logins,
+            'discarded': self.discarded,
+        }
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    "The pool of the current process, created on first use and after a fork"
+    global _pool
+    with _pool_lock:
+        if _pool is None or _pool.pid != os.getpid():
+            _pool = TelnetPool(
+                size=settings.TELNET_POOL_SIZE,
+                max_idle=settings.TELNET_POOL_MAX_IDLE,
+                health_check=settings.TELNET_POOL_HEALTH_CHECK,
+                timeout=settings.TELNET_POOL_TIMEOUT,
+            )
+        return _pool
+
+
+class LazySession(object):
+    """Stands for a pooled jcli session that is only checked out on first use.
+
+    Attribute accesses are forwarded to the session, release() gives it back
+    if one was checked out.
+    """
+
+    def __init__(self):
+        self._telnet = None
+
+    def _session(self):
+        if self._telnet is None:
+            try:
+                self._telnet = get_pool().checkout()
+            except APIException as e:
+                logger.error("Telnet connection error: %s", e)
+                raise
+        return self._telnet
+
+    def __getattr__(self, name):
+        return getattr(self._session(), name)
+
+    def release(self):
+        telnet, self._telnet = self._telnet, None
+        if telnet is not None:
+            get_pool().checkin(telnet)
+
+
+class TelnetConnection(object):
+    """Base of the managers, which hold a pooled jcli session from its first use
+    to their release. Listings served from the cache don't check one out.
+    """
+
+    def __init__(self):
+        self.telnet = LazySession()
+
+    def release(self):
+        "Give the session back to the pool, if one was checked out"
+        telnet = getattr(self, 'telnet', None)
+        if telnet is not None:
+            telnet.release()
+
+    def config_changed(self):
+        "Invalidate the cached listings now, from a method decorated by changes_config()"
+        get_cache().bump()
+        self._config_bumped = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
@@ -9,7 +9,8 @@ from main.core.exceptions import (
     UnknownError, MissingKeyError,
     ObjectNotFoundError
 )
-from main.core.tools import set_ikeys, split_cols
+from main.core.tools import listing_lines, set_ikeys, split_cols
+from .cache import cached_listing, changes_config
 from .conn import TelnetConnection
 
 STANDARD_PROMPT = settings.STANDARD_PROMPT
@@ -38,11 +39,12 @@ class Filters(TelnetConnection):
     )
     FILTER_PARAMETERS = ['cid', 'uid', 'gid', 'source_addr', 'destination_addr', 'short_message', 'dateInterval', 'timeInterval', 'tag', 'pyCode']
 
+    @cached_listing('filters')
     def _list(self):
         "List Filters as python dict"
         self.telnet.sendline('filter -l')
         self.telnet.expect([r'(.+)\n' + STANDARD_PROMPT])
-        result = str(self.telnet.match.group(0)).strip().replace("\\r", '').split("\\n")
+        result = listing_lines(self.telnet.match.group(0))
         if len(result) < 3:
             return {'filters': []}
         results = [l.replace(', ', ',').replace('(!)', '')
@@ -78,6 +80,7 @@ class Filters(TelnetConnection):
         "Details for one Filter by fid (integer)"
         return self.get_filter(fid)
 
+    @changes_config
     def create(self, data):
         """Create Filter.
         Required parameters: type, fid, parameters
@@ -137,6 +140,7 @@ class Filters(TelnetConnection):
         set_ikeys(self.telnet, ikeys)
         self.telnet.sendline('persist')
         self.telnet.expect(r'.*' + STANDARD_PROMPT)
+        self.config_changed()
         return {'filter': self.get_filter(fid)}
 
     def simple_filter_action(self, action, fid, return_filter=True):
@@ -150,6 +154,7 @@ class Filters(TelnetConnection):
             self.telnet.sendline('persist')
             if return_filter:
                 self.telnet.expect(r'.*' + STANDARD_PROMPT)
+                self.config_changed()
                 return {'filter': self.get_filter(fid)}
             else:
                 return {'fid': fid}
@@ -158,6 +163,7 @@ class Filters(TelnetConnection):
         else:
             raise JasminError(self.telnet.match.group(1))
 
+    @changes_config
     def destroy(self, fid):
         """Delete a filter. One parameter required, the filter identifier (a string)
 
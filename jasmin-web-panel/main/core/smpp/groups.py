@@ -1,7 +1,9 @@
 from django.conf import settings
 
 from ..exceptions import MissingKeyError, ActionFailed, ObjectNotFoundError
+from ..tools import listing_lines
 
+from .cache import cached_listing, changes_config
 from .conn import TelnetConnection
 import logging
 
@@ -15,11 +17,12 @@ class Groups(TelnetConnection):
     lookup_field = 'gid'
     available_actions = ['list', 'add', 'delete', 'enable', 'disable']
 
+    @cached_listing('groups')
     def list(self):
         "List groups. No data parameters provided or required."
         self.telnet.sendline('group -l')
         self.telnet.expect([r'(.+)\n' + STANDARD_PROMPT])
-        result = str(self.telnet.match.group(0)).strip().replace("\\r", '').split("\\n")
+        result = listing_lines(self.telnet.match.group(0))
         if len(result) < 3:
             return {'groups': []}
         groups = result[2:-2]
@@ -34,6 +37,7 @@ class Groups(TelnetConnection):
             ]
         }
 
+    @changes_config
     def create(self, data):
         """Create a group.
         One POST parameter required, the group identifier (a string)
@@ -86,6 +90,7 @@ class Groups(TelnetConnection):
             logger.error("ActionFailed: {}".format(ActionFailed(self.telnet.match.group(1))))
             #raise ActionFailed(self.telnet.match.group(1))
 
+    @changes_config
     def destroy(self, gid):
         """Delete a group. One parameter required, the group identifier (a string)
 
@@ -97,6 +102,7 @@ class Groups(TelnetConnection):
         """
         return self.simple_group_action('r', gid)
 
+    @changes_config
     def enable(self, gid):
         """Enable a group. One parameter required, the group identifier (a string)
 
@@ -109,6 +115,7 @@ class Groups(TelnetConnection):
         return self.simple_group_action('e', gid)
 
 
+    @changes_config
     def disable(self, gid):
         """Disable a group.
 
@@ -1,10 +1,11 @@
 from django.conf import settings
 
-from main.core.tools import set_ikeys, split_cols
+from main.core.tools import listing_lines, set_ikeys, split_cols
 from main.core.exceptions import (
     JasminSyntaxError, JasminError, ActionFailed,
     ObjectNotFoundError, UnknownError, 
 )
+from .cache import cached_listing, changes_config
 from .conn import TelnetConnection
 
 import logging
@@ -32,18 +33,24 @@ class HTTPCCM(TelnetConnection):
                 return
             else:
                 raise ObjectNotFoundError('Unknown connector: %s' % cid)
-        result = self.telnet.match.group(1)
+        return self.parse_httpccm(self.telnet.match.group(1))
+
+    @staticmethod
+    def parse_httpccm(result):
+        "Parse the output of httpccm -s, from the command echo to the prompt"
+        if b'Unknown connector:' in result or b'Usage:' in result:
+            return
         httpccm = {}
         for line in result.splitlines():
             d = [x for x in line.split() if x]
             if len(d) == 2:
-                httpccm[d[0]] = d[1]
+                httpccm[str(d[0], 'utf-8')] = str(d[1], 'utf-8')
         return httpccm
 
     def get_connector_list(self):
         self.telnet.sendline('httpccm -l')
         self.telnet.expect([r'(.+)\n' + STANDARD_PROMPT])
-        result = str(self.telnet.match.group(0)).strip().replace("\\r", '').split("\\n")
+        result = listing_lines(self.telnet.match.group(0))
         if len(result) < 3:
             return []
         return split_cols(result[2:-2])
@@ -63,6 +70,7 @@ class HTTPCCM(TelnetConnection):
         else:
             raise ActionFailed(self.telnet.match.group(1))
 
+    @cached_listing('httpccms')
     def list(self):
         """List HTTP Client Connectors. No parameters
         Differs from slightly from telent CLI names and values:
@@ -70,19 +78,23 @@ class HTTPCCM(TelnetConnection):
         1. the "service" column is called "status"
         2. the cid is the full connector id of the form https(cid)
         """
-        connector_list = self.get_connector_list()
+        connector_list = [raw_data for raw_data in self.get_connector_list() if raw_data and raw_data[0][0] == '#']
+        # One write and one read for all of the connectors, instead of a round trip each
+        outputs = self.telnet.pipeline(['httpccm -s %s' % raw_data[0][1:] for raw_data in connector_list])
         connectors = []
-        for raw_data in connector_list:
-            if raw_data[0][0] == '#':
-                cid = raw_data[0][1:]
-                connector = self.get_httpccm(cid, True)
-                connector.update(
-                    cid=cid,
-                    type=raw_data[1],
-                    method=raw_data[2],
-                    url=raw_data[3]
-                )
-                connectors.append(connector)
+        for raw_data, output in zip(connector_list, outputs):
+            cid = raw_data[0][1:]
+            connector = self.parse_httpccm(output)
+            if connector is None:
+                # Removed since listed
+                continue
+            connector.update(
+                cid=cid,
+                type=raw_data[1],
+                method=raw_data[2],
+                url=raw_data[3]
+            )
+            connectors.append(connector)
         return {'connectors': connectors}
 
     def retrieve(self, cid):
@@ -105,6 +117,7 @@ class HTTPCCM(TelnetConnection):
                 )
         return {'connector': connector}
 
+    @changes_config
     def create(self, data):
         """Create an HTTP Client Connector.
         Required parameter: cid (connector id)
@@ -146,6 +159,7 @@ class HTTPCCM(TelnetConnection):
         self.telnet.expect(r'.*' + STANDARD_PROMPT)
         return {'cid': data['cid']}
 
+    @changes_config
     def destroy(self, cid):
         """Delete an http connector.
         One parameter required, the connector identifier
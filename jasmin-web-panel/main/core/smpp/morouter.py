@@ -11,8 +11,9 @@ from main.core.exceptions import (
     MultipleValuesRequiredKeyError, ObjectNotFoundError,
 )
 from main.core.utils import is_int
-from main.core.tools import set_ikeys, split_cols
+from main.core.tools import listing_lines, set_ikeys, split_cols
 
+from .cache import cached_listing, changes_config
 from .conn import TelnetConnection
 
 STANDARD_PROMPT = settings.STANDARD_PROMPT
@@ -33,11 +34,12 @@ class MORouter(TelnetConnection):
         ('FailoverMORoute', 'Failover MO Route'),
     )
 
+    @cached_listing('morouters')
     def _list(self) -> List[dict]:
         """List MO router as python dict"""
         self.telnet.sendline('morouter -l')
         self.telnet.expect([r'(.+)\n' + STANDARD_PROMPT])
-        result = str(self.telnet.match.group(0)).strip().replace("\\r", '').split("\\n")
+        result = listing_lines(self.telnet.match.group(0))
         if len(result) < 3:
             return []
         results = [s.replace(', ', ',').replace('(!)', '') for s in result[2:-2] if s]
@@ -72,6 +74,7 @@ class MORouter(TelnetConnection):
         """Details for one MORouter by order (integer)"""
         return self.get_router(order)
 
+    @changes_config
     def flush(self):
         """Flush entire routing table"""
         self.telnet.sendline('morouter -f')
@@ -80,6 +83,7 @@ class MORouter(TelnetConnection):
         self.telnet.expect(r'.*' + STANDARD_PROMPT)
         return {'morouters': []}
 
+    @changes_config
     def create(self, data):
         """Add a new MORouter"""
         route_type = data.get('type') or "DefaultRoute"
@@ -124,6 +128,7 @@ class MORouter(TelnetConnection):
         set_ikeys(self.telnet, ikeys)
         self.telnet.sendline('persist')
         self.telnet.expect(r'.*' + STANDARD_PROMPT)
+        self.config_changed()
         return {'morouter': self.get_router(order)}
 
     def simple_morouter_action(self, action, order, return_moroute=True):
@@ -137,6 +142,7 @@ class MORouter(TelnetConnection):
             self.telnet.sendline('persist')
             if return_moroute:
                 self.telnet.expect(r'.*' + STANDARD_PROMPT)
+                self.config_changed()
                 return {'morouter': self.get_router(order)}
             else:
                 return {'order': order}
@@ -145,6 +151,7 @@ class MORouter(TelnetConnection):
         else:
             raise JasminError(self.telnet.match.group(1))
 
+    @changes_config
     def destroy(self, order):
         """Delete a morouter. One parameter required, the router identifier (a string)
 
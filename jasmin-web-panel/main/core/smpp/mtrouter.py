@@ -11,7 +11,8 @@ from main.core.exceptions import (
     MultipleValuesRequiredKeyError, ObjectNotFoundError
 )
 from main.core.utils import is_float, is_int
-from main.core.tools import set_ikeys, split_cols
+from main.core.tools import listing_lines, set_ikeys, split_cols
+from .cache import cached_listing, changes_config
 from .conn import TelnetConnection
 
 STANDARD_PROMPT = settings.STANDARD_PROMPT
@@ -32,11 +33,12 @@ class MTRouter(TelnetConnection):
         ('FailoverMTRoute', 'Failover MT Route'),
     )
 
+    @cached_listing('mtrouters')
     def _list(self) -> List[dict]:
         """List MT router as python dict"""
         self.telnet.sendline('mtrouter -l')
         self.telnet.expect([r'(.+)\n' + STANDARD_PROMPT])
-        result = str(self.telnet.match.group(0)).strip().replace("\\r", '').split("\\n")
+        result = listing_lines(self.telnet.match.group(0))
         if len(result) < 3:
             return []
         results = [s.replace(', ', ',').replace('(!)', '') for s in result[2:-2] if s]
@@ -71,6 +73,7 @@ class MTRouter(TelnetConnection):
         """Details for one MTRouter by order (integer)"""
         return self.get_router(order)
 
+    @changes_config
     def flush(self):
         """Flush entire routing table"""
         self.telnet.sendline('mtrouter -f')
@@ -79,6 +82,7 @@ class MTRouter(TelnetConnection):
         self.telnet.expect(r'.*' + STANDARD_PROMPT)
         return {'mtrouters': []}
 
+    @changes_config
     def create(self, data):
         """Add a new MTRouter"""
         route_type = data.get('type') or "DefaultRoute"
@@ -88,6 +92,8 @@ class MTRouter(TelnetConnection):
         """ MT Router only support SMPP connectors, HTTP not allowed """
         smppconnectors = data.get('smppconnectors') or ""
         
+        # Checked on the cached routing table, only the one read back once
+        # the route is added comes from jcli
         if self.router_exists(order):
             raise MultipleValuesRequiredKeyError('Order %s already exists' % order)
 
@@ -123,6 +129,7 @@ class MTRouter(TelnetConnection):
         set_ikeys(self.telnet, ikeys)
         self.telnet.sendline('persist')
         self.telnet.expect(r'.*' + STANDARD_PROMPT)
+        self.config_changed()
         return {'mtrouter': self.get_router(order)}
 
     def simple_mtrouter_action(self, action, order, return_mtroute=True):
@@ -136,6 +143,7 @@ class MTRouter(TelnetConnection):
             self.telnet.sendline('persist')
             if return_mtroute:
                 self.telnet.expect(r'.*' + STANDARD_PROMPT)
+                self.config_changed()
                 return {'mtrouter': self.get_router(order)}
             else:
                 return {'order': order}
@@ -144,6 +152,7 @@ class MTRouter(TelnetConnection):
         else:
             raise JasminError(self.telnet.match.group(1))
 
+    @changes_config
     def destroy(self, order):
         """Delete a mtrouter. One parameter required, the router identifier (a string)
 
@@ -1,10 +1,11 @@
 from django.conf import settings
 
-from main.core.tools import set_ikeys, split_cols
+from main.core.tools import listing_lines, set_ikeys, split_cols
 from main.core.exceptions import (
     JasminSyntaxError, JasminError, ActionFailed,
     ObjectNotFoundError, UnknownError, 
 )
+from .cache import cached_listing, changes_config
 from .conn import TelnetConnection
 
 import logging
@@ -31,7 +32,13 @@ class SMPPCCM(TelnetConnection):
                 return
             else:
                 raise ObjectNotFoundError('Unknown connector: %s' % cid)
-        result = self.telnet.match.group(1)
+        return self.parse_smppccm(self.telnet.match.group(1))
+
+    @staticmethod
+    def parse_smppccm(result):
+        "Parse the output of smppccm -s, from the command echo to the prompt"
+        if b'Unknown connector:' in result or b'Usage:' in result:
+            return
         smppccm = {}
         for line in result.splitlines():
             d = [x for x in line.split() if x]
@@ -43,7 +50,7 @@ class SMPPCCM(TelnetConnection):
         self.telnet.sendline('smppccm -l')
         self.telnet.expect([r'(.+)\n' + STANDARD_PROMPT])
         #print(self.telnet.match.group(0))
-        result = str(self.telnet.match.group(0)).strip().replace("\\r", '').split("\\n")
+        result = listing_lines(self.telnet.match.group(0))
         #print(result)
         if len(result) < 3:
             return []
@@ -67,6 +74,7 @@ class SMPPCCM(TelnetConnection):
             #raise ActionFailed(self.telnet.match.group(1))
         return {}
 
+    @cached_listing('smppccms')
     def list(self):
         """List SMPP Client Connectors. No parameters
         Differs from slightly from telent CLI names and values:
@@ -74,20 +82,24 @@ class SMPPCCM(TelnetConnection):
         1. the "service" column is called "status"
         2. the cid is the full connector id of the form smpps(cid)
         """
-        connector_list = self.get_connector_list()
+        connector_list = [raw_data for raw_data in self.get_connector_list() if raw_data and raw_data[0][0] == '#']
+        # One write and one read for all of the connectors, instead of a round trip each
+        outputs = self.telnet.pipeline(['smppccm -s %s' % raw_data[0][1:] for raw_data in connector_list])
         connectors = []
-        for raw_data in connector_list:
-            if raw_data[0][0] == '#':
-                cid = raw_data[0][1:]
-                connector = self.get_smppccm(cid, True)
-                connector.update(
-                    cid=cid,
-                    status=raw_data[1],
-                    session=raw_data[2],
-                    starts=raw_data[3],
-                    stops=raw_data[4]
-                )
-                connectors.append(connector)
+        for raw_data, output in zip(connector_list, outputs):
+            cid = raw_data[0][1:]
+            connector = self.parse_smppccm(output)
+            if connector is None:
+                # Removed since listed
+                continue
+            connector.update(
+                cid=cid,
+                status=raw_data[1],
+                session=raw_data[2],
+                starts=raw_data[3],
+                stops=raw_data[4]
+            )
+            connectors.append(connector)
         return {'connectors': connectors}
 
     def retrieve(self, cid):
@@ -109,6 +121,7 @@ class SMPPCCM(TelnetConnection):
         )
         return {'connector': connector}
 
+    @changes_config
     def create(self, data):
         """Create an SMPP Client Connector.
         Required parameter: cid (connector id)
@@ -142,6 +155,7 @@ class SMPPCCM(TelnetConnection):
         self.telnet.expect(r'.*' + STANDARD_PROMPT)
         return {'cid': data['cid']}
 
+    @changes_config
     def destroy(self, cid):
         """Delete an smpp connector.
         One parameter required, the connector identifier
@@ -154,6 +168,7 @@ class SMPPCCM(TelnetConnection):
         """
         return self.simple_smppccm_action('r', cid)
 
+    @changes_config
     def partial_update(self, data, cid):
         """Update some SMPP connector attributes
 
@@ -207,6 +222,7 @@ class SMPPCCM(TelnetConnection):
 
         return {'connector': self.get_smppccm(cid, silent=False)}
 
+    @changes_config
     def start(self, cid):
         """Start SMPP Connector
 
@@ -220,6 +236,7 @@ class SMPPCCM(TelnetConnection):
         """
         return self.simple_smppccm_action('1', cid)
 
+    @changes_config
     def stop(self, cid):
         """Stop SMPP Connector
 
@@ -4,6 +4,7 @@ from main.core.tools import set_ikeys
 from main.core.exceptions import (JasminSyntaxError, JasminError,
                         UnknownError, MissingKeyError,
                         ObjectNotFoundError)
+from .cache import cached_listing, changes_config
 from .conn import TelnetConnection
 
 import logging
@@ -31,7 +32,13 @@ class Users(TelnetConnection):
                 return
             else:
                 raise ObjectNotFoundError('Unknown user: %s' % uid)
-        result = self.telnet.match.group(1)
+        return self.parse_user(self.telnet.match.group(1))
+
+    @staticmethod
+    def parse_user(result):
+        "Parse the output of user -s, from the command echo to the prompt"
+        if b'Unknown User:' in result or b'Usage: user' in result:
+            return
         user = {}
         for line in [l for l in result.splitlines() if l][1:]:
             d = [str(x, 'utf-8') for x in line.split() if x]
@@ -53,6 +60,7 @@ class Users(TelnetConnection):
         "Retrieve data for one user"
         return {'user': self.get_user(uid)}
 
+    @cached_listing('users')
     def list(self):
         "List users. No parameters"
         self.telnet.sendline('user -l')
@@ -63,20 +71,19 @@ class Users(TelnetConnection):
 
         results = [l for l in result.splitlines() if l]
         annotated_uids = [str(u.split(None, 1)[0][1:], 'utf-8') for u in results[2:-2]]
+        # One write and one read for all of the users, instead of a round trip each
+        outputs = self.telnet.pipeline(['user -s %s' % auid.lstrip('!') for auid in annotated_uids])
         users = []
-        for auid in annotated_uids:
-            if auid[0] == '!':
-                udata = self.get_user(auid[1:], True)
-                udata['status'] = 'disabled'
-            else:
-                udata = self.get_user(auid, True)
-                udata['status'] = 'enabled'
+        for auid, output in zip(annotated_uids, outputs):
+            udata = self.parse_user(output)
+            if udata is None:
+                # Removed since listed
+                continue
+            udata['status'] = 'disabled' if auid[0] == '!' else 'enabled'
             users.append(udata)
-        return {
-                #return users skipping None (== nonexistent user)
-                'users': [u for u in users if u]
-            }
+        return {'users': users}
 
+    @changes_config
     def create(self, data):
         """Create a User.
         Required parameters: username, password, uid (user identifier), gid (group identifier),
@@ -123,6 +130,7 @@ class Users(TelnetConnection):
         self.telnet.expect(r'.*' + STANDARD_PROMPT)
         return {'user': self.get_user(uid)}
 
+    @changes_config
     def partial_update(self, data, uid):
         """Update some user attributes
 
@@ -200,6 +208,7 @@ class Users(TelnetConnection):
         else:
             raise JasminError(self.telnet.match.group(1))
 
+    @changes_config
     def destroy(self, uid):
         """Delete a user. One parameter required, the user identifier (a string)
 
@@ -211,6 +220,7 @@ class Users(TelnetConnection):
         """
         return self.simple_user_action('r', uid, return_user=False)
 
+    @changes_config
     def enable(self, uid):
         """Enable a user. One parameter required, the user identifier (a string)
 
@@ -222,6 +232,7 @@ class Users(TelnetConnection):
         """
         return self.simple_user_action('e', uid)
 
+    @changes_config
     def disable(self, uid):
         """Disable a user.
 
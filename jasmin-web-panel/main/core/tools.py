@@ -35,6 +35,11 @@ def set_ikeys(telnet, keys2vals):
         raise JasminSyntaxError(" ".join(telnet.match.group(1).split()))
 
 
+def listing_lines(output):
+    "lines of a jcli listing read from the session, the command echo first and the prompt last"
+    return output.decode('utf-8', 'replace').replace('\r', '').split('\n')
+
+
 def split_cols(lines):
     "split columns into lists, skipping blank and non-data lines"
     parsed = []
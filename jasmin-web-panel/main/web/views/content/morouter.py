@@ -19,27 +19,27 @@ def morouter_view(request):
 def morouter_view_manage(request):
     response = {}
     s = request.POST.get("s")
-    morouter = MORouter()
+    with MORouter() as morouter:
 
-    if s == "list":
-        response = morouter.list()
-    elif s == "add":
-        try:
-            data = dict(
-                type=request.POST.get("type"),
-                order=request.POST.get("order"),
-                smppconnectors=request.POST.get("smppconnectors") or "",
-                httpconnectors=request.POST.get("httpconnectors") or "",
-                filters=request.POST.get("filters") or "",
-            )
-            morouter.create(data=data)
-            response["message"] = str(_("MO Router added successfully!"))
-        except Exception as e:
-            return JsonResponse({"message": str(e), "status": 400}, status=400)
-    elif s == "delete":
-        response = morouter.destroy(order=request.POST.get("order"))
-        response["message"] = str(_("MO Router deleted successfully!"))
-    else:
-        return JsonResponse({"message": str(_("Sorry, Command does not matched.")), "status": 400}, status=400)
-    response["status"] = 200
-    return JsonResponse(response)
+        if s == "list":
+            response = morouter.list()
+        elif s == "add":
+            try:
+                data = dict(
+                    type=request.POST.get("type"),
+                    order=request.POST.get("order"),
+                    smppconnectors=request.POST.get("smppconnectors") or "",
+                    httpconnectors=request.POST.get("httpconnectors") or "",
+                    filters=request.POST.get("filters") or "",
+                )
+                morouter.create(data=data)
+                response["message"] = str(_("MO Router added successfully!"))
+            except Exception as e:
+                return JsonResponse({"message": str(e), "status": 400}, status=400)
+        elif s == "delete":
+            response = morouter.destroy(order=request.POST.get("order"))
+            response["message"] = str(_("MO Router deleted successfully!"))
+        else:
+            return JsonResponse({"message": str(_("Sorry, Command does not matched.")), "status": 400}, status=400)
+        response["status"] = 200
+        return JsonResponse(response)
@@ -19,25 +19,25 @@ def mtrouter_view(request):
 def mtrouter_view_manage(request):
     response = {}
     s = request.POST.get("s")
-    mtrouter = MTRouter()
-    if s == "list":
-        response = mtrouter.list()
-    elif s == "add":
-        try:
-            mtrouter.create(data=dict(
-                type=request.POST.get("type"),
-                order=request.POST.get("order"),
-                rate=request.POST.get("rate"),
-                smppconnectors=request.POST.get("smppconnectors"),
-                filters=request.POST.get("filters"),
-            ))
-            response["message"] = str(_("MT Router added successfully!"))
-        except Exception as e:
-            return JsonResponse({"message": str(e), "status": 400}, status=400)
-    elif s == "delete":
-        response = mtrouter.destroy(order=request.POST.get("order"))
-        response["message"] = str(_("MT Router deleted successfully!"))
-    else:
-        return JsonResponse({"message": str(_("Sorry, Command does not matched.")), "status": 400}, status=400)
-    response["status"] = 200
-    return JsonResponse(response)
+    with MTRouter() as mtrouter:
+        if s == "list":
+            response = mtrouter.list()
+        elif s == "add":
+            try:
+                mtrouter.create(data=dict(
+                    type=request.POST.get("type"),
+                    order=request.POST.get("order"),
+                    rate=request.POST.get("rate"),
+                    smppconnectors=request.POST.get("smppconnectors"),
+                    filters=request.POST.get("filters"),
+                ))
+                response["message"] = str(_("MT Router added successfully!"))
+            except Exception as e:
+                return JsonResponse({"message": str(e), "status": 400}, status=400)
+        elif s == "delete":
+            response = mtrouter.destroy(order=request.POST.get("order"))
+            response["message"] = str(_("MT Router deleted successfully!"))
+        else:
+            return JsonResponse({"message": str(_("Sorry, Command does not matched.")), "status": 400}, status=400)
+        response["status"] = 200
+        return JsonResponse(response)
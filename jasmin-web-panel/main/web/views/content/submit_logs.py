@@ -1,27 +1,83 @@
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
 from django.shortcuts import render
 from django.http import JsonResponse
-from django.db.models import Count, Case, When, IntegerField
+from django.db.models import Count, Case, When, IntegerField, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from django.utils.dateparse import parse_date
 
-from main.core.models import SubmitLog
+from main.core.models import SubmitLog, SubmitLogBody, SubmitLogRollup
 from main.core.utils import paginate
 from main.core.tools import require_post_ajax
 
 
+def get_report_dates(request):
+    """Report window from the date_from/date_to GET parameters, the last SUBMIT_LOG_REPORT_DAYS by default"""
+    try:
+        date_to = parse_date(request.GET.get("date_to") or "")
+    except ValueError:
+        date_to = None
+    date_to = date_to or timezone.localdate()
+    try:
+        date_from = parse_date(request.GET.get("date_from") or "")
+    except ValueError:
+        date_from = None
+    date_from = date_from or date_to - timedelta(days=settings.SUBMIT_LOG_REPORT_DAYS - 1)
+    return date_from, date_to
+
+
+def day_start(day):
+    "Aware datetime of the start of a day in the current time zone"
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def attach_bodies(records):
+    """Attach their interned body to the records referencing one, fetched in a single query"""
+    hashes = {record.body_hash for record in records if record.body_hash}
+    if not hashes:
+        return
+    bodies = SubmitLogBody.objects.in_bulk(list(hashes))
+    for record in records:
+        record.body = bodies.get(record.body_hash)
+
+
 @login_required
 def submit_logs_view(request):
-    stats = SubmitLog.objects.aggregate(
-        total_count=Count('id'),
-        success_count=Count(Case(When(status="success", then=1), output_field=IntegerField())),
-        fail_count=Count(Case(When(status="fail", then=1), output_field=IntegerField())),
-        unknown_count=Count(Case(When(status="unknown", then=1), output_field=IntegerField())),
-    )
-    submit_logs = SubmitLog.objects.order_by("-created_at")
+    date_from, date_to = get_report_dates(request)
+    window_start, window_end = day_start(date_from), day_start(date_to + timedelta(days=1))
+    # A created_at range only scans the submit_log partitions of the window
+    submit_logs = SubmitLog.objects.filter(created_at__gte=window_start, created_at__lt=window_end)
+    if settings.SUBMIT_LOG_ROLLUPS:
+        # Hourly counters maintained by sms_logger, the window is made of whole hours
+        rollups = SubmitLogRollup.objects.filter(bucket__gte=window_start, bucket__lt=window_end)
+        stats = rollups.aggregate(
+            total_count=Coalesce(Sum('messages'), 0),
+            success_count=Coalesce(Sum(Case(When(status="success", then='messages'), output_field=IntegerField())), 0),
+            fail_count=Coalesce(Sum(Case(When(status="fail", then='messages'), output_field=IntegerField())), 0),
+            unknown_count=Coalesce(Sum(Case(When(status="unknown", then='messages'), output_field=IntegerField())), 0),
+        )
+    else:
+        stats = submit_logs.aggregate(
+            total_count=Count('id'),
+            success_count=Count(Case(When(status="success", then=1), output_field=IntegerField())),
+            fail_count=Count(Case(When(status="fail", then=1), output_field=IntegerField())),
+            unknown_count=Count(Case(When(status="unknown", then=1), output_field=IntegerField())),
+        )
+    submit_logs = submit_logs.order_by("-created_at")
 
     submit_logs = paginate(submit_logs, per_page=25, page=request.GET.get("page"))
+    # Evaluated once, so that the template renders the records the bodies are attached to
+    submit_logs.object_list = list(submit_logs.object_list)
+    attach_bodies(submit_logs.object_list)
     return render(request, "web/content/submit_logs.html", context={
         "submit_logs": submit_logs,
         "stats": stats,
+        "date_from": date_from,
+        "date_to": date_to,
+        "page_query": "&date_from={}&date_to={}".format(date_from.isoformat(), date_to.isoformat()),
     })
 
 
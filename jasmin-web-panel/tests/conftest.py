@@ -0,0 +1,22 @@
+import os
+import sys
+
+import django
+from django.conf import settings
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# sms_logger's modules import each other as top level modules
+sys.path.insert(0, os.path.join(os.path.dirname(TESTS_DIR), 'config', 'docker', 'sms_logger'))
+
+if not settings.configured:
+    # Only what main.core needs, so that the tests don't depend on .env
+    settings.configure(
+        USE_I18N=False,
+        USE_TZ=True,
+        INSTALLED_APPS=['django.contrib.contenttypes', 'django.contrib.auth', 'django.contrib.sites', 'rest_framework'],
+        SITE_ID=1,
+        STANDARD_PROMPT='jcli : ',
+        INTERACTIVE_PROMPT='> ',
+    )
+    django.setup()
@@ -0,0 +1,126 @@
+import pytest
+import redis
+
+from main.core.smpp import cache
+from main.core.smpp.cache import ConfigCache
+
+
+class FakeRedis(object):
+    "The get, set and incr of a redis client, over a dict, failing while down"
+
+    def __init__(self):
+        self.data = {}
+        self.down = False
+
+    def _check(self):
+        if self.down:
+            raise redis.ConnectionError('Connection refused')
+
+    def get(self, key):
+        self._check()
+        return self.data.get(key)
+
+    def set(self, key, value, ex=None):
+        self._check()
+        self.data[key] = value
+
+    def incr(self, key):
+        self._check()
+        self.data[key] = b'%d' % (int(self.data.get(key, 0)) + 1)
+
+
+class Clock(object):
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class Loader(object):
+    def __init__(self, value):
+        self.value = value
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return self.value
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache.time, 'time', clock)
+    return clock
+
+
+def test_listings_are_loaded_once(clock):
+    config_cache = ConfigCache(FakeRedis(), ttl=300)
+    load = Loader([{'uid': 'u1'}])
+
+    assert config_cache.get('users', load) == [{'uid': 'u1'}]
+    listing = config_cache.get('users', load)
+    assert listing == [{'uid': 'u1'}]
+    assert load.calls == 1
+    assert config_cache.stats() == {'hits': 1, 'misses': 1, 'lru_size': 1}
+
+    # Callers get their own copy
+    listing.append({'uid': 'u2'})
+    assert config_cache.get('users', load) == [{'uid': 'u1'}]
+
+
+def test_bump_invalidates_every_process(clock):
+    client = FakeRedis()
+    config_cache = ConfigCache(client, ttl=300)
+    other_process = ConfigCache(client, ttl=300)
+    load = Loader(['g1'])
+    config_cache.get('groups', load)
+    # Read from Redis, not loaded again
+    assert other_process.get('groups', load) == ['g1']
+    assert load.calls == 1
+
+    other_process.bump()
+    load.value = ['g1', 'g2']
+
+    assert config_cache.version() == 1
+    assert config_cache.get('groups', load) == ['g1', 'g2']
+    assert other_process.get('groups', load) == ['g1', 'g2']
+    assert load.calls == 2
+
+
+def test_listings_expire(clock):
+    config_cache = ConfigCache(FakeRedis(), ttl=300)
+    load = Loader(['f1'])
+    config_cache.get('filters', load)
+
+    clock.now += 299
+    config_cache.get('filters', load)
+    assert load.calls == 1
+
+    clock.now += 2
+    config_cache.get('filters', load)
+    assert load.calls == 2
+
+
+def test_redis_errors_bypass_the_cache(clock):
+    client = FakeRedis()
+    config_cache = ConfigCache(client, ttl=300)
+    load = Loader(['r1'])
+    config_cache.get('routers', load)
+
+    client.down = True
+    assert config_cache.version() is None
+    assert config_cache.get('routers', load) == ['r1']
+    assert load.calls == 2
+    # Bumps are lost, the listings of this process are dropped all the same
+    config_cache.bump()
+    assert config_cache.stats()['lru_size'] == 0
+
+
+def test_disabled_cache_always_loads():
+    config_cache = ConfigCache(FakeRedis(), ttl=0)
+    load = Loader([])
+    config_cache.get('users', load)
+    config_cache.get('users', load)
+
+    assert load.calls == 2
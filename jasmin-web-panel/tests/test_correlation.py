@@ -0,0 +1,147 @@
+import correlation
+from correlation import CorrelationEntry, CorrelationJournal, CorrelationStore
+
+
+def entry(destination_addr='33600000001'):
+    return CorrelationEntry('httpapi', 'smppc1', destination_addr, 'JASMIN', 1, b'hello', uid=7,
+                            created_at='2024-05-01 10:42:17')
+
+
+class Clock(object):
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def test_entries_expire_after_the_ttl(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(correlation, 'time', clock)
+    store = CorrelationStore(ttl=60)
+    store.put('a', entry())
+    clock.now += 30
+    store.put('b', entry())
+
+    clock.now += 40
+    assert 'a' not in store
+    assert store.get('b') is not None
+    assert store.expired == 1
+
+    clock.now += 30
+    store.expire()
+    assert len(store) == 0
+    assert store.expired == 2
+
+
+def test_put_renews_the_ttl(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(correlation, 'time', clock)
+    store = CorrelationStore(ttl=60)
+    store.put('a', entry())
+    store.put('b', entry())
+    clock.now += 50
+    store.put('a', store.get('a'))
+
+    clock.now += 20
+    store.expire()
+    assert 'a' in store
+    assert 'b' not in store
+
+
+def test_oldest_entries_are_evicted():
+    store = CorrelationStore(max_size=2)
+    for msgid in ('a', 'b', 'c'):
+        store.put(msgid, entry())
+
+    assert 'a' not in store
+    assert 'b' in store and 'c' in store
+    assert store.evicted == 1
+
+
+def test_journal_replays_puts_and_removals(tmp_path):
+    path = str(tmp_path / 'correlation')
+    store = CorrelationStore(journal=CorrelationJournal(path))
+    store.restore()
+    store.put('a', entry('33600000001'))
+    store.put('b', entry('33600000002'))
+    store.put('a', entry('33600000003'))
+    store.remove('b')
+    store.sync()
+    store.journal.close()
+
+    restored = CorrelationStore(journal=CorrelationJournal(path))
+    restored.restore()
+
+    assert restored.restored == 1
+    assert 'b' not in restored
+    restored_entry = restored.get('a')
+    assert restored_entry.destination_addr == '33600000003'
+    assert restored_entry.created_at == '2024-05-01 10:42:17'
+    restored.journal.close()
+
+
+def test_journal_skips_expired_entries(tmp_path, monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(correlation, 'time', clock)
+    path = str(tmp_path / 'correlation')
+    store = CorrelationStore(ttl=60, journal=CorrelationJournal(path))
+    store.restore()
+    store.put('a', entry())
+    store.journal.close()
+
+    clock.now += 61
+    restored = CorrelationStore(ttl=60, journal=CorrelationJournal(path))
+    restored.restore()
+
+    assert len(restored) == 0
+    assert restored.expired == 1
+    restored.journal.close()
+
+
+def test_journal_torn_record_is_cut_off(tmp_path):
+    path = str(tmp_path / 'correlation')
+    journal = CorrelationJournal(path)
+    list(journal.load())
+    journal.append('a', entry())
+    journal.close()
+    with open(path, 'ab') as f:
+        f.write(b'\xff\x00\x00\x00torn')
+
+    journal = CorrelationJournal(path)
+    assert [msgid for msgid, _ in journal.load()] == ['a']
+    journal.append('b', entry())
+    journal.close()
+
+    journal = CorrelationJournal(path)
+    assert [msgid for msgid, _ in journal.load()] == ['a', 'b']
+    journal.close()
+
+
+def test_journal_is_compacted_to_the_live_entries(tmp_path):
+    path = str(tmp_path / 'correlation')
+    store = CorrelationStore(journal=CorrelationJournal(path))
+    store.restore()
+    for i in range(10005):
+        store.put(str(i), entry())
+        store.remove(str(i))
+    store.put('live', entry())
+    store.compact()
+
+    assert store.journal.records == 1
+    store.journal.close()
+    journal = CorrelationJournal(path)
+    assert [msgid for msgid, _ in journal.load()] == ['live']
+    journal.close()
+
+
+def test_entries_of_older_journals_load():
+    # Pickled before submitted_at and created_at were added
+    state = ('httpapi', 'smppc1', 0, 0, 7, '33600000001', 'JASMIN', 1, b'hello', False, 2000.0)
+    restored = CorrelationEntry.__new__(CorrelationEntry)
+    restored.__setstate__(state)
+
+    assert restored.destination_addr == '33600000001'
+    assert restored.expires_at == 2000.0
+    assert restored.submitted_at is None
+    assert restored.created_at is None
@@ -0,0 +1,71 @@
+import os
+
+from dedup import RedeliveryFilter, dedup_key
+
+
+def test_added_keys_are_seen():
+    dedup = RedeliveryFilter(capacity=100, lru_size=10)
+    dedup.add([dedup_key('submit.sm.resp', 'a'), dedup_key('dlr_thrower', 'a', 'DELIVRD')])
+
+    assert dedup.seen(dedup_key('submit.sm.resp', 'a')) == 'lru'
+    assert dedup.seen(dedup_key('dlr_thrower', 'a', 'DELIVRD')) == 'lru'
+    # Another status of the same message is another delivery
+    assert dedup.seen(dedup_key('dlr_thrower', 'a', 'UNDELIV')) is None
+    assert dedup.seen(dedup_key('submit.sm.resp', 'b')) is None
+
+
+def test_keys_evicted_from_the_lru_stay_in_the_bloom_filter():
+    dedup = RedeliveryFilter(capacity=100, lru_size=2)
+    dedup.add([dedup_key('submit.sm.resp', str(i)) for i in range(5)])
+
+    assert dedup.seen(dedup_key('submit.sm.resp', '4')) == 'lru'
+    assert dedup.seen(dedup_key('submit.sm.resp', '0')) == 'bloom'
+
+
+def test_generations_rotate_out():
+    dedup = RedeliveryFilter(capacity=10, lru_size=1)
+    dedup.add([dedup_key('submit.sm.resp', 'first')])
+    # Fills the first generation, then a whole second one
+    dedup.add([dedup_key('submit.sm.resp', str(i)) for i in range(9)])
+    dedup.add([dedup_key('submit.sm.resp', 'second-%s' % i) for i in range(10)])
+    assert dedup.generation == 1
+    assert dedup.seen(dedup_key('submit.sm.resp', 'first')) == 'bloom'
+
+    dedup.add([dedup_key('submit.sm.resp', 'third')])
+    assert dedup.generation == 2
+    assert dedup.seen(dedup_key('submit.sm.resp', 'first')) is None
+
+
+def test_journal_restores_the_committed_keys(tmp_path):
+    journal = str(tmp_path / 'dedup')
+    dedup = RedeliveryFilter(capacity=10, lru_size=5, journal=journal)
+    dedup.restore()
+    dedup.add([dedup_key('submit.sm.resp', str(i)) for i in range(25)])
+    dedup.sync()
+    dedup.close()
+    # The oldest generation was removed once it rotated out
+    assert sorted(os.listdir(str(tmp_path))) == ['dedup.1', 'dedup.2']
+
+    restored = RedeliveryFilter(capacity=10, lru_size=5, journal=journal)
+    restored.restore()
+
+    assert restored.restored == 15
+    assert restored.generation == 2
+    assert restored.seen(dedup_key('submit.sm.resp', '24')) == 'lru'
+    assert restored.seen(dedup_key('submit.sm.resp', '10')) == 'bloom'
+    restored.close()
+
+
+def test_journal_torn_key_is_cut_off(tmp_path):
+    journal = str(tmp_path / 'dedup')
+    with open(journal + '.0', 'wb') as f:
+        f.write(dedup_key('submit.sm.resp', 'a') + b'\n' + b'a\tsubmit.sm')
+
+    dedup = RedeliveryFilter(capacity=10, journal=journal)
+    dedup.restore()
+    dedup.add([dedup_key('submit.sm.resp', 'b')])
+    dedup.close()
+
+    assert dedup.restored == 1
+    with open(journal + '.0', 'rb') as f:
+        assert f.read().splitlines() == [dedup_key('submit.sm.resp', 'a'), dedup_key('submit.sm.resp', 'b')]
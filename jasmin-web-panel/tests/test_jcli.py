@@ -0,0 +1,141 @@
+import os
+import socket
+import threading
+import time
+
+import pytest
+
+from main.core import jcli
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def test_ai_admin_copy_matches():
+    # ai-admin is deployed on its own and vendors the client
+    with open(jcli.__file__, 'rb') as f:
+        source = f.read()
+    with open(os.path.join(REPO_ROOT, 'ai-admin', 'server', 'jcli.py'), 'rb') as f:
+        assert f.read() == source, 'ai-admin/server/jcli.py differs from main/core/jcli.py, copy it over'
+
+
+class FakeJCli(object):
+    """A jcli server answering each line with its echo and output, then a
+    prompt, sent in small chunks so that prompts straddle them"""
+
+    def __init__(self, chunk_size=3, silent=()):
+        self.chunk_size = chunk_size
+        self.silent = silent
+        self.listener = socket.socket()
+        self.listener.bind(('127.0.0.1', 0))
+        self.listener.listen(1)
+        self.port = self.listener.getsockname()[1]
+        self.thread = threading.Thread(target=self._serve, daemon=True)
+        self.thread.start()
+
+    def _send(self, conn, data):
+        for i in range(0, len(data), self.chunk_size):
+            conn.sendall(data[i:i + self.chunk_size])
+            time.sleep(0.001)
+
+    def _serve(self):
+        conn, _ = self.listener.accept()
+        conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        # Asks to echo, as jcli does
+        self._send(conn, bytes((jcli.IAC, jcli.WILL, jcli.ECHO)) + b'jcli : ')
+        received = b''
+        with conn:
+            while True:
+                data = conn.recv(4096)
+                if not data:
+                    return
+                received += data
+                while b'\r\n' in received:
+                    line, received = received.split(b'\r\n', 1)
+                    if line.startswith(bytes((jcli.IAC,))):
+                        line = line[3:]
+                    if line == b'quit':
+                        return
+                    if line in self.silent:
+                        continue
+                    self._send(conn, line + b'\r\noutput of ' + line + b'\r\njcli : ')
+
+    def close(self):
+        self.listener.close()
+
+
+def client_of(buffer):
+    client = jcli.BaseJCliClient()
+    client.buffer += buffer
+    return client
+
+
+def test_take_outputs_splits_on_standard_prompts():
+    client = client_of(b'user -l\r\nusers\r\njcli : group -l\r\ngroups\r\njcli : filter')
+    outputs = []
+
+    assert client._take_outputs(outputs, 3)
+    assert outputs == [b'user -l\r\nusers\r\n', b'group -l\r\ngroups\r\n']
+    assert client.buffer == b'filter'
+    assert not client.at_prompt
+
+    # The rest of the prompt arrives in two chunks
+    client.buffer += b' -l\r\nfilters\r\njcli'
+    assert not client._take_outputs(outputs, 3)
+    client.buffer += b' : '
+    assert client._take_outputs(outputs, 3)
+    assert outputs[2] == b'filter -l\r\nfilters\r\n'
+    assert client.buffer == b''
+    assert client.at_prompt
+
+
+def test_take_outputs_stops_at_count():
+    client = client_of(b'one\r\njcli : two\r\njcli : ')
+    outputs = []
+
+    assert client._take_outputs(outputs, 1)
+    assert outputs == [b'one\r\n']
+    assert client.buffer == b'two\r\njcli : '
+    # Output of another command is left unread
+    assert not client.at_prompt
+
+
+def test_pipeline_demultiplexes_the_outputs():
+    server = FakeJCli()
+    client = jcli.JCliClient('127.0.0.1', server.port, timeout=5)
+    try:
+        client.expect_exact(jcli.STANDARD_PROMPT)
+        assert client.at_prompt
+
+        outputs = client.pipeline(['user -l', 'group -l', 'filter -l'])
+        assert outputs == [
+            b'user -l\r\noutput of user -l\r\n',
+            b'group -l\r\noutput of group -l\r\n',
+            b'filter -l\r\noutput of filter -l\r\n',
+        ]
+        assert client.at_prompt
+
+        client.sendline('smppccm -l')
+        assert not client.at_prompt
+        client.expect_exact('output of ')
+        assert client.before == b'smppccm -l\r\n'
+        assert not client.at_prompt
+        client.expect_exact(jcli.STANDARD_PROMPT)
+        assert client.before == b'smppccm -l\r\n'
+        assert client.at_prompt
+    finally:
+        client.sendline('quit')
+        client.close()
+        server.close()
+
+
+def test_pipeline_times_out_on_missing_outputs():
+    server = FakeJCli(silent=[b'hang'])
+    client = jcli.JCliClient('127.0.0.1', server.port, timeout=5)
+    try:
+        client.expect_exact(jcli.STANDARD_PROMPT)
+        with pytest.raises(jcli.JCliTimeout):
+            client.pipeline(['user -l', 'hang'], timeout=0.2)
+        assert not client.at_prompt
+    finally:
+        client.close()
+        server.close()
@@ -0,0 +1,58 @@
+"""Checks the mongo sink against a MongoDB server, MONGO_URI or a local
+mongod, skipped when none answers"""
+
+import os
+import uuid
+
+import pytest
+
+pymongo = pytest.importorskip('pymongo')
+
+from dialects import SUBMIT_LOG_COLUMNS  # noqa: E402
+from mongo_writer import MongoSubmitLogWriter  # noqa: E402
+
+MONGO_URI = os.getenv('MONGO_URI', 'mongodb://127.0.0.1:27017/jasmin_test')
+
+
+@pytest.fixture
+def writer():
+    client = pymongo.MongoClient(MONGO_URI, serverSelectionTimeoutMS=500)
+    try:
+        client.admin.command('ping')
+    except pymongo.errors.PyMongoError:
+        pytest.skip('No MongoDB server at %s' % MONGO_URI)
+    writer = MongoSubmitLogWriter(MONGO_URI, collection='submit_log_%s' % uuid.uuid4().hex)
+    yield writer
+    writer.db.drop_collection(writer.collection)
+    writer.client.close()
+    client.close()
+
+
+def submit_log_row(msgid):
+    values = dict.fromkeys(SUBMIT_LOG_COLUMNS)
+    values.update(msgid=msgid, source_addr='JASMIN', rate=0, pdu_count=1, charge=0.5,
+                  destination_addr='33600000001', short_message=b'hello', status='ESME_ROK', uid='7',
+                  created_at='2024-05-01 10:42:17', routed_cid='smppc1', source_connector='httpapi')
+    return tuple(values[column] for column in SUBMIT_LOG_COLUMNS)
+
+
+def test_trials_count_retries_but_not_redeliveries(writer):
+    writer.write([submit_log_row('a'), submit_log_row('b')], [])
+    # Jasmin's retry of a, and the redelivery of a batch holding b
+    writer.write([submit_log_row('a')], [])
+    writer.write([submit_log_row('b'), submit_log_row('c')], [], redelivered={'b', 'c'})
+
+    documents = {d['_id']: d for d in writer.db[writer.collection].find()}
+    assert {msgid: d['trials'] for msgid, d in documents.items()} == {'a': 2, 'b': 1, 'c': 1}
+    assert documents['a']['charge'] == 0.5
+    assert documents['a']['created_at'] == '2024-05-01 10:42:17'
+
+
+def test_status_updates(writer):
+    writer.write([submit_log_row('a')], [])
+    writer.write([], [('a', 'DELIVRD', '2024-05-01 10:42:20', '2024-05-01 10:42:17')])
+
+    document = writer.db[writer.collection].find_one({'_id': 'a'})
+    assert document['status'] == 'DELIVRD'
+    assert document['status_at'] == '2024-05-01 10:42:20'
+    assert document['trials'] == 1
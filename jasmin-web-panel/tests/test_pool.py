@@ -0,0 +1,139 @@
+import pytest
+
+from main.core.exceptions import TelnetConnectionTimeout
+from main.core.jcli import JCliEOF
+from main.core.smpp import conn
+from main.core.smpp.conn import TelnetPool
+
+
+class FakeSession(object):
+    "Stands for a logged in JCliClient, answers resyncs unless broken"
+
+    def __init__(self, name):
+        self.name = name
+        self.at_prompt = True
+        self.broken = False
+        self.lines = []
+        self.closed = False
+
+    def sendline(self, s=''):
+        if self.broken:
+            raise JCliEOF('Connection closed by jcli')
+        self.at_prompt = False
+        self.lines.append(s)
+
+    def expect_exact(self, pattern, timeout=-1):
+        if self.broken:
+            raise JCliEOF('Connection closed by jcli')
+        # Standard prompt, and at it once it's the one awaited
+        self.at_prompt = isinstance(pattern, list)
+        return 0
+
+
+class Clock(object):
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def pool_of(size=2, max_idle=60, health_check=10, timeout=0.05):
+    sessions = []
+
+    def connect():
+        session = FakeSession(len(sessions))
+        sessions.append(session)
+        return session
+
+    def close(session):
+        session.closed = True
+
+    return TelnetPool(size, max_idle, health_check, timeout, connect=connect, close=close), sessions
+
+
+def test_sessions_are_reused():
+    pool, sessions = pool_of()
+    first = pool.checkout()
+    second = pool.checkout()
+    pool.checkin(first)
+
+    assert pool.checkout() is first
+    pool.checkin(first)
+    pool.checkin(second)
+    assert pool.stats() == {'open': 2, 'idle': 2, 'logins': 2, 'discarded': 0}
+
+
+def test_checkout_times_out_when_every_session_is_out():
+    pool, _ = pool_of(size=1)
+    session = pool.checkout()
+
+    with pytest.raises(TelnetConnectionTimeout):
+        pool.checkout()
+    pool.checkin(session)
+    assert pool.checkout() is session
+
+
+def test_failed_login_releases_its_slot():
+    def connect():
+        raise TelnetConnectionTimeout
+
+    pool = TelnetPool(1, 60, 10, 0.05, connect=connect, close=lambda session: None)
+    with pytest.raises(TelnetConnectionTimeout):
+        pool.checkout()
+    assert pool.stats()['open'] == 0
+
+
+def test_broken_sessions_are_replaced():
+    pool, sessions = pool_of(size=1)
+    pool.checkin(pool.checkout(), broken=True)
+
+    assert sessions[0].closed
+    assert pool.stats() == {'open': 0, 'idle': 0, 'logins': 1, 'discarded': 1}
+    assert pool.checkout() is sessions[1]
+
+
+def test_checkin_resyncs_only_sessions_out_of_sync():
+    pool, sessions = pool_of()
+    session = pool.checkout()
+    pool.checkin(session)
+    assert session.lines == []
+
+    session = pool.checkout()
+    session.sendline('user -l')
+    pool.checkin(session)
+    assert session.lines[0] == 'user -l'
+    assert session.lines[1].startswith('sync-')
+    assert session.at_prompt
+    assert pool.stats()['idle'] == 1
+
+
+def test_failed_resync_discards_the_session():
+    pool, sessions = pool_of()
+    session = pool.checkout()
+    session.at_prompt = False
+    session.broken = True
+    pool.checkin(session)
+
+    assert session.closed
+    assert pool.stats() == {'open': 0, 'idle': 0, 'logins': 1, 'discarded': 1}
+
+
+def test_idle_sessions_are_checked_then_closed(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(conn, 'monotonic', clock)
+    pool, sessions = pool_of(size=1)
+    session = pool.checkout()
+    pool.checkin(session)
+
+    # Idle past the health check, resynced before being handed out
+    clock.now += 20
+    assert pool.checkout() is session
+    assert session.lines[-1].startswith('sync-')
+    pool.checkin(session)
+
+    # Idle past max_idle, closed and replaced
+    clock.now += 61
+    assert pool.checkout() is sessions[1]
+    assert session.closed
+    assert pool.stats() == {'open': 1, 'idle': 0, 'logins': 2, 'discarded': 1}
@@ -0,0 +1,79 @@
+from datetime import datetime
+from decimal import Decimal
+
+from dialects import SUBMIT_LOG_COLUMNS
+from rollups import RollupDeltas
+
+CREATED_AT = datetime(2024, 5, 1, 10, 42, 17)
+
+
+def submit_log_row(msgid, status='ESME_ROK', charge=0.5, pdu_count=1):
+    values = dict.fromkeys(SUBMIT_LOG_COLUMNS)
+    values.update(msgid=msgid, status=status, uid=7, routed_cid='smppc1', source_connector='httpapi',
+                  created_at=CREATED_AT, pdu_count=pdu_count, charge=charge)
+    return tuple(values[column] for column in SUBMIT_LOG_COLUMNS)
+
+
+def logged_row(msgid, status, charge=Decimal('0.5'), pdu_count=1):
+    return (msgid, status, 7, 'smppc1', 'httpapi', CREATED_AT, pdu_count, charge)
+
+
+def test_inserts_are_counted_once_per_msgid():
+    deltas = RollupDeltas()
+    deltas.add_inserts([submit_log_row('a'), submit_log_row('a'), submit_log_row('b', pdu_count=2)], [])
+
+    assert deltas.rows('minute') == [
+        (datetime(2024, 5, 1, 10, 42), '7', 'smppc1', 'httpapi', 'ESME_ROK', 2, 3, Decimal('1.0')),
+    ]
+    assert deltas.rows('hour') == [
+        (datetime(2024, 5, 1, 10), '7', 'smppc1', 'httpapi', 'ESME_ROK', 2, 3, Decimal('1.0')),
+    ]
+
+
+def test_inserts_already_logged_are_not_counted():
+    deltas = RollupDeltas()
+    deltas.add_inserts([submit_log_row('a')], ['a'])
+
+    assert not deltas
+    assert deltas.rows('minute') == []
+
+
+def test_float_and_decimal_charges_mix():
+    # A row inserted by the batch, with a float charge, then updated by a DLR
+    # of the same batch, with the Decimal charge read back from the database
+    deltas = RollupDeltas()
+    deltas.add_inserts([submit_log_row('a', charge=0.1)], [])
+    deltas.add_updates([('a', 'DELIVRD', CREATED_AT, CREATED_AT)],
+                       {'a': logged_row('a', 'ESME_ROK', charge=Decimal('0.1'))})
+
+    assert deltas.rows('minute') == [
+        (datetime(2024, 5, 1, 10, 42), '7', 'smppc1', 'httpapi', 'DELIVRD', 1, 1, Decimal('0.1')),
+    ]
+
+
+def test_updates_move_messages_to_their_new_status():
+    deltas = RollupDeltas()
+    logged = {
+        'a': logged_row('a', 'ESME_ROK'),
+        'b': logged_row('b', 'DELIVRD'),
+    }
+    deltas.add_updates([
+        ('a', 'DELIVRD', CREATED_AT, CREATED_AT),
+        # Unchanged status and unknown msgid
+        ('b', 'DELIVRD', CREATED_AT, CREATED_AT),
+        ('c', 'DELIVRD', CREATED_AT, CREATED_AT),
+    ], logged)
+
+    assert deltas.rows('hour') == [
+        (datetime(2024, 5, 1, 10), '7', 'smppc1', 'httpapi', 'DELIVRD', 1, 1, Decimal('0.5')),
+        (datetime(2024, 5, 1, 10), '7', 'smppc1', 'httpapi', 'ESME_ROK', -1, -1, Decimal('-0.5')),
+    ]
+
+
+def test_missing_charge_counts_as_zero():
+    deltas = RollupDeltas()
+    deltas.add_inserts([submit_log_row('a', charge=None, pdu_count=None)], [])
+
+    assert deltas.rows('minute') == [
+        (datetime(2024, 5, 1, 10, 42), '7', 'smppc1', 'httpapi', 'ESME_ROK', 1, 0, Decimal(0)),
+    ]
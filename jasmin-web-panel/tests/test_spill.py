@@ -0,0 +1,65 @@
+import pickle
+
+from spill import SpillFile
+
+INSERTS = [('a', 'JASMIN', 0.0, 1)]
+UPDATES = [('a', 'DELIVRD', '2024-05-01 10:42:20', '2024-05-01 10:42:17')]
+
+
+def test_batches_are_read_back_in_order(tmp_path):
+    spill = SpillFile(str(tmp_path / 'spill'))
+    assert not spill.pending
+    spill.append(INSERTS, [])
+    spill.append([], UPDATES, {b'hash': b'hello'})
+
+    batches, offset = spill.read(10)
+    assert batches == [(INSERTS, [], {}), ([], UPDATES, {b'hash': b'hello'})]
+    assert spill.pending
+    spill.consume(offset, len(batches))
+
+    assert not spill.pending
+    assert spill.size == 0
+    assert spill.replayed == 2
+
+
+def test_partial_reads_are_consumed_in_steps(tmp_path):
+    spill = SpillFile(str(tmp_path / 'spill'))
+    for i in range(3):
+        spill.append([('m%s' % i,)], [])
+
+    batches, offset = spill.read(2)
+    assert [b[0] for b in batches] == [[('m0',)], [('m1',)]]
+    spill.consume(offset, len(batches))
+    assert spill.pending
+
+    # Spilled while the first ones were replayed
+    spill.append([('m3',)], [])
+    batches, offset = spill.read(10)
+    assert [b[0] for b in batches] == [[('m2',)], [('m3',)]]
+    spill.consume(offset, len(batches))
+    assert not spill.pending
+
+
+def test_reopened_spill_keeps_its_batches_and_cuts_torn_records(tmp_path):
+    path = str(tmp_path / 'spill')
+    spill = SpillFile(path)
+    spill.append(INSERTS, UPDATES)
+    with open(path, 'ab') as f:
+        f.write(b'\xff\x00\x00\x00torn')
+
+    spill = SpillFile(path)
+    assert spill.spilled == 1
+    spill.append([], UPDATES)
+
+    batches, _ = spill.read(10)
+    assert batches == [(INSERTS, UPDATES, {}), ([], UPDATES, {})]
+
+
+def test_batches_spilled_without_bodies_are_read(tmp_path):
+    path = str(tmp_path / 'spill')
+    payload = pickle.dumps((INSERTS, UPDATES))
+    with open(path, 'wb') as f:
+        f.write(SpillFile._length.pack(len(payload)) + payload)
+
+    batches, _ = SpillFile(path).read(10)
+    assert batches == [(INSERTS, UPDATES, {})]